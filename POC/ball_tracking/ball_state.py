@@ -2,11 +2,19 @@
 A module for holding ball state classes
 """
 
+import POC.config as config
 
-class BallState:
+
+class BallState(object):
     """
-    A class to hold data about a ball's current position, radius, and velocity.
+    A class to hold data about a ball's current position, radius, and velocity. Velocities are per second: pixels per
+    second for x and y, inches per second for d.
+
+    There is at least one of these per frame, so it uses __slots__: no per-instance dict, less memory and faster
+    attribute access.
     """
+    __slots__ = ("__x_pos", "__y_pos", "__d_pos", "__x_vel", "__y_vel", "__d_vel", "__radius")
+
     def __init__(self, x_pos=None, y_pos=None, d_pos=None, x_vel=None, y_vel=None, d_vel=None, radius=None):
         """
         Constructor
@@ -27,6 +35,22 @@ class BallState:
         self.__d_vel = d_vel
         self.__radius = radius
 
+    def __getstate__(self):
+        """
+        Gets the state for pickling (a class with __slots__ has no __dict__ for pickle to use), e.g. to send it between
+        the pipeline's processes.
+        :return: A tuple of all of the values
+        """
+        return self.__x_pos, self.__y_pos, self.__d_pos, self.__x_vel, self.__y_vel, self.__d_vel, self.__radius
+
+    def __setstate__(self, state):
+        """
+        Sets the state when unpickling.
+        :param state: What __getstate__() returned
+        :return: void
+        """
+        self.__x_pos, self.__y_pos, self.__d_pos, self.__x_vel, self.__y_vel, self.__d_vel, self.__radius = state
+
     def __str__(self):
         """
         As Str
@@ -54,15 +78,16 @@ class BallState:
 
     def format_for_sending(self):
         """
-        Returns a string for sending over TCP port.
+        Returns a string for sending over TCP port. The receiver reads the velocities as per frame, so they are sent
+        as a frame's worth (1 / config.CAMERA_FPS) of the per second velocities this holds.
         :return: str for sending
         """
         x = self.get_x_pos()
         y = self.get_y_pos()
         d = self.get_d_pos()
-        vx = self.get_x_velocity()
-        vy = self.get_y_velocity()
-        vd = self.get_d_velocity()
+        vx = self.get_x_velocity() / config.CAMERA_FPS
+        vy = self.get_y_velocity() / config.CAMERA_FPS
+        vd = self.get_d_velocity() / config.CAMERA_FPS
         return "%1.4f%1.4f%1.4f%1.4f%1.4f%1.4f" % (x, y, d, vx, vy, vd)
 
     def get_x_pos(self):
@@ -4,7 +4,16 @@ A module to hold a class for tracking a ping pong ball.
 
 import cv2
 import ball_state
+import blobs
+import buffer_pool
+import color_table
+import math
+import morphology
+import numpy
+import os
 import POC.config as config
+from POC.prediction import predictors
+import tiles
 
 
 class BallTracker:
@@ -19,75 +28,157 @@ class BallTracker:
         :return: void
         """
         self.__frame = frame
-        self.__last_several_states = []
+        self.__last_state = None
+        self.__predictor = predictors.make_predictor()
         self.__next_state = None
+        self.__timestamp = None
+        self.__frame_time = 1.0 / config.CAMERA_FPS
+        self.__misses = 0
+        self.__confidence = 0.0
+        self.__streak_direction_unknown = False
+        self.__search_window = None
+        self.__scale = 1.0
+        self.__roi_radius_scale = config.ROI_RADIUS_SCALE
+        self.__morph_iterations = 2
+        self.__buffers = buffer_pool.BufferPool()
+        self.__color_table = None
+        if config.USE_COLOR_TABLE:
+            self.__color_table = color_table.ColorTable(config.hsv_lower_range, config.hsv_upper_range,
+                                                        bits=config.COLOR_TABLE_BITS,
+                                                        cache_dir=os.path.dirname(os.path.abspath(config.__file__)))
+        self.__tiles = None
+        if config.TILE_WORKERS > 1:
+            self.__tiles = tiles.TiledMasker(config.TILE_WORKERS)
+
+    def close(self):
+        """
+        Stops the threads that the mask is split across, if there are any (config.TILE_WORKERS).
+        :return: void
+        """
+        if self.__tiles:
+            self.__tiles.close()
+            self.__tiles = None
 
     def find_ball(self):
         """
-        Uses the current image and finds a ball. Returns a BallState object.
+        Uses the current image and finds a ball. Returns a BallState object, as the predictor (config.PREDICTOR) sees
+        it: either the measurement itself or a filtered copy of it, with the velocities filled in.
         :return: A BallState object or None (if no ball found)
         """
-        self.__frame = self.__image_pipeline()
-        measured_ball_state = self.__measure_ball_position()
+        self.__search_window = self.__get_search_window()
+        if self.__search_window is None and config.USE_PYRAMID_SEARCH and self.__is_reacquiring():
+            # Find the ball roughly in a downsampled frame, then only measure it in the full size frame around there
+            self.__search_window = self.__coarse_search()
+            if self.__search_window is None:
+                self.__misses += 1
+                self.__confidence = 0.0
+                return None
+
+        self.__frame = self.__image_pipeline(self.__search_window)
+        measured_ball_state = self.__measure_ball_position(self.__search_window)
 
         if measured_ball_state:
-            self.__next_state = self.__predict_next_state(measured_ball_state)
-            self.__enqueue_state(measured_ball_state)
-            return measured_ball_state
+            if config.USE_STREAK_MEASUREMENT:
+                self.__orient_streak(measured_ball_state)
+            self.__misses = 0
+            self.__next_state = self.__recenter(self.__predictor.update(measured_ball_state, self.__timestamp))
+            self.__last_state = self.__predictor.get_estimate()
+            return self.__last_state
         else:
+            self.__misses += 1
             return None
 
-    def __calculate_averages(self):
+    def __coarse_search(self):
         """
-        Calculate the average x, y, and d velocities from the last several measurements.
-        :return: A tuple: (average vx, average vy, average vd)
+        Looks for the ball in a copy of the frame that is config.PYRAMID_SCALE times smaller in each direction, and
+        works out the window of the full size frame that the best blob it finds is in.
+        :return: The window as (x0, y0, x1, y1) in frame coordinates, or None if there is no ball to be found
         """
-        if not self.__last_several_states:
-            return 0, 0, 0
-
-        last_several_x = [state.get_x_velocity() for state in self.__last_several_states]
-        last_several_y = [state.get_y_velocity() for state in self.__last_several_states]
-        last_several_d = [state.get_d_velocity() for state in self.__last_several_states]
-
-        average = lambda seq: sum(seq) / len(seq)
-        avg_x = average(last_several_x)
-        avg_y = average(last_several_y)
-        avg_d = average(last_several_d)
+        shrink = 1.0 / config.PYRAMID_SCALE
+        scale = self.__scale * shrink
+        image_height, image_width = self.__frame.shape[:2]
+        small_size = (max(1, int(image_width * shrink)), max(1, int(image_height * shrink)))
+        small = cv2.resize(self.__frame, small_size, dst=self.__buffers.get("coarse_frame", small_size[::-1] + (3,)),
+                           interpolation=cv2.INTER_NEAREST)
+
+        in_ranged = self.__buffers.get("coarse_in_ranged", small.shape[:2])
+        self.__make_mask(small, in_ranged, buffer_prefix="coarse_")
+
+        # The same clean up as the full size pipeline, with the erosions shrunk to match the ball
+        iterations = max(1, int(round(self.__morph_iterations * shrink)))
+        crop_region = self.__get_crop_region(in_ranged, (0, 0), scale)
+        erosions = [([crop_region] if crop_region else [], iterations), ([], iterations)]
+        cleaned = morphology.clean_mask(in_ranged, self.__buffers.get_like("coarse_dilated", in_ranged), erosions,
+                                        iterations, self.__buffers)
+
+        _, stats, centroids = blobs.find_blobs(cleaned, self.__buffers)
+        scores = blobs.score_blobs(stats, centroids, self.get_predicted_state(), scale=scale)
+        if not len(scores) or not numpy.isfinite(scores.max()):
+            return None
 
-        return avg_x, avg_y, avg_d
+        # Leave room around the blob for it to be a bit bigger at full size and for the erosions at full size
+        frame_width, frame_height = self.__get_frame_size()
+        left, top, width, height = stats[scores.argmax(), :4] / scale
+        margin = config.PYRAMID_MARGIN_SCALE / scale + max(width, height) / 2
+        x0, x1 = max(0, left - margin), min(frame_width, left + width + margin)
+        y0, y1 = max(0, top - margin), min(frame_height, top + height + margin)
+        return int(x0), int(y0), int(x1), int(y1)
 
-    def __calculate_velocities(self, current_state):
+    def __orient_streak(self, measured_ball_state):
         """
-        Calculates the ball's velocity values in x, y, and d directions
-        :param current_state: The current state of the ball
-        :return:
+        Points the velocity measured from the ball's motion blur streak the right way along the streak, which the streak
+        itself does not say: the same way as the ball was already going. When the ball has just been found, that is not
+        known yet, so the predictor starts again from this streak (going whichever way) and the next measurement, by
+        where the ball went, settles which way this streak was going.
+        :param measured_ball_state: The measured BallState, with the streak's velocity
+        :return: void
         """
-        if self.get_last_state():
-            print "Last X: " + str(self.get_last_state().get_x_pos()) + " Y: " + str(
-                self.get_last_state().get_y_velocity())
-            print "This X: " + str(current_state.get_x_pos()) + " Y: " + str(current_state.get_y_pos())
-            vx = current_state.get_x_pos() - self.get_last_state().get_x_pos()
-            vy = current_state.get_y_pos() - self.get_last_state().get_y_pos()
-            vd = current_state.get_d_pos() - self.get_last_state().get_d_pos()
-            return vx, vy, vd
+        vx, vy = measured_ball_state.get_x_velocity(), measured_ball_state.get_y_velocity()
+        last = self.__last_state
+        if self.__is_reacquiring():
+            self.__predictor.reset()
+            self.__streak_direction_unknown = vx != 0 or vy != 0
+            return
+
+        if self.__streak_direction_unknown:
+            # The last streak was going the way the ball went since
+            dx = measured_ball_state.get_x_pos() - last.get_x_pos()
+            dy = measured_ball_state.get_y_pos() - last.get_y_pos()
+            if dx * last.get_x_velocity() + dy * last.get_y_velocity() < 0:
+                self.set_current_state(ball_state.BallState(last.get_x_pos(), last.get_y_pos(), last.get_d_pos(),
+                                                            -last.get_x_velocity(), -last.get_y_velocity(),
+                                                            last.get_d_velocity(), last.get_radius()))
+            self.__streak_direction_unknown = False
         else:
-            return 0, 0, 0
+            dx, dy = last.get_x_velocity(), last.get_y_velocity()
+
+        if vx * dx + vy * dy < 0:
+            measured_ball_state.set_x_velocity(-vx)
+            measured_ball_state.set_y_velocity(-vy)
 
-    def __constrain_to_average(self, measured_velocities, avgs):
+    def __recenter(self, predicted_state):
         """
-        Moves the measured velocities towards the given averages.
-        :param measured_velocities:
-        :param avgs: A tuple of averages of the form (vxavg, vyavg, vdavg)
-        :return: A new tuple of velocities which is closer to the average
+        While the way along the last streak that the ball is going is not known (see __orient_streak), the prediction
+        is kept where the ball was, with the streak's velocity, so that the search window and blob scores allow for
+        the ball having gone either way.
+        :param predicted_state: The predicted BallState
+        :return: The BallState to look for the ball around
         """
-        constrain = lambda i: ((0.6 * measured_velocities[i]) + (0.4 * avgs[i]))
-        return constrain(0), constrain(1), constrain(2)
-
-    def __crop(self, image):
+        if not self.__streak_direction_unknown:
+            return predicted_state
+        last = self.__predictor.get_estimate()
+        return ball_state.BallState(last.get_x_pos(), last.get_y_pos(), last.get_d_pos(),
+                                    predicted_state.get_x_velocity(), predicted_state.get_y_velocity(),
+                                    predicted_state.get_d_velocity(), predicted_state.get_radius())
+
+    def __get_crop_region(self, image, offset, scale=1.0):
         """
-        Crops the image and returns a new one.
-        :param image: The image to crop
-        :return: The image after cropping
+        Gets the part of the image to keep as is. Everything outside of it is background, which gets eroded an extra
+        time before the rest of the pipeline.
+        :param image: The image being cropped
+        :param offset: The (x, y) position of the image's top left corner in the image it was cut out of
+        :param scale: The size of the image it was cut out of, compared to the full frame's
+        :return: The region as (x0, y0, x1, y1) in the image's coordinates, or None if the image is all background
         """
         # parameters - tune these in the config file
         # r1 = (x0, y0)
@@ -96,107 +187,165 @@ class BallTracker:
 
         r1 = config.TOP_LEFT
         r2 = config.BOTTOM_RIGHT
+        if scale != 1.0:
+            r1 = (int(r1[0] * scale), int(r1[1] * scale))
+            r2 = (int(r2[0] * scale), int(r2[1] * scale))
 
-        slice_y = slice(r1[1], r2[1])
-        slice_x = slice(r1[0], r2[0])
-
-        # Get the region of interest
-        roi = image[slice_y, slice_x]
-        roi = roi.copy()
-
-        # cv2.imshow("a", roi)
-        # cv2.waitKey(0)
+        slice_y = slice(max(0, r1[1] - offset[1]), max(0, r2[1] - offset[1]))
+        slice_x = slice(max(0, r1[0] - offset[0]), max(0, r2[0] - offset[0]))
 
-        # Black out the rest of the image or erode it - tune depending on the surroundings
-        image = cv2.erode(image, None, iterations=2)
-        # cv2.rectangle(image, (0, 0), (IMAGE_WIDTH, image.shape[1]), (0, 0, 0), -1)
+        return morphology.rectangle_from_slices(slice_x, slice_y, image.shape[1], image.shape[0])
 
-        # cv2.imshow("b", image)
-        # cv2.waitKey(0)
-
-        # Put the ROI back in
-        image[slice_y, slice_x] = roi
+    def __get_search_window(self):
+        """
+        Works out which part of the frame to look for the ball in. If ROI tracking is on and we have a prediction that
+        we have not missed too many times in a row, that is a window around the predicted position, sized by the
+        predicted radius and how far the ball moves in a frame (config.CAMERA_FPS) at the predicted velocity, and grown
+        a bit with each miss. Otherwise it is the whole frame.
+        :return: The window as (x0, y0, x1, y1) in frame coordinates, or None for the whole frame
+        """
+        predicted_state = self.get_predicted_state()
+        if not config.USE_ROI_TRACKING or not predicted_state or self.__misses >= config.ROI_MAX_MISSES:
+            return None
 
-        # cv2.imshow("f", image)
-        # cv2.waitKey(0)
+        radius = predicted_state.get_radius()
+        motion_scale = config.ROI_VELOCITY_SCALE * (1 + self.__misses) * self.__frame_time
+        half_width = int(self.__roi_radius_scale * radius + motion_scale * abs(predicted_state.get_x_velocity()))
+        half_height = int(self.__roi_radius_scale * radius + motion_scale * abs(predicted_state.get_y_velocity()))
+
+        frame_width, frame_height = self.__get_frame_size()
+        x = int(predicted_state.get_x_pos())
+        y = int(predicted_state.get_y_pos())
+        x0, x1 = max(0, x - half_width), min(frame_width, x + half_width)
+        y0, y1 = max(0, y - half_height), min(frame_height, y + half_height)
+        if x0 >= x1 or y0 >= y1:
+            # The prediction has wandered off of the frame
+            return None
 
-        return image
+        return x0, y0, x1, y1
 
-    def __enqueue_state(self, ball_state):
+    def __get_frame_size(self):
         """
-        Enqueue the state into the list of last several states to help track the ball in the future.
-        :param ball_state: The state to enqueue
-        :return: void
+        Gets the size of the frame at full scale, which is what frame coordinates are in.
+        :return: (width, height)
         """
-        self.__last_several_states.append(ball_state)
-        if len(self.__last_several_states) > 3:
-            self.__last_several_states.pop(0)
+        image_height, image_width = self.__frame.shape[:2]
+        if self.__scale == 1.0:
+            return image_width, image_height
+        return int(round(image_width / self.__scale)), int(round(image_height / self.__scale))
 
-    def __image_pipeline(self):
+    def __image_pipeline(self, window=None):
         """
         Takes an image and processes it to a resultant image that should have the ball
         as a white blob and with everything else black.
-        :return: The image after processing
+        :param window: The (x0, y0, x1, y1) part of the frame to process, or None to process the whole frame
+        :return: The image after processing (the size of the window, if one was given)
         """
-        # Convert the image to HSV
-        hsv = cv2.cvtColor(self.__frame, cv2.COLOR_BGR2HSV)
-
-        # Convert everything non-orange into black and everything orange into white
-        in_ranged = cv2.inRange(hsv, config.hsv_lower_range, config.hsv_upper_range)
-
-        # cv2.imshow("inranged", in_ranged)
-        # cv2.waitKey(0)
+        if window:
+            x0, y0, x1, y1 = self.__to_image_window(window)
+            image = self.__frame[y0:y1, x0:x1]
+            offset = (x0, y0)
+        else:
+            image = self.__frame
+            offset = (0, 0)
 
-        # Remove the background
-        in_ranged = self.__crop(in_ranged)
+        # Remove the background by eroding everything outside of the crop region an extra time
+        crop_region = self.__get_crop_region(image, offset, self.__scale)
 
-        # If estimate of ball's position is good enough, take that region of the image out before eroding and
-        # put it back in afterwards.
-        roi, x_slice, y_slice = self.__remove_predicted_ball_region(in_ranged)
+        # If estimate of ball's position is good enough, leave that region of the image alone when eroding
+        ball_region = self.__get_predicted_ball_region(image, offset)
 
-        # Erode resultant white blobs a bit to destroy noise and to cut down on competing white blobs
-        eroded = cv2.erode(in_ranged, None, iterations=2)
+        # Erode resultant white blobs a bit to destroy noise and to cut down on competing white blobs, then dilate the
+        # eroded stuff back to normal - but the noise will still be gone
+        iterations = self.__morph_iterations
+        erosions = [([crop_region] if crop_region else [], iterations),
+                    ([ball_region] if ball_region else [], iterations)]
+        dilated = self.__buffers.get("dilated", image.shape[:2])
 
-        # cv2.imshow("eroded", eroded)
-        # cv2.waitKey(0)
+        if self.__tiles:
+            # Exactly the same as below, but split into tiles that are done at the same time
+            self.__tiles.clean_mask(image, dilated, self.__make_mask, erosions, iterations)
+        else:
+            # Convert everything non-orange into black and everything orange into white
+            in_ranged = self.__buffers.get("in_ranged", image.shape[:2])
+            self.__make_mask(image, in_ranged)
 
-        # If we have the ball as a cropped out section, paste it back on top of the eroded image
-        if roi is not None:
-            eroded[y_slice, x_slice] = roi
+            # cv2.imshow("inranged", in_ranged)
+            # cv2.waitKey(0)
 
-        # cv2.imshow("eroded2", eroded)
-        # cv2.waitKey(0)
-
-        # Dilate the eroded stuff back to normal - but the noise will still be gone
-        dilated = cv2.dilate(eroded, None, iterations=2)
+            morphology.clean_mask(in_ranged, dilated, erosions, iterations, self.__buffers)
 
         # cv2.imshow("dilated", dilated)
         # cv2.waitKey(0)
 
         return dilated
 
-    def __measure_ball_position(self):
+    def __is_reacquiring(self):
         """
-        Measures the ball's position from the image, if it can find the ball in the image. Otherwise returns None.
-        :return: a BallState object or None if not found
+        Whether the ball has to be found from scratch: there is no prediction of where it is, or it has been missed too
+        many times in a row for the prediction to be any good.
+        :return: True or False
         """
-        contours = cv2.findContours(self.__frame.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]
+        return not self.get_predicted_state() or self.__misses >= config.ROI_MAX_MISSES
 
-        center = None
-
-        # If there are any contours in the image, there may be a ball in the image
-        if contours:
-            # The biggest of the contours is most likely the ball
-            ball_contour = max(contours, key=cv2.contourArea)
-
-            # Get the ball's min enclosing circle and x, y location in pixels
-            ((x, y), radius) = cv2.minEnclosingCircle(ball_contour)
-
-            # Get the moments of the ball_contour
-            M = cv2.moments(ball_contour)
+    def __make_mask(self, image, dst, buffers=None, buffer_prefix=""):
+        """
+        Converts everything non-orange into black and everything orange into white.
+        :param image: The BGR image
+        :param dst: Where to put the mask
+        :param buffers: The BufferPool to get scratch buffers from, if not this tracker's own
+        :param buffer_prefix: Put in front of the names of the scratch buffers, to keep them apart from other users'
+        :return: dst
+        """
+        buffers = buffers or self.__buffers
+        if self.__color_table:
+            # Same as the two steps below, but as one table lookup per pixel
+            return self.__color_table.apply(image, dst=dst, buffers=buffers, buffer_prefix=buffer_prefix)
+        else:
+            # Convert the image to HSV
+            hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV, dst=buffers.get_like(buffer_prefix + "hsv", image))
+            return cv2.inRange(hsv, config.hsv_lower_range, config.hsv_upper_range, dst=dst)
 
-            # Get the center of the ball as a tuple of x, y. This is also the x, y in our coordinate system
-            center = (int(M["m10"] / M["m00"]), int(M["m01"] / M["m00"]))
+    def __measure_ball_position(self, window=None):
+        """
+        Measures the ball's position from the image, if it can find the ball in the image. Otherwise returns None.
+        :param window: The (x0, y0, x1, y1) part of the frame that the image covers, or None if it is the whole frame
+        :return: a BallState object or None if not found
+        """
+        offset = self.__to_image_window(window)[:2] if window else (0, 0)
+
+        # Measure every white blob in the image in one go
+        labels, stats, centroids = blobs.find_blobs(self.__frame, self.__buffers)
+
+        # If there are any blobs in the image, there may be a ball in the image
+        scores = blobs.score_blobs(stats, centroids, self.get_predicted_state(), offset, self.__scale)
+        if len(scores) and numpy.isfinite(scores.max()):
+            # The blob that looks most like the ball, where we expected the ball to be, is most likely the ball
+            best = scores.argmax()
+
+            # The score without the part for its size: 1 for a round blob right where the ball was predicted
+            area = stats[best, cv2.CC_STAT_AREA] / (self.__scale * self.__scale)
+            self.__confidence = min(1.0, math.exp(scores[best] - 0.5 * math.log(area)))
+
+            # The center of the ball is the blob's centroid. This is also the x, y in our coordinate system
+            x = centroids[best, 0] + offset[0]
+            y = centroids[best, 1] + offset[1]
+            if self.__scale != 1.0:
+                x, y = x / self.__scale, y / self.__scale
+
+            if config.USE_STREAK_MEASUREMENT:
+                # Measure the ball as the streak it blurs into, which also says how fast it is going across the frame
+                radius, length, angle = blobs.measure_streak(labels, stats, best)
+                radius /= self.__scale
+                length /= self.__scale
+                speed = 0.0
+                if length >= config.STREAK_MIN_ELONGATION * radius:
+                    speed = length / config.CAMERA_EXPOSURE_TIME
+                velocities = (speed * math.cos(angle), speed * math.sin(angle), 0.0)
+            else:
+                # Get the radius of the ball's min enclosing circle in pixels
+                radius = blobs.enclosing_radius(labels, stats, best) / self.__scale
+                velocities = (None, None, None)
 
             # Get a more accurate guess at the radius before using it for distance calculation
             if self.get_last_state():
@@ -208,125 +357,110 @@ class BallTracker:
 
             distance_from_camera = float(config.BALL_RADIUS * config.FOCAL_DISTANCE) / float(radius)
 
-            return ball_state.BallState(x, y, distance_from_camera, radius=radius)
+            return ball_state.BallState(x, y, distance_from_camera, *velocities, radius=radius)
         else:
             # No ball in this frame
+            self.__confidence = 0.0
             return None
 
-    def __predict_next_state(self, current_state):
+    def __get_predicted_ball_region(self, image, offset):
         """
-        Predicts the next measurements of the ball and returns it
-        :param current_state:
-        :return: BallState object
+        If a prediction of the ball's data exists, use it to
+        find the region of the image that likely contains the ball.
+        :param image: The image being processed
+        :param offset: The (x, y) position of the image's top left corner in the frame it was cut out of
+        :return: The region as (x0, y0, x1, y1) in the image's coordinates, or None
         """
-        # Calculate the ball's velocities in x, y, and d
-        measured_velocities = self.__calculate_velocities(current_state)
-
-        print "Vel0: " + str(measured_velocities[0]) + ", " + str(measured_velocities[1])
-
-        avgs = self.__calculate_averages()
-        measured_velocities = self.__constrain_to_average(measured_velocities, avgs)
-
-        print "Vel1: " + str(measured_velocities[0]) + ", " + str(measured_velocities[1])
+        if not self.get_predicted_state():
+            return None
 
-        # Side-effect: Also update this state with the newly calculated velocities
-        current_state.set_x_velocity(measured_velocities[0])
-        current_state.set_y_velocity(measured_velocities[1])
-        current_state.set_d_velocity(measured_velocities[2])
+        likely_x, likely_y, likely_rad = int(self.get_predicted_state().get_x_pos() * self.__scale) - offset[0], \
+                                         int(self.get_predicted_state().get_y_pos() * self.__scale) - offset[1], \
+                                         int(self.get_predicted_state().get_radius() * self.__scale)
+        x_range_left = likely_x - (likely_rad * 2)
+        y_range_up = likely_y - (likely_rad * 2)
+        x_range_right = likely_x + (likely_rad * 2)
+        y_range_down = likely_y + (likely_rad * 2)
+        y_slice = slice(y_range_up, y_range_down)
+        x_slice = slice(x_range_left, x_range_right)
 
-        # Predict what the next time step's values will be using measured_velocities
-        predicted_x = current_state.get_x_pos() + measured_velocities[0]
-        predicted_y = current_state.get_y_pos() + measured_velocities[1]
-        predicted_d = current_state.get_d_pos() + measured_velocities[2]
+        # This has always been cut out with these slices, so keep numpy's meaning of them (for negative bounds)
+        return morphology.rectangle_from_slices(x_slice, y_slice, image.shape[1], image.shape[0])
 
-        next_state = ball_state.BallState(predicted_x, predicted_y, predicted_d, measured_velocities[0],
-                                          measured_velocities[1], measured_velocities[2], current_state.get_radius())
-        return next_state
+    def __to_image_window(self, window):
+        """
+        Converts a window from frame coordinates to the pixels of the frame as it was given, which is smaller than full
+        size if set_quality() says so.
+        :param window: (x0, y0, x1, y1) in frame coordinates
+        :return: (x0, y0, x1, y1) in pixels
+        """
+        if self.__scale == 1.0:
+            return window
+        return tuple(int(round(v * self.__scale)) for v in window)
 
-    def __remove_predicted_ball_region(self, in_ranged):
+    def get_confidence(self):
         """
-        If a prediction of the ball's data exists, use it to
-        crop the ball out and return that cropped out section.
-        :param in_ranged: The image so far in the pipeline
-        :return: The likely region containing the ball and the slices used to obtain it.
-        """
-        roi, x_slice, y_slice = None, None, None
-        if self.get_predicted_state():
-            likely_x, likely_y, likely_rad = int(self.get_predicted_state().get_x_pos()), \
-                                             int(self.get_predicted_state().get_y_pos()), \
-                                             int(self.get_predicted_state().get_radius())
-            x_range_left = likely_x - (likely_rad * 2)
-            y_range_up = likely_y - (likely_rad * 2)
-            x_range_right = likely_x + (likely_rad * 2)
-            y_range_down = likely_y + (likely_rad * 2)
-            y_slice = slice(y_range_up, y_range_down)
-            x_slice = slice(x_range_left, x_range_right)
-
-            try:
-                roi = in_ranged[y_slice, x_slice]
-                roi = roi.copy()
-
-                # For debugging this when necessary
-
-                # blah = self.__frame[y_slice, x_slice]
-                # blah = blah.copy()
-                #
-                # bloop = self.__frame.copy()
-
-                # point_one = (likely_x - likely_rad * 2, likely_y - likely_rad * 2)
-                # point_two = (likely_x + likely_rad * 2, likely_y + likely_rad * 2)
-
-                # cv2.circle(bloop, point_one, 5, (0, 255, 0), 5)
-                # cv2.circle(bloop, point_two, 5, (255, 0, 0), 5)
-                # cv2.circle(bloop, (likely_x, likely_y), 5, (0, 0, 0), 5)
-                # color = (255, 0, 255)
-                # thickness = 5
-                # cv2.rectangle(bloop, point_one, point_two, color, thickness)
-
-                # cv2.imshow("c", blah)
-                # cv2.waitKey(0)
-                #
-                # cv2.imshow("d", bloop)
-                # cv2.waitKey(0)
-
-            except cv2.error as e:
-                roi = None
-
-        return roi, x_slice, y_slice
+        Gets how sure the tracker is that what the last call to find_ball() found is the ball: how round it is and how
+        close to where the ball was predicted to be (see blobs.score_blobs), but not how big it is
+        :return: From 0 (nothing found) to 1
+        """
+        return self.__confidence
 
     def get_last_state(self):
         """
-        Gets the last measured state of the ball
+        Gets the last measured state of the ball, as the predictor sees it
         :return: the last measured state of the ball
         """
-        if self.__last_several_states:
-            return self.__last_several_states[-1]
-        else:
-            return None
+        return self.__last_state
 
     def get_predicted_state(self):
         """
-        Gets the state that is predicted for the next time frame
+        Gets the state that is predicted for the next time frame: after set_frame(), for that frame's timestamp, and
+        after find_ball() finds the ball, for one frame (config.CAMERA_FPS) later
         :return: the next state
         """
         return self.__next_state
 
+    def get_search_window(self):
+        """
+        Gets the part of the frame that the last call to find_ball() searched
+        :return: (x0, y0, x1, y1) in frame coordinates, or None if it searched the whole frame
+        """
+        return self.__search_window
+
     def set_current_state(self, state):
         """
         Updates the current state with the given value.
         :param state: The ball state
         :return: void
         """
-        if self.__last_several_states:
-            self.__last_several_states[-1] = state
-        else:
-            self.__last_several_states = []
-            self.__last_several_states[-1] = state
+        self.__last_state = state
+        self.__predictor.set_estimate(state)
+
+    def set_quality(self, scale, roi_radius_scale, morph_iterations):
+        """
+        Trades accuracy for speed. Positions, radii and distances still come out in full size frame coordinates.
+        :param scale: The size of the frames given to set_frame(), compared to config.IMAGE_WIDTH x IMAGE_HEIGHT
+        :param roi_radius_scale: Used instead of config.ROI_RADIUS_SCALE to size the search window
+        :param morph_iterations: How many times to erode and dilate the mask to clean it up
+        :return: void
+        """
+        self.__scale = float(scale)
+        self.__roi_radius_scale = roi_radius_scale
+        self.__morph_iterations = morph_iterations
 
-    def set_frame(self, frame):
+    def set_frame(self, frame, timestamp=None):
         """
-        Sets the frame that this object acts on
+        Sets the frame that this object acts on, and predicts where the ball is in it from when it was captured
         :param frame:
+        :param timestamp: When the frame was captured, in seconds. If None, the frames are taken to be evenly spaced at
+                          config.CAMERA_FPS.
         :return: void
         """
         self.__frame = frame
+        if timestamp is None:
+            timestamp = 0.0 if self.__timestamp is None else self.__timestamp + self.__frame_time
+        self.__timestamp = timestamp
+        if self.__last_state and self.__misses < config.ROI_MAX_MISSES:
+            # Once the ball has been lost for a while, moving the prediction on would only take it further off
+            self.__next_state = self.__recenter(self.__predictor.predict(timestamp))
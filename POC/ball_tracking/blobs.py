@@ -0,0 +1,151 @@
+"""
+A module for finding the white blobs in the cleaned up mask and picking the one most likely to be the ball.
+"""
+
+import cv2
+import math
+import numpy
+import POC.config as config
+
+# The fraction of its bounding box that a disk fills
+_DISK_FILL = math.pi / 4.0
+
+# The streak model, tabulated for measure_streak: for a streak of elongation k (length / radius), how many times bigger
+# its variance along the streak is than across it
+_STREAK_ELONGATIONS = numpy.linspace(0.0, 100.0, 4001)
+_STREAK_VARIANCE_RATIOS = (_STREAK_ELONGATIONS ** 3 / 6 + math.pi * _STREAK_ELONGATIONS ** 2 / 4 +
+                           4 * _STREAK_ELONGATIONS / 3 + math.pi / 4) / (2 * _STREAK_ELONGATIONS / 3 + math.pi / 4)
+
+
+def find_blobs(mask, buffers):
+    """
+    Labels the connected white blobs in the mask and measures all of them in one pass. Only the bounding box of the
+    white pixels gets labelled, so a mostly black mask is cheap.
+    :param mask: The cleaned up mask
+    :param buffers: A BufferPool to put the label image in
+    :return: A tuple: (labels, stats, centroids). stats has one row per blob, with the columns cv2.CC_STAT_LEFT, TOP,
+             WIDTH, HEIGHT and AREA; centroids has one (x, y) row per blob. Both are in the mask's coordinates. labels
+             is a Labels object for use with enclosing_radius.
+    """
+    left, top, width, height = cv2.boundingRect(mask)
+    if width == 0 or height == 0:
+        return None, numpy.zeros((0, 5), numpy.int32), numpy.zeros((0, 2))
+
+    region = mask[top:top + height, left:left + width]
+    labels = buffers.get("labels", region.shape, numpy.int32)
+    _, labels, stats, centroids = cv2.connectedComponentsWithStats(region, labels=labels, connectivity=8,
+                                                                   ltype=cv2.CV_32S)
+
+    # Row 0 is the background. Move the rest from the region's coordinates to the mask's.
+    stats = stats[1:]
+    centroids = centroids[1:]
+    stats[:, cv2.CC_STAT_LEFT] += left
+    stats[:, cv2.CC_STAT_TOP] += top
+    centroids += (left, top)
+    return Labels(labels, (left, top)), stats, centroids
+
+
+def enclosing_radius(labels, stats, index):
+    """
+    Gets the radius of the smallest circle around one blob, which is what the focal distance was calibrated with.
+    Only looks at the blob's bounding box.
+    :param labels: The labels from find_blobs
+    :param stats: The blob stats from find_blobs
+    :param index: The row of the blob in stats
+    :return: The radius in pixels
+    """
+    _, radius = cv2.minEnclosingCircle(cv2.findNonZero(labels.get_blob_mask(stats, index)))
+    return radius
+
+
+def measure_streak(labels, stats, index):
+    """
+    Measures one blob as a ball that moved while the shutter was open: a disk of radius r swept along a line of length
+    L, which leaves a capsule (a 2r wide rectangle L long, with a half disk on each end). Its orientation and variances
+    along and across the streak come from the blob's second moments, and the capsule whose variances have the same
+    ratio, scaled to match, gives r and L. Only looks at the blob's bounding box.
+    :param labels: The labels from find_blobs
+    :param stats: The blob stats from find_blobs
+    :param index: The row of the blob in stats
+    :return: A tuple: (radius, length, angle). The radius and length are in pixels, and the angle is the direction of
+             the streak in radians from the x axis (towards y). The streak itself does not say which way along it the
+             ball went.
+    """
+    moments = cv2.moments(labels.get_blob_mask(stats, index), binaryImage=True)
+    area = moments["m00"]
+    xx, yy, xy = moments["mu20"] / area, moments["mu02"] / area, moments["mu11"] / area
+
+    # The variances along and across the streak, less the 1/12 of a pixel that comes from each pixel being a square
+    mean = 0.5 * (xx + yy)
+    spread = math.hypot(0.5 * (xx - yy), xy)
+    along = max(mean + spread - 1 / 12.0, 1e-6)
+    across = max(mean - spread - 1 / 12.0, 1e-6)
+
+    # For a capsule with k = L / r: across = r^2 * (2k/3 + pi/4) / (2k + pi), and along / across grows with k
+    k = numpy.interp(along / across, _STREAK_VARIANCE_RATIOS, _STREAK_ELONGATIONS)
+    radius = math.sqrt(across * (2 * k + math.pi) / (2 * k / 3 + math.pi / 4))
+    return radius, k * radius, 0.5 * math.atan2(2 * xy, xx - yy)
+
+
+def score_blobs(stats, centroids, predicted_state, offset=(0, 0), scale=1.0):
+    """
+    Scores every blob on how much it looks like the ball, all at once. Bigger blobs score higher, but only by the
+    square root of their area, so that a big distractor can not win on size alone. Blobs that are not round (or that do
+    not fill their bounding box like a disk does) lose points, and so do blobs far from where the ball was predicted.
+    :param stats: The blob stats from find_blobs
+    :param centroids: The blob centroids from find_blobs
+    :param predicted_state: The BallState predicted for this frame, or None
+    :param offset: The (x, y) position of the mask's top left corner in the image it was cut out of
+    :param scale: The size of the image it was cut out of, compared to the full frame's (0.5 if it is half as wide and
+                  half as high)
+    :return: An array with one score per blob (log scale; higher is better, -inf means ruled out)
+    """
+    # The shape is judged in the mask's own pixels; only the size is put back into the full frame's
+    pixels = stats[:, cv2.CC_STAT_AREA].astype(numpy.float64)
+    width = stats[:, cv2.CC_STAT_WIDTH].astype(numpy.float64)
+    height = stats[:, cv2.CC_STAT_HEIGHT].astype(numpy.float64)
+    area = pixels / (scale * scale)
+
+    aspect = numpy.minimum(width, height) / numpy.maximum(width, height)
+    fill = pixels / (width * height)
+    roundness = aspect * numpy.minimum(fill / _DISK_FILL, _DISK_FILL / fill)
+
+    score = 0.5 * numpy.log(area) + config.BLOB_ROUNDNESS_WEIGHT * numpy.log(roundness)
+
+    if predicted_state:
+        # How far the ball could plausibly be from the prediction: a few radii, plus how far it moves in a frame
+        gate = config.BLOB_DISTANCE_SCALE * predicted_state.get_radius() + \
+            math.hypot(predicted_state.get_x_velocity(), predicted_state.get_y_velocity()) / config.CAMERA_FPS
+        dx = (centroids[:, 0] + offset[0]) / scale - predicted_state.get_x_pos()
+        dy = (centroids[:, 1] + offset[1]) / scale - predicted_state.get_y_pos()
+        score -= 0.5 * (dx * dx + dy * dy) / max(gate * gate, 1.0)
+
+    score[area < config.BLOB_MIN_AREA] = -numpy.inf
+    return score
+
+
+class Labels:
+    """
+    The label image from find_blobs, which only covers the bounding box of the white pixels in the mask.
+    """
+    def __init__(self, image, origin):
+        """
+        Constructor.
+        :param image: The label image. Blob i (its row in the stats) is labelled i + 1.
+        :param origin: The (x, y) position of the label image's top left corner in the mask
+        :return: void
+        """
+        self.image = image
+        self.origin = origin
+
+    def get_blob_mask(self, stats, index):
+        """
+        Gets a mask of one blob, covering just its bounding box.
+        :param stats: The blob stats from find_blobs
+        :param index: The row of the blob in stats
+        :return: A uint8 image that is 1 where the blob is and 0 elsewhere
+        """
+        left, top, width, height = stats[index, :4]
+        left -= self.origin[0]
+        top -= self.origin[1]
+        return (self.image[top:top + height, left:left + width] == index + 1).view(numpy.uint8)
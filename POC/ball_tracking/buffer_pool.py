@@ -0,0 +1,56 @@
+"""
+A module to hold a class that hands out reusable image buffers.
+"""
+
+import numpy
+
+
+class BufferPool:
+    """
+    A set of named, preallocated buffers for the image pipeline to write into instead of allocating new arrays every
+    frame.
+
+    Each name has one backing array, sized for the biggest shape it has been asked for so far (normally the frame
+    size, which only changes if the resolution does). Smaller requests, such as a search window, get a contiguous view
+    onto the front of that array, so steady state tracking does not allocate any image-sized arrays at all.
+
+    A buffer's contents are only valid until the next time the same name is asked for.
+    """
+    def __init__(self):
+        """
+        Constructor.
+        :return: void
+        """
+        self.__buffers = {}
+
+    def get(self, name, shape, dtype=numpy.uint8):
+        """
+        Gets a buffer. Its contents are whatever was left in it last time.
+        :param name: What the buffer is for. Each name gets its own memory.
+        :param shape: The shape the buffer needs to have
+        :param dtype: The type of the elements
+        :return: A contiguous numpy array of the given shape and dtype
+        """
+        key = (name, numpy.dtype(dtype))
+        size = int(numpy.prod(shape))
+        backing = self.__buffers.get(key)
+        if backing is None or backing.size < size:
+            backing = numpy.empty(size, dtype=dtype)
+            self.__buffers[key] = backing
+        return backing[:size].reshape(shape)
+
+    def get_like(self, name, image):
+        """
+        Gets a buffer with the same shape and dtype as the given image.
+        :param name: What the buffer is for
+        :param image: The image to match
+        :return: A contiguous numpy array shaped like image
+        """
+        return self.get(name, image.shape, image.dtype)
+
+    def get_num_bytes(self):
+        """
+        Gets the total amount of memory held by this pool.
+        :return: The number of bytes in all of the backing arrays
+        """
+        return sum(backing.nbytes for backing in self.__buffers.values())
@@ -0,0 +1,120 @@
+"""
+A module to hold a class that turns a BGR image straight into a mask of the pixels that are the ball's color.
+"""
+
+import buffer_pool
+import cv2
+import numpy
+import os
+
+
+class ColorTable:
+    """
+    A lookup table from BGR color to mask value (0 or 255) for one HSV range.
+
+    This does the same thing as cv2.cvtColor(image, cv2.COLOR_BGR2HSV) followed by cv2.inRange(hsv, lower, upper), but
+    as a single table lookup per pixel. The table only depends on the HSV range, so it is built once and cached on disk.
+
+    With bits=8 every BGR color gets its own entry (16 MB) and the mask is identical to the two-step version. With fewer
+    bits, each channel is quantized to that many bits and each bin is classified by the color at its center, which
+    shrinks the table to 2**(3 * bits) bytes at the cost of being slightly off at the edges of the range.
+
+    Assumes a little-endian machine, where a BGRA pixel read as a uint32 is B | G << 8 | R << 16 | A << 24.
+    """
+    def __init__(self, hsv_lower, hsv_upper, bits=8, cache_dir=None):
+        """
+        Constructor. Loads the table from cache_dir if it is there, otherwise builds it (and saves it there).
+        :param hsv_lower: The lower (h, s, v) bound, as given to cv2.inRange
+        :param hsv_upper: The upper (h, s, v) bound, as given to cv2.inRange
+        :param bits: How many bits of each of B, G and R to look up. 1 to 8.
+        :param cache_dir: The directory to cache the table in, or None to not cache it
+        :return: void
+        """
+        if not 1 <= bits <= 8:
+            raise ValueError("bits must be between 1 and 8, got " + str(bits))
+
+        self.__bits = bits
+        self.__shift = 8 - bits
+
+        cache_path = None
+        if cache_dir:
+            name = "color_table_%s_%s_%dbit.npy" % ("-".join(str(v) for v in hsv_lower),
+                                                    "-".join(str(v) for v in hsv_upper), bits)
+            cache_path = os.path.join(cache_dir, name)
+
+        self.__buffers = buffer_pool.BufferPool()
+
+        if cache_path and os.path.exists(cache_path):
+            self.__table = numpy.load(cache_path)
+        else:
+            self.__table = self.__build(hsv_lower, hsv_upper)
+            if cache_path:
+                numpy.save(cache_path, self.__table)
+
+    def apply(self, image, dst=None, buffers=None, buffer_prefix=""):
+        """
+        Makes the mask for the given image.
+        :param image: A BGR image (uint8, 3 channels)
+        :param dst: Optionally, a uint8 array the size of the image to write the mask into
+        :param buffers: The BufferPool to get working space from, or None to use this table's own (which is not safe to
+                        share between threads)
+        :param buffer_prefix: Put in front of the names of the working buffers, to keep them apart from other users'
+        :return: The mask: 255 where the pixel is in the HSV range, 0 where it is not
+        """
+        buffers = buffers or self.__buffers
+        shape = image.shape[:2]
+        if dst is None:
+            dst = numpy.empty(shape, dtype=numpy.uint8)
+
+        # Pad each pixel to 4 bytes and read it as one number; dropping the alpha byte leaves B | G << 8 | R << 16
+        if self.__bits != 8:
+            image = numpy.right_shift(image, self.__shift, out=buffers.get_like(buffer_prefix + "quantized", image))
+        bgra = cv2.cvtColor(image, cv2.COLOR_BGR2BGRA, dst=buffers.get(buffer_prefix + "bgra", shape + (4,)))
+        packed = bgra.view(numpy.uint32).reshape(shape)
+
+        if self.__bits == 8:
+            index = numpy.bitwise_and(packed, numpy.uint32(0x00FFFFFF), out=packed)
+        else:
+            # Squeeze the quantized channels together: B | G << bits | R << (2 * bits). The scalars are uint32 so that
+            # numpy does not pick a slower loop for them.
+            bits = self.__bits
+            channel_mask = (1 << bits) - 1
+            index = numpy.bitwise_and(packed, numpy.uint32(channel_mask),
+                                      out=buffers.get(buffer_prefix + "color_index", shape, numpy.uint32))
+            shifted = buffers.get(buffer_prefix + "color_shifted", shape, numpy.uint32)
+            for channel in (1, 2):
+                numpy.right_shift(packed, numpy.uint32(channel * (8 - bits)), out=shifted)
+                numpy.bitwise_and(shifted, numpy.uint32(channel_mask << (channel * bits)), out=shifted)
+                numpy.bitwise_or(index, shifted, out=index)
+
+        return numpy.take(self.__table, index, out=dst, mode='clip')
+
+    def get_bits(self):
+        """
+        Gets the number of bits per channel that this table looks up.
+        :return: bits
+        """
+        return self.__bits
+
+    def __build(self, hsv_lower, hsv_upper):
+        """
+        Classifies every (quantized) BGR color with cvtColor and inRange.
+        :param hsv_lower: The lower (h, s, v) bound
+        :param hsv_upper: The upper (h, s, v) bound
+        :return: The table as a flat uint8 array
+        """
+        bits = self.__bits
+        index = numpy.arange(2 ** (3 * bits), dtype=numpy.uint32)
+
+        # Each entry stands for the color at the center of its bin
+        half_bin = (1 << self.__shift) >> 1
+        mask = (1 << bits) - 1
+        colors = numpy.empty((index.size, 3), dtype=numpy.uint8)
+        for channel in range(3):
+            colors[:, channel] = (((index >> (channel * bits)) & mask) << self.__shift) + half_bin
+
+        # Lay the colors out as an image with a sensible number of rows for cvtColor
+        colors = colors.reshape((2 ** (2 * bits), 2 ** bits, 3))
+
+        hsv = cv2.cvtColor(colors, cv2.COLOR_BGR2HSV)
+        return cv2.inRange(hsv, hsv_lower, hsv_upper).ravel()
@@ -0,0 +1,152 @@
+"""
+A module for the erode/dilate stage of the image pipeline, done only where it is needed.
+
+Rectangles are (x0, y0, x1, y1) tuples, with x1 and y1 exclusive, in the coordinates of the image they are used with.
+"""
+
+import cv2
+
+
+def clean_mask(in_ranged, dst, erosions, dilate_iterations, buffers):
+    """
+    Erodes the mask one or more times, leaving some rectangles alone each time, and then dilates it. Each erosion is
+    computed only for the pixels outside of its rectangles, and no pixels are copied that don't have to be.
+
+    The result is identical to doing, for each erosion in order:
+        eroded = cv2.erode(image, None, iterations=iterations)
+        eroded[rectangle] = image[rectangle]  (for each rectangle)
+        image = eroded
+    followed by cv2.dilate(image, None, iterations=dilate_iterations).
+
+    :param in_ranged: The mask to clean. It is used as working space and is overwritten.
+    :param dst: Where to put the result. Must be the same shape as in_ranged, and not in_ranged itself.
+    :param erosions: A list of (rectangles, iterations), one per erosion.
+    :param dilate_iterations: How many times to dilate at the end.
+    :param buffers: A BufferPool for scratch space.
+    :return: dst
+    """
+    image = in_ranged
+    for i, (rectangles, iterations) in enumerate(erosions):
+        if i == len(erosions) - 1:
+            # The last erosion goes into its own buffer, since dilate can not work in place
+            eroded = buffers.get_like("clean_mask", image)
+            erode_except(image, eroded, rectangles, iterations, buffers)
+            image = eroded
+        else:
+            erode_except(image, image, rectangles, iterations, buffers)
+
+    return cv2.dilate(image, None, dst=dst, iterations=dilate_iterations)
+
+
+def erode_except(src, dst, rectangles, iterations, buffers):
+    """
+    Sets dst to src inside the given rectangles and to src eroded with the default 3x3 kernel everywhere else.
+    :param src: The image to erode.
+    :param dst: Where to put the result. May be src itself, in which case it is done in place.
+    :param rectangles: The rectangles to leave alone. May be empty, and may hang off of the image.
+    :param iterations: How many times to erode.
+    :param buffers: A BufferPool for scratch space.
+    :return: dst
+    """
+    height, width = src.shape[:2]
+    rectangles = [r for r in (clip_rectangle(r, width, height) for r in rectangles) if r]
+    excluded_area = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in rectangles)
+
+    if dst is not src and excluded_area * 2 < width * height:
+        # Mostly eroding anyway, so erode all of it in one go and put the few rectangles back
+        cv2.erode(src, None, dst=dst, iterations=iterations)
+        for x0, y0, x1, y1 in rectangles:
+            dst[y0:y1, x0:x1] = src[y0:y1, x0:x1]
+        return dst
+
+    # Erode only the parts outside of the rectangles. Each part is eroded with enough of a halo around it that its own
+    # pixels come out exactly as if the whole image had been eroded; the halo is thrown away. Everything is eroded
+    # before anything is written back, so that doing this in place does not feed eroded pixels into a later part.
+    eroded_parts = []
+    for i, (x0, y0, x1, y1) in enumerate(_complement(rectangles, width, height)):
+        hx0, hy0 = max(0, x0 - iterations), max(0, y0 - iterations)
+        hx1, hy1 = min(width, x1 + iterations), min(height, y1 + iterations)
+        region = src[hy0:hy1, hx0:hx1]
+        eroded = cv2.erode(region, None, dst=buffers.get_like("erode_except_%d" % i, region), iterations=iterations)
+        eroded_parts.append(((x0, y0, x1, y1), eroded[y0 - hy0:y1 - hy0, x0 - hx0:x1 - hx0]))
+
+    for (x0, y0, x1, y1), eroded in eroded_parts:
+        dst[y0:y1, x0:x1] = eroded
+
+    if dst is not src:
+        for x0, y0, x1, y1 in rectangles:
+            dst[y0:y1, x0:x1] = src[y0:y1, x0:x1]
+
+    return dst
+
+
+def clip_rectangle(rectangle, width, height):
+    """
+    Clips a rectangle to an image.
+    :param rectangle: (x0, y0, x1, y1)
+    :param width: The image's width
+    :param height: The image's height
+    :return: The clipped rectangle, or None if nothing of it is left
+    """
+    x0, y0, x1, y1 = rectangle
+    x0, y0 = max(0, x0), max(0, y0)
+    x1, y1 = min(width, x1), min(height, y1)
+    if x0 >= x1 or y0 >= y1:
+        return None
+    return x0, y0, x1, y1
+
+
+def rectangle_from_slices(x_slice, y_slice, width, height):
+    """
+    Gets the rectangle that image[y_slice, x_slice] would cover, following numpy's rules for negative and out of range
+    slice bounds.
+    :param x_slice: The slice along x
+    :param y_slice: The slice along y
+    :param width: The image's width
+    :param height: The image's height
+    :return: (x0, y0, x1, y1), or None if the slices select nothing
+    """
+    x0, x1, _ = x_slice.indices(width)
+    y0, y1, _ = y_slice.indices(height)
+    if x0 >= x1 or y0 >= y1:
+        return None
+    return x0, y0, x1, y1
+
+
+def _complement(rectangles, width, height):
+    """
+    Splits the part of the image that is outside of all of the given rectangles into rectangles.
+    :param rectangles: Clipped rectangles
+    :param width: The image's width
+    :param height: The image's height
+    :return: A list of rectangles that together cover exactly the pixels outside of the given ones
+    """
+    ys = sorted(set([0, height] + [y for r in rectangles for y in (r[1], r[3])]))
+
+    parts = []
+    open_parts = {}
+    for y0, y1 in zip(ys[:-1], ys[1:]):
+        covering = sorted((r[0], r[2]) for r in rectangles if r[1] <= y0 and r[3] >= y1)
+
+        # Walk across the band and collect the gaps between the rectangles that cover it
+        gaps = []
+        x = 0
+        for x0, x1 in covering:
+            if x0 > x:
+                gaps.append((x, x0))
+            x = max(x, x1)
+        if x < width:
+            gaps.append((x, width))
+
+        # Stretch the parts from the band above down into this band where the gaps line up
+        still_open = {}
+        for gap in gaps:
+            part = open_parts.pop(gap, None)
+            if part is None:
+                part = [gap[0], y0, gap[1], y1]
+                parts.append(part)
+            part[3] = y1
+            still_open[gap] = part
+        open_parts = still_open
+
+    return [tuple(part) for part in parts]
@@ -0,0 +1,88 @@
+"""
+A module to hold a class that makes the cleaned up mask in horizontal tiles, in parallel.
+"""
+
+import buffer_pool
+import morphology
+from multiprocessing.pool import ThreadPool
+
+# Tiles are never made thinner than this many rows (not counting the halo), since then the halo would be most of the
+# work
+_MIN_TILE_ROWS = 64
+
+
+class TiledMasker:
+    """
+    Splits an image into horizontal tiles and makes the cleaned up mask for each one on its own thread. OpenCV lets go
+    of the GIL while it works, so the tiles really do run at the same time.
+
+    The color thresholding only looks at one pixel at a time, but each erode or dilate looks one pixel further out, so
+    each tile is processed with a halo of as many extra rows above and below it as there are erode and dilate
+    iterations in total. The halo rows come out wrong (they are missing their own neighbours) and are thrown away; the
+    rest of the rows come out exactly as if the whole image had been done in one go.
+    """
+    def __init__(self, num_workers):
+        """
+        Constructor.
+        :param num_workers: The number of threads, which is also the most tiles an image is split into
+        :return: void
+        """
+        self.__num_workers = num_workers
+        self.__pool = ThreadPool(num_workers)
+
+        # The buffer pools are not thread safe, so each tile gets its own
+        self.__buffers = [buffer_pool.BufferPool() for _ in range(num_workers)]
+
+    def clean_mask(self, image, dst, make_mask, erosions, dilate_iterations):
+        """
+        Does make_mask() followed by morphology.clean_mask() on the image, one tile per thread.
+        :param image: The BGR image
+        :param dst: Where to put the mask. Must be the size of the image.
+        :param make_mask: A function (image, dst, buffers) that thresholds image into dst, using the BufferPool buffers
+                          for scratch space
+        :param erosions: As for morphology.clean_mask, with the rectangles in the image's coordinates
+        :param dilate_iterations: As for morphology.clean_mask
+        :return: dst
+        """
+        height = image.shape[0]
+        halo = sum(iterations for _, iterations in erosions) + dilate_iterations
+        num_tiles = max(1, min(self.__num_workers, height // _MIN_TILE_ROWS))
+        bounds = [height * i // num_tiles for i in range(num_tiles + 1)]
+
+        def clean_tile(i):
+            y0, y1 = bounds[i], bounds[i + 1]
+            halo_y0, halo_y1 = max(0, y0 - halo), min(height, y1 + halo)
+            tile = image[halo_y0:halo_y1]
+            buffers = self.__buffers[i]
+
+            in_ranged = buffers.get("in_ranged", tile.shape[:2])
+            make_mask(tile, in_ranged, buffers)
+
+            # Move the rectangles into the tile's coordinates; clean_mask clips off whatever is not in the tile
+            tile_erosions = [([(x0, ry0 - halo_y0, x1, ry1 - halo_y0) for x0, ry0, x1, ry1 in rectangles], iterations)
+                             for rectangles, iterations in erosions]
+            cleaned = morphology.clean_mask(in_ranged, buffers.get_like("dilated", in_ranged), tile_erosions,
+                                            dilate_iterations, buffers)
+            dst[y0:y1] = cleaned[y0 - halo_y0:y1 - halo_y0]
+
+        if num_tiles == 1:
+            # Not worth handing to another thread
+            clean_tile(0)
+        else:
+            self.__pool.map(clean_tile, range(num_tiles))
+        return dst
+
+    def close(self):
+        """
+        Stops the threads.
+        :return: void
+        """
+        self.__pool.close()
+        self.__pool.join()
+
+    def get_num_workers(self):
+        """
+        Gets the number of threads that the tiles are spread over.
+        :return: The number of threads
+        """
+        return self.__num_workers
@@ -0,0 +1,212 @@
+"""
+A module to hold a class for grabbing frames from the camera on a background thread.
+"""
+
+import cv2
+import numpy
+import sys
+import threading
+import time
+
+
+class FrameGrabber:
+    """
+    A class that reads frames from an open camera on its own thread into a small, preallocated ring of frame buffers.
+
+    The consumer always gets the newest frame that has been captured. If the consumer is slower than the camera, older
+    frames that were never read are overwritten and counted as dropped, so that processing time never turns into
+    capture lag.
+    """
+    def __init__(self, camera, ring_size=3, drop_frames=True, frame_shape=None, video_time=False):
+        """
+        Constructor.
+        :param camera: An open reference to a video or webcam (anything with read() and release()).
+        :param ring_size: The number of frame buffers to keep. Must be at least 3: one being written by the capture
+                          thread, one waiting to be read, and one held by the consumer.
+        :param drop_frames: If True, unread frames are overwritten by newer ones (use this for live video). If False,
+                            the capture thread waits for the consumer instead (use this for recorded video, where
+                            every frame should be processed).
+        :param frame_shape: The (height, width, channels) of the camera's frames, if known, so that the buffers can be
+                            allocated up front. Otherwise they are allocated by the camera on first use.
+        :param video_time: If True, each frame's timestamp is its position in the video (use this for recorded video,
+                           which is read faster or slower than it was captured). If False, it is when it was read.
+        :return: void
+        """
+        if ring_size < 3:
+            raise ValueError("ring_size must be at least 3, got " + str(ring_size))
+
+        self.__camera = camera
+        self.__drop_frames = drop_frames
+        self.__video_time = video_time
+        if frame_shape and all(frame_shape):
+            self.__buffers = [numpy.empty(frame_shape, dtype=numpy.uint8) for _ in range(ring_size)]
+        else:
+            self.__buffers = [None] * ring_size
+        self.__timestamps = [0.0] * ring_size
+
+        self.__latest = None
+        self.__in_use = None
+        self.__next_slot = 0
+        self.__last_timestamp = None
+        self.__dropped_frames = 0
+        self.__captured_frames = 0
+        self.__stopped = False
+        self.__error = None
+
+        self.__condition = threading.Condition()
+        self.__thread = threading.Thread(target=self.__capture_loop, name="FrameGrabber")
+        self.__thread.daemon = True
+
+    def get_captured_frames(self):
+        """
+        Gets the number of frames that the capture thread has read from the camera.
+        :return: The number of frames captured so far
+        """
+        return self.__captured_frames
+
+    def get_dropped_frames(self):
+        """
+        Gets the number of frames that were captured but overwritten before the consumer read them.
+        :return: The number of frames dropped so far
+        """
+        return self.__dropped_frames
+
+    def get_last_timestamp(self):
+        """
+        Gets the capture timestamp of the frame most recently returned by read().
+        :return: The time (as from time.time()) at which that frame was captured, or None if no frame has been read
+        """
+        return self.__last_timestamp
+
+    def read(self):
+        """
+        Waits for and returns the newest frame that has not been read yet. Mirrors cv2.VideoCapture.read().
+        The returned frame is a view onto one of the ring buffers; it stays valid until the next call to read().
+        :return: A tuple: (grabbed, frame). grabbed is False once the camera has no more frames.
+        :raises Exception: Whatever the camera raised, if reading from it failed on the capture thread
+        """
+        with self.__condition:
+            # Hand the buffer we were holding back to the capture thread
+            self.__in_use = None
+            self.__condition.notify_all()
+
+            while self.__latest is None and not self.__stopped:
+                self.__condition.wait()
+
+            if self.__latest is None:
+                if self.__error:
+                    error, self.__error = self.__error, None
+                    raise error[0], error[1], error[2]
+                return False, None
+
+            self.__in_use = self.__latest
+            self.__latest = None
+            self.__last_timestamp = self.__timestamps[self.__in_use]
+            self.__condition.notify_all()
+            return True, self.__buffers[self.__in_use]
+
+    def release(self):
+        """
+        Stops the capture thread and releases the camera.
+        :return: void
+        """
+        with self.__condition:
+            self.__stopped = True
+            self.__condition.notify_all()
+        if self.__thread.is_alive():
+            self.__thread.join()
+        self.__camera.release()
+
+    def start(self):
+        """
+        Starts the capture thread.
+        :return: This object, for convenience
+        """
+        self.__thread.start()
+        return self
+
+    def __capture_loop(self):
+        """
+        Reads frames from the camera until it runs out of frames or this object is released. If reading fails, the
+        error is kept for read() to raise once the consumer has had the frames captured before it.
+        :return: void
+        """
+        try:
+            self.__read_frames()
+        except Exception:
+            self.__error = sys.exc_info()
+        finally:
+            # However the loop ended, never leave the consumer waiting in read() for a frame that will not come
+            with self.__condition:
+                self.__stopped = True
+                self.__condition.notify_all()
+
+    def __read_frames(self):
+        """
+        The capture thread's loop.
+        :return: void
+        """
+        while True:
+            with self.__condition:
+                slot = self.__next_free_slot()
+                while slot is None and not self.__stopped:
+                    self.__condition.wait()
+                    slot = self.__next_free_slot()
+                if self.__stopped:
+                    return
+
+            # Read outside of the lock so that the consumer can keep working on the frame it holds
+            grabbed, frame = self.__camera.read(self.__buffers[slot])
+            timestamp = get_video_timestamp(self.__camera) if self.__video_time else time.time()
+            if not grabbed:
+                return
+
+            with self.__condition:
+                # The camera only reuses our buffer if it has the right shape; keep whatever it gave us
+                self.__buffers[slot] = frame
+                self.__timestamps[slot] = timestamp
+                self.__captured_frames += 1
+                if self.__latest is not None:
+                    self.__dropped_frames += 1
+                self.__latest = slot
+                self.__condition.notify_all()
+
+    def __next_free_slot(self):
+        """
+        Finds a buffer that the capture thread is allowed to write into. Must be called with the lock held.
+        :return: The index of a free buffer, or None if the capture thread has to wait for the consumer
+        """
+        if self.__latest is not None and not self.__drop_frames:
+            return None
+
+        # Walk the ring starting after the buffer we wrote last, skipping the ones that are spoken for
+        for offset in range(len(self.__buffers)):
+            slot = (self.__next_slot + offset) % len(self.__buffers)
+            if slot != self.__latest and slot != self.__in_use:
+                self.__next_slot = (slot + 1) % len(self.__buffers)
+                return slot
+        return None
+
+
+def get_frame_timestamp(camera, video_time):
+    """
+    Gets when the frame that the camera last returned from read() was captured.
+    :param camera: A FrameGrabber, or an open cv2.VideoCapture
+    :param video_time: For a cv2.VideoCapture, whether it is recorded video, whose frames should be timed by their
+                       position in the video rather than by when they were read
+    :return: The time in seconds: as from time.time() for live video, or from the start of a recorded video
+    """
+    if isinstance(camera, FrameGrabber):
+        return camera.get_last_timestamp()
+    if video_time:
+        return get_video_timestamp(camera)
+    return time.time()
+
+
+def get_video_timestamp(camera):
+    """
+    Gets the position in a recorded video of the frame that was last read from it.
+    :param camera: An open cv2.VideoCapture
+    :return: The time in seconds from the start of the video
+    """
+    return camera.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
@@ -7,6 +7,56 @@ Tune these to your specifications.
 USE_LIVE_VIDEO = False
 PATH_TO_VIDEO = "pong2.mp4"
 
+# If True, nothing is drawn or shown and the program never waits for a key press, so recorded video is processed as
+# fast as possible. This is the production/benchmark mode. Can also be turned on with --headless on the command line.
+HEADLESS = False
+
+# If True, frames are read from the camera on a background thread into a ring of CAPTURE_RING_SIZE buffers, and the
+# tracker always gets the newest one. For live video, frames that arrive while the tracker is busy are dropped.
+USE_CAPTURE_THREAD = True
+CAPTURE_RING_SIZE = 3
+
+# What to ask a live camera for when it is opened (None leaves the driver's default). Run the camera as fast as it
+# goes and set CAMERA_FPS to match: the tracker works from each frame's capture timestamp, so its velocities stay in
+# pixels per second whatever the frame rate, and dropped frames do not throw them off. Most USB cameras only reach
+# their top frame rates with compressed ("MJPG") frames, and a driver buffer of 1 frame keeps them from handing over
+# old frames.
+CAMERA_FOURCC = "MJPG"
+CAMERA_BUFFER_SIZE = 1
+
+# If True, capture, detection, prediction and publishing run as separate processes that hand frames to each other
+# through PIPELINE_NUM_SLOTS shared memory frame buffers. Sustained FPS is then limited by the slowest stage. So far
+# this has not been any faster than running everything in one process (35.7 vs 35.8 fps on pong2.avi, headless):
+# detection takes nearly all of each frame, so there is little left to overlap with it. If a stage fails, the others
+# get PIPELINE_STOP_TIMEOUT seconds to finish before they are terminated.
+USE_PIPELINE = False
+PIPELINE_NUM_SLOTS = 4
+PIPELINE_STOP_TIMEOUT = 2.0
+
+# How the ball tracker predicts the ball's next state (see prediction/predictors.py):
+#   "averaging": the measured velocity, moved towards the average of the last few (keeping VELOCITY_BLEND of it)
+#   "alpha_beta": an alpha-beta filter, with gains ALPHA_BETA_ALPHA and ALPHA_BETA_BETA
+#   "kalman": the Kalman filter in kalman/control.py (with its Q and R scaled by KALMAN_Q_SCALE and KALMAN_R_SCALE).
+#             The states the tracker gives out are then the filtered ones.
+# scripts_and_stuff/benchmark_predictors.py compares their cost and accuracy on recorded datalogs, and
+# scripts_and_stuff/tune_predictor.py tunes their settings.
+PREDICTOR = "averaging"
+ALPHA_BETA_ALPHA = 1.0
+ALPHA_BETA_BETA = 0.6
+
+# Once no element of the Kalman gain changes by more than this from one update to the next, the gain is frozen and the
+# filter stops updating its covariance, which makes each update several times cheaper. None to always update it.
+KALMAN_STEADY_STATE_TOLERANCE = 1e-9
+
+# What to multiply the Kalman filter's Q and R (in kalman/control.py) by
+KALMAN_Q_SCALE = 1.0
+KALMAN_R_SCALE = 1.0
+
+# How much of each frame's measured velocity the ball tracker keeps; the rest comes from the average of the last
+# HISTORY_DEPTH velocities
+VELOCITY_BLEND = 0.6
+HISTORY_DEPTH = 3
+
 # HSV values for a white ball:
 WHITE_HSV_LOWER = (51, 0, 149)
 WHITE_HSV_UPPER = (105, 57, 255)
@@ -25,16 +75,144 @@ BALL_RADIUS = 0.75
 IMAGE_WIDTH = 900
 IMAGE_HEIGHT = 900
 
+# Frames per second of the camera (or of the recorded video). Live cameras are asked for this rate. The predictors
+# predict this far ahead (one frame), and the search window and blob scores allow for this much movement per frame.
+CAMERA_FPS = 30.0
+
+# If True, prediction/ballistic.py fits a trajectory with gravity and table bounces to the last BALLISTIC_HISTORY
+# measurements, looks BALLISTIC_STEPS frames ahead, and sends where and when the ball will reach the robot (at
+# INTERCEPT_DISTANCE inches from the camera) after each measured state. The camera is assumed to be level,
+# CAMERA_HEIGHT_ABOVE_TABLE inches above the table. Measurements more than BALLISTIC_MAX_GAP seconds apart are not
+# fitted together. The ball has only bounced if it was falling faster than BALLISTIC_BOUNCE_MIN_SPEED inches per second
+# before it turned back up; slower than that, it is measurement noise (or a ball that is not moving).
+USE_BALLISTIC_PREDICTOR = False
+BALLISTIC_HISTORY = 8
+BALLISTIC_STEPS = 30
+BALLISTIC_MAX_GAP = 0.2
+BALLISTIC_BOUNCE_MIN_SPEED = 10.0
+GRAVITY = 386.09  # inches/s^2
+CAMERA_HEIGHT_ABOVE_TABLE = 12.0
+TABLE_RESTITUTION = 0.89
+INTERCEPT_DISTANCE = 12.0
+
 # The actual hsv values that the ball_tracker will use
 hsv_lower_range = ORANGE_HSV_LOWER
 hsv_upper_range = ORANGE_HSV_UPPER
 
+# If True, the HSV conversion and thresholding are done in one step with a lookup table from BGR color straight to the
+# mask. The table is built for hsv_lower_range/hsv_upper_range and cached in this directory. COLOR_TABLE_BITS is the
+# number of bits per color channel it looks up: 8 gives exactly the same mask (16 MB table). Fewer bits use less memory
+# but cost time as well as mask accuracy, as each pixel's color has to be cut down before it is looked up: at 900x900,
+# 6 bits takes 3.7 ms against 2.9 ms for cvtColor and inRange, while 8 bits takes 1.3 ms. Even 8 bits only wins while
+# the frame's colors stay in a small part of the table; on a frame of random noise it takes 2.8 ms against 1.8 ms.
+USE_COLOR_TABLE = False
+COLOR_TABLE_BITS = 8
+
+# If more than 1, the mask is made in this many horizontal tiles at once, one per thread (each with a few extra rows
+# above and below for the erode/dilate to work with). The mask comes out exactly the same. Set it to the number of
+# cores.
+TILE_WORKERS = 1
+
+# If True, once the ball has been found only a window around its predicted position is processed. The window reaches
+# ROI_RADIUS_SCALE predicted radii plus ROI_VELOCITY_SCALE frames' worth of predicted motion from the predicted
+# position, and grows with each miss. After ROI_MAX_MISSES misses in a row the whole frame is searched again.
+USE_ROI_TRACKING = False
+ROI_RADIUS_SCALE = 4
+ROI_VELOCITY_SCALE = 2
+ROI_MAX_MISSES = 3
+
+# If True, whenever the ball has to be found from scratch (no prediction, or ROI_MAX_MISSES misses in a row) it is
+# first looked for in a copy of the frame that is PYRAMID_SCALE (2 or 4) times smaller in each direction. The ball is
+# then measured at full size, in a window around what was found that is PYRAMID_MARGIN_SCALE * PYRAMID_SCALE pixels
+# (plus half the blob) bigger on each side. At 4, the ball is only a few pixels across in the small copy, which is too
+# few for its shape to set it apart from a bigger blob nearby, so a distractor can win there.
+USE_PYRAMID_SEARCH = False
+PYRAMID_SCALE = 2
+PYRAMID_MARGIN_SCALE = 4
+
+# If True, the main loop tries to process each frame in FRAME_BUDGET_MS milliseconds. When it takes longer, it works
+# its way down QUALITY_LEVELS, which go from best to cheapest. Each level is (processing scale, ROI_RADIUS_SCALE,
+# erode/dilate iterations): the frame is processed at that fraction of IMAGE_WIDTH x IMAGE_HEIGHT, with search windows
+# that size and that much mask clean up. If the cheapest level still takes too long, frames are skipped to catch up.
+# Once frames take less than FRAME_BUDGET_HEADROOM of the budget, it works its way back up. It waits
+# FRAME_BUDGET_SETTLE_FRAMES frames after each change before changing again. FRAME_BUDGET_SMOOTHING is how much weight
+# the latest frame time gets in the average that all of this goes by. Half scale finds the ball within about 2 pixels
+# of where full scale does, with noise added to the frames as well; below that, see PYRAMID_SCALE.
+USE_FRAME_BUDGET = False
+FRAME_BUDGET_MS = 33.0
+QUALITY_LEVELS = [(1.0, ROI_RADIUS_SCALE, 2), (0.5, ROI_RADIUS_SCALE, 1), (0.5, 2, 1)]
+FRAME_BUDGET_HEADROOM = 0.7
+FRAME_BUDGET_SETTLE_FRAMES = 10
+FRAME_BUDGET_SMOOTHING = 0.2
+
+# How the ball is picked out of the white blobs left in the mask (see ball_tracking/blobs.py). Blobs smaller than
+# BLOB_MIN_AREA pixels are ignored. BLOB_ROUNDNESS_WEIGHT is how much being round counts against being big.
+# BLOB_DISTANCE_SCALE is how many predicted radii (on top of a frame's worth of motion) the ball may be from where it
+# was predicted before that starts to count against it.
+BLOB_MIN_AREA = 0
+BLOB_ROUNDNESS_WEIGHT = 2
+BLOB_DISTANCE_SCALE = 4
+
+# If True, the ball's blob is measured as a motion blur streak (see blobs.measure_streak) instead of by its smallest
+# enclosing circle: the radius comes from the streak's width, so a fast ball does not look closer than it is, and the
+# streak's length over CAMERA_EXPOSURE_TIME (the camera's shutter time, in seconds) gives the ball's speed across the
+# frame from a single frame. The predictors start from that velocity instead of from standing still. Streaks shorter
+# than STREAK_MIN_ELONGATION radii are taken to be a still ball.
+USE_STREAK_MEASUREMENT = False
+CAMERA_EXPOSURE_TIME = 1 / 120.0
+STREAK_MIN_ELONGATION = 0.5
+
 # Top left point for the rectangle that will be the portion of the image we process
 TOP_LEFT = (int(IMAGE_WIDTH / 3), 0)
 
 # Bottom right point for the rectangle that will be the portion of the image we process
 BOTTOM_RIGHT = (int(IMAGE_WIDTH * 4.5 / 3), IMAGE_HEIGHT)
 
+# What is recorded for each frame. With USE_COLUMNAR_RECORDER, the full-precision state (with its timestamp, velocity
+# and radius) is kept in memory and written out by a background thread in chunks of RECORDER_CHUNK_ROWS frames, as .npy
+# files in a new directory under RECORDING_DIRECTORY for each run (see data_recorder/columnar_recorder.py;
+# scripts_and_stuff/export_recording.py turns one into a CSV datalog). Otherwise the positions are written to
+# DATALOG_PATH as they come, as integer CSV.
+USE_COLUMNAR_RECORDER = True
+RECORDING_DIRECTORY = "recordings"
+RECORDER_CHUNK_ROWS = 1024
+DATALOG_PATH = "datalogFORPONG2.csv"
+
 # TCP stuff
 TCP_IP = '127.0.0.1'
 TCP_PORT = 5005
+
+# If True, ball states are sent in the binary format in networking/wire_protocol.py, which also carries a sequence
+# number, the capture and send timestamps, the predicted state and a confidence; up to WIRE_BATCH_SIZE of them are
+# written at once (1 sends every state as soon as it is known). If False, they are sent as text, with
+# BallState.format_for_sending(), which is what the receiver on the robot reads. Only turn this on once the receiver
+# decodes the binary format (see networking/message_decoder.py).
+USE_BINARY_PROTOCOL = False
+WIRE_BATCH_SIZE = 1
+
+# Ball states are sent by a background thread (networking/state_publisher.py), which only ever keeps the newest one, so
+# that a slow or missing robot never holds up the vision loop. A send that blocks for longer than
+# PUBLISHER_SEND_TIMEOUT seconds drops the connection; the thread then tries to connect again, waiting
+# PUBLISHER_RECONNECT_MIN_DELAY seconds after the first failure and twice as long after each one after that, up to
+# PUBLISHER_RECONNECT_MAX_DELAY.
+PUBLISHER_CONNECT_TIMEOUT = 1.0
+PUBLISHER_SEND_TIMEOUT = 0.5
+PUBLISHER_RECONNECT_MIN_DELAY = 0.1
+PUBLISHER_RECONNECT_MAX_DELAY = 2.0
+
+# "client" connects to TCP_IP:TCP_PORT and sends the states to whatever is listening there, as above. "server" listens
+# on TCP_IP:TCP_PORT instead and sends them to everything that connects (networking/state_server.py), keeping up to
+# SERVER_MAX_BATCHES unsent batches for each subscriber (past a SERVER_SEND_BUFFER byte socket buffer) before dropping
+# its oldest. If SERVER_UDP_PORT is set, anything that sends a datagram to that port also gets each batch as a datagram,
+# for as long as it sends another at least every SERVER_UDP_TIMEOUT seconds. When the program ends, the server waits up
+# to SERVER_STOP_TIMEOUT seconds for the TCP subscribers to take the batches still queued for them.
+NETWORK_MODE = "client"
+SERVER_MAX_BATCHES = 8
+SERVER_SEND_BUFFER = 8192
+SERVER_UDP_PORT = None
+SERVER_UDP_TIMEOUT = 5.0
+SERVER_STOP_TIMEOUT = 0.5
+
+# "shared_memory" skips the network and keeps the newest state in the file at SHARED_MEMORY_PATH instead, for a robot
+# controller on the same machine to map and read with networking/shared_state_reader.py
+SHARED_MEMORY_PATH = "/dev/shm/pongbot_ball_state"
@@ -0,0 +1,180 @@
+"""
+A module for holding a class that records the ball's state for every frame into binary, column by column, files.
+"""
+
+import numpy
+import os
+import Queue
+import sys
+import threading
+
+# The values kept for each frame, in order. All of them are NaN for a frame where the ball was not found, except the
+# timestamp.
+COLUMNS = ("timestamp", "x", "y", "d", "vx", "vy", "vd", "radius", "px", "py", "pd")
+_MISS = (float('nan'),) * (len(COLUMNS) - 1)
+
+# The file in a recording that lists COLUMNS, one to a line, and the names of the chunk files
+COLUMNS_FILE = "columns.txt"
+CHUNK_FILE = "chunk_%06d.npy"
+
+
+class ColumnarRecorder:
+    """
+    A class for recording data without slowing down the frame loop.
+
+    Each frame is one row, written in place into the next row of a preallocated (chunk_rows, len(COLUMNS)) float64
+    block, with full precision, so nothing is kept for a frame but its values. Once a block is full, a background
+    thread turns it into columns and writes it out as the next chunk of the recording: a .npy file holding a
+    (len(COLUMNS), rows) float64 array, so that each column is contiguous and can be read from a memory-mapped file on
+    its own. The frame loop carries on in the next block in the meantime; if the thread falls behind, another block is
+    allocated rather than waiting for it. If writing a chunk fails, the rest of the frames are not kept, and close()
+    raises the error.
+
+    A recording is a directory of chunks (see log_reader.read_recording()); scripts_and_stuff/export_recording.py turns
+    one into a CSV datalog.
+    """
+    def __init__(self, directory, chunk_rows=1024):
+        """
+        Constructor.
+        :param directory: The directory to write the recording to. It is made if it is not there, and should not hold
+                          another recording.
+        :param chunk_rows: How many frames go in each chunk
+        :return: void
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(os.path.join(directory, COLUMNS_FILE), 'w') as columns_file:
+            columns_file.write("\n".join(COLUMNS) + "\n")
+
+        self.__directory = directory
+        self.__chunk_rows = chunk_rows
+        self.__free_blocks = Queue.Queue()
+        self.__free_blocks.put(self.__new_block())
+        self.__block = self.__new_block()
+        self.__row = 0
+        self.__chunks = 0
+        self.__rows_recorded = 0
+        self.__extra_blocks = 0
+        self.__error = None
+
+        self.__full_blocks = Queue.Queue()
+        self.__thread = threading.Thread(target=self.__write_loop, name="ColumnarRecorder")
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def close(self):
+        """
+        Writes out whatever has been recorded and waits for the background thread to finish.
+        :return: void
+        :raises Exception: Whatever writing a chunk raised, if it failed
+        """
+        self.__hand_over_block()
+        self.__full_blocks.put(None)
+        self.__thread.join()
+        if self.__error:
+            error, self.__error = self.__error, None
+            raise error[0], error[1], error[2]
+
+    def get_directory(self):
+        """
+        Gets the directory that the recording is being written to.
+        :return: The path
+        """
+        return self.__directory
+
+    def get_extra_blocks(self):
+        """
+        Gets the number of times that the background thread fell behind and a block had to be allocated.
+        :return: The number of extra blocks allocated so far
+        """
+        return self.__extra_blocks
+
+    def get_rows_recorded(self):
+        """
+        Gets the number of frames recorded.
+        :return: The number of rows so far
+        """
+        return self.__rows_recorded
+
+    def record_data(self, timestamp, measured_state, predicted_state):
+        """
+        Record the measured and predicted data.
+        :param timestamp: When the frame was captured, in seconds
+        :param measured_state: The BallState measured in the frame (velocities it leaves as None are recorded as NaN)
+        :param predicted_state: The BallState predicted for the next frame
+        :return: void
+        """
+        self.__block[self.__row] = (timestamp, measured_state.get_x_pos(), measured_state.get_y_pos(),
+                                    measured_state.get_d_pos(), measured_state.get_x_velocity(),
+                                    measured_state.get_y_velocity(), measured_state.get_d_velocity(),
+                                    measured_state.get_radius(), predicted_state.get_x_pos(),
+                                    predicted_state.get_y_pos(), predicted_state.get_d_pos())
+        self.__next_row()
+
+    def record_miss(self, timestamp):
+        """
+        Record a frame in which the ball was not found, as a row of NaN, so that the rows stay one per frame.
+        :param timestamp: When the frame was captured, in seconds
+        :return: void
+        """
+        self.__block[self.__row] = (timestamp,) + _MISS
+        self.__next_row()
+
+    def __hand_over_block(self):
+        """
+        Gives the rows in the current block to the background thread, and starts on a free block.
+        :return: void
+        """
+        if not self.__row:
+            return
+        if self.__error:
+            # Nothing is writing the blocks out any more, so keep reusing this one instead of piling up new ones
+            self.__row = 0
+            return
+
+        self.__full_blocks.put((self.__chunks, self.__block, self.__row))
+        self.__chunks += 1
+        try:
+            self.__block = self.__free_blocks.get_nowait()
+        except Queue.Empty:
+            self.__block = self.__new_block()
+            self.__extra_blocks += 1
+        self.__row = 0
+
+    def __new_block(self):
+        """
+        Allocates a block for a chunk.
+        :return: A (chunk_rows, len(COLUMNS)) float64 array
+        """
+        return numpy.empty((self.__chunk_rows, len(COLUMNS)), dtype=numpy.float64)
+
+    def __next_row(self):
+        """
+        Moves on to the next row, handing the block over once it is full.
+        :return: void
+        """
+        self.__row += 1
+        self.__rows_recorded += 1
+        if self.__row == self.__chunk_rows:
+            self.__hand_over_block()
+
+    def __write_loop(self):
+        """
+        Writes out the blocks that the frame loop hands over, until close() is called. If writing one fails, the error
+        is kept for close() to raise, and the blocks still to be written are dropped.
+        :return: void
+        """
+        while True:
+            item = self.__full_blocks.get()
+            if item is None:
+                return
+            if self.__error:
+                continue
+
+            chunk, block, rows = item
+            try:
+                columns = numpy.ascontiguousarray(block[:rows].T)
+                numpy.save(os.path.join(self.__directory, CHUNK_FILE % chunk), columns)
+            except Exception:
+                self.__error = sys.exc_info()
+            self.__free_blocks.put(block)
@@ -5,7 +5,9 @@ A module for holding a class for recording data.
 
 class DataRecorder:
     """
-    A class for recording data.
+    A class for recording data, as one line of CSV per frame, written as it comes: the measured x, y, d and the
+    predicted x, y, d, as integers. See ColumnarRecorder for one that keeps everything at full precision, off the
+    frame loop.
     """
     def __init__(self, log_file):
         """
@@ -15,10 +17,32 @@ class DataRecorder:
         """
         self.log_file = log_file
 
-    def record_data(self, x, y, d, nx, ny, nd):
+    def close(self):
+        """
+        Closes the log file.
+        :return: void
+        """
+        self.log_file.close()
+
+    def record_data(self, timestamp, measured_state, predicted_state):
         """
         Record the measured and predicted data.
+        :param timestamp: When the frame was captured, in seconds (not logged)
+        :param measured_state: The BallState measured in the frame
+        :param predicted_state: The BallState predicted for the next frame
+        :return: void
         """
         f = lambda i: str(int(i))
-        data_point = "" + f(x) + "," + f(y) + "," + f(d) + "," + f(nx) + "," + f(ny) + "," + f(nd) + "," + "\n"
-        self.log_file.write(data_point)
\ No newline at end of file
+        data_point = "" + f(measured_state.get_x_pos()) + "," + f(measured_state.get_y_pos()) + "," + \
+            f(measured_state.get_d_pos()) + "," + f(predicted_state.get_x_pos()) + "," + \
+            f(predicted_state.get_y_pos()) + "," + f(predicted_state.get_d_pos()) + "," + "\n"
+        self.log_file.write(data_point)
+
+    def record_miss(self, timestamp):
+        """
+        Record a frame in which the ball was not found, as a row with nothing in it, so that the rows of the log stay
+        one per frame.
+        :param timestamp: When the frame was captured, in seconds (not logged)
+        :return: void
+        """
+        self.log_file.write(",,,,,,\n")
@@ -0,0 +1,48 @@
+"""
+A module for reading back the logs that DataRecorder and ColumnarRecorder write.
+"""
+
+import columnar_recorder
+import glob
+import numpy
+import os
+import POC.config as config
+
+
+def read_log(path, fps=config.CAMERA_FPS):
+    """
+    Reads a datalog into arrays, one row per frame. Frames where the ball was not found are rows of NaN.
+    :param path: The path to the datalog file, or to a ColumnarRecorder's recording directory
+    :param fps: The rate that a datalog file's frames were captured at. A datalog file has no timestamps, so its frames
+                are taken to be evenly spaced; a recording has the real ones, dropped frames and all.
+    :return: A tuple: ((T, 3) measured x, y, d; (T, 3) predicted x, y, d; (T,) timestamps in seconds)
+    """
+    if os.path.isdir(path):
+        columns = read_recording(path)
+        return numpy.column_stack([columns["x"], columns["y"], columns["d"]]), \
+            numpy.column_stack([columns["px"], columns["py"], columns["pd"]]), \
+            numpy.asarray(columns["timestamp"], dtype=numpy.float64)
+
+    data = numpy.genfromtxt(path, delimiter=',', usecols=range(6), dtype=numpy.float64)
+    data = data.reshape(-1, 6)
+    return data[:, :3], data[:, 3:], numpy.arange(len(data)) / float(fps)
+
+
+def read_recording(directory, mmap_mode=None):
+    """
+    Reads a ColumnarRecorder's recording.
+    :param directory: The recording's directory
+    :param mmap_mode: What to pass to numpy.load() for each chunk. With 'r', only the columns that are used are read
+                      from the disk; a recording that is all one chunk is then not copied at all.
+    :return: A dict of column name to the (T,) array of that column, for every name in the recording's columns file
+    """
+    with open(os.path.join(directory, columnar_recorder.COLUMNS_FILE)) as columns_file:
+        names = columns_file.read().split()
+
+    chunks = [numpy.load(path, mmap_mode=mmap_mode)
+              for path in sorted(glob.glob(os.path.join(directory, columnar_recorder.CHUNK_FILE.replace("%06d", "*"))))]
+    if not chunks:
+        return dict((name, numpy.empty(0)) for name in names)
+    if len(chunks) == 1:
+        return dict(zip(names, chunks[0]))
+    return dict((name, numpy.concatenate([chunk[i] for chunk in chunks])) for i, name in enumerate(names))
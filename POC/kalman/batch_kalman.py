@@ -0,0 +1,176 @@
+"""
+Implementation of a Linear Kalman Filter class that filters many tracks at once.
+"""
+
+import numpy
+
+
+class BatchKalmanFilter:
+    """
+    A Linear Kalman Filter for many tracks that share the same model (A, B, H, Q and R), such as several candidate
+    blobs, or the balls on several tables.
+
+    The tracks live in slots of stacked arrays: the states are an (N, n) array and the covariances an (N, n, n) array,
+    so a predict or an update for all of the tracks is one set of vectorized calls. A track keeps its slot for as long
+    as it exists, so the slot number is the track's id. Removed tracks leave their slot free for the next new track;
+    the arrays are only reallocated (to twice the size) when every slot is in use.
+
+    Each frame, call predict() once and then update() with whichever tracks got a measurement.
+    """
+    def __init__(self, _A, _B, _H, _Q, _R, capacity=8):
+        """
+        Constructor.
+        :param _A: The transformation matrix for the state of the system
+        :param _B: The transformation matrix for the control of the system
+        :param _H: The transformation matrix for the measurement of the system
+        :param _Q: The process error matrix
+        :param _R: The measurement error covariance matrix
+        :param capacity: The number of slots to start with
+        :return: void
+        """
+        self.A = numpy.array(_A, dtype=numpy.float64)
+        self.B = numpy.array(_B, dtype=numpy.float64).ravel()
+        self.H = numpy.array(_H, dtype=numpy.float64)
+        self.Q = numpy.array(_Q, dtype=numpy.float64)
+        self.R = numpy.array(_R, dtype=numpy.float64)
+
+        n = self.A.shape[0]
+        self.__states = numpy.zeros((capacity, n))
+        self.__covariances = numpy.zeros((capacity, n, n))
+        self.__active = numpy.zeros(capacity, dtype=bool)
+
+    def add_track(self, state, covariance):
+        """
+        Starts a new track.
+        :param state: The initial state vector
+        :param covariance: The initial covariance matrix
+        :return: The new track's slot, which is its id until it is removed
+        """
+        free = numpy.flatnonzero(~self.__active)
+        if not len(free):
+            free = [self.__grow()]
+
+        slot = free[0]
+        self.__states[slot] = numpy.asarray(state).ravel()
+        self.__covariances[slot] = covariance
+        self.__active[slot] = True
+        return slot
+
+    def get_active_mask(self):
+        """
+        Gets which slots hold a track.
+        :return: A bool array with one entry per slot (do not modify it)
+        """
+        return self.__active
+
+    def get_capacity(self):
+        """
+        Gets the number of slots.
+        :return: The number of slots, used or not
+        """
+        return len(self.__active)
+
+    def get_covariances(self):
+        """
+        Gets the covariances of all of the slots. Only the rows of active tracks mean anything.
+        :return: The (N, n, n) array of covariances (updated in place, until add_track() has to grow it)
+        """
+        return self.__covariances
+
+    def get_states(self):
+        """
+        Gets the states of all of the slots. Only the rows of active tracks mean anything.
+        :return: The (N, n) array of states (updated in place, until add_track() has to grow it)
+        """
+        return self.__states
+
+    def get_tracks(self):
+        """
+        Gets the slots that hold a track.
+        :return: An array of slot numbers
+        """
+        return numpy.flatnonzero(self.__active)
+
+    def predict(self, control_vector=0):
+        """
+        Moves every track one time step forward.
+        :param control_vector: The control (a scalar, as B has one column)
+        :return: void
+        """
+        tracks = self.get_tracks()
+        if not len(tracks):
+            return
+
+        # x = A * x + B * u, for each row
+        states = numpy.dot(self.__states[tracks], self.A.T)
+        if control_vector:
+            states += self.B * control_vector
+        self.__states[tracks] = states
+
+        # P = A * P * A^T + Q, for each matrix in the stack
+        covariances = numpy.matmul(numpy.matmul(self.A, self.__covariances[tracks]), self.A.T)
+        covariances += self.Q
+        self.__covariances[tracks] = covariances
+
+    def remove_track(self, slot):
+        """
+        Ends a track and frees its slot.
+        :param slot: The track's slot
+        :return: void
+        """
+        self.__active[slot] = False
+
+    def update(self, measurements, measured=None):
+        """
+        Corrects the tracks that have a measurement this time step. The rest keep their predicted state.
+        :param measurements: An (N, m) array with a row for each slot
+        :param measured: A bool array with an entry for each slot, True for the slots that have a measurement in
+                         measurements this time step. None for all of the active tracks.
+        :return: void
+        """
+        measured = self.__active if measured is None else measured & self.__active
+        tracks = numpy.flatnonzero(measured)
+        if not len(tracks):
+            return
+
+        states = self.__states[tracks]
+        covariances = self.__covariances[tracks]
+
+        # S = H * P * H^T + R
+        PH_T = numpy.matmul(covariances, self.H.T)
+        innovation_covariances = numpy.matmul(self.H, PH_T)
+        innovation_covariances += self.R
+
+        # K = P * H^T * S^-1, so S * K^T = (P * H^T)^T
+        gains = numpy.linalg.solve(innovation_covariances, PH_T.transpose(0, 2, 1)).transpose(0, 2, 1)
+
+        # x = x + K * (z - H * x)
+        innovations = measurements[tracks] - numpy.dot(states, self.H.T)
+        states += numpy.matmul(gains, innovations[:, :, numpy.newaxis])[:, :, 0]
+        self.__states[tracks] = states
+
+        # P = (I - K * H) * P = P - K * (H * P). Rounding leaves this very slightly unsymmetric, and this form of the
+        # update makes that grow from one frame to the next, so put it back to exactly symmetric.
+        covariances -= numpy.matmul(gains, numpy.matmul(self.H, covariances))
+        covariances += covariances.transpose(0, 2, 1)
+        covariances *= 0.5
+        self.__covariances[tracks] = covariances
+
+    def __grow(self):
+        """
+        Doubles the number of slots.
+        :return: The first of the new slots
+        """
+        old_capacity = len(self.__active)
+        new_capacity = max(1, 2 * old_capacity)
+        n = self.__states.shape[1]
+
+        states = numpy.zeros((new_capacity, n))
+        covariances = numpy.zeros((new_capacity, n, n))
+        active = numpy.zeros(new_capacity, dtype=bool)
+        states[:old_capacity] = self.__states
+        covariances[:old_capacity] = self.__covariances
+        active[:old_capacity] = self.__active
+
+        self.__states, self.__covariances, self.__active = states, covariances, active
+        return old_capacity
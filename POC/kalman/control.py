@@ -1,16 +1,18 @@
 """
-This module takes in measurements and gives out the next time step's
-predicted measurements for the ball position.
+This module holds the Kalman filter's model of the ball: the matrices
+that KalmanPredictor (prediction/kalman_predictor.py) filters the ball
+position with, and the helpers for rebuilding them for a time step.
 """
 
 import numpy
 
-from POC.kalman import mykalman
+import POC.config as config
 
 # Constants for this particular application
 
-# At 30 frames per second, deltaT should be 1/30 seconds
-_DEL_T = 0.03333333
+# The time step that the matrices below are built for: one frame. When the frames are not evenly spaced, use
+# set_time_step() to rebuild A, B and Q for the time that actually passed.
+_DEL_T = 1.0 / config.CAMERA_FPS
 
 # A is the matrix that occurs in real life due to the change from one
 # timestep to the next in the real state. It is the matrix that
@@ -77,13 +79,80 @@ _KALMAN_R = numpy.matrix([
                           ])
 # _KALMAN_R = numpy.matrix([0.2])
 
-_filter = None
+# The parts of the state that are measured when only the position is (x, y and d; not the velocities)
+_POSITION_ROWS = [0, 2, 4]
+
+# The entries of A that are the time step: each position moves by its velocity times dt
+_TIME_STEP_ENTRIES = ([0, 2, 4], [1, 3, 5])
+
+
+def get_position_model():
+    """
+    Gets the model, set up for measurements of just the position (x, y, d), as plain arrays.
+    :return: A tuple: (A, Q, H, R)
+    """
+    A = numpy.asarray(_KALMAN_A, dtype=numpy.float64)
+    Q = numpy.asarray(_KALMAN_Q, dtype=numpy.float64)
+    H = numpy.asarray(_KALMAN_H, dtype=numpy.float64)[_POSITION_ROWS]
+    R = numpy.asarray(_KALMAN_R, dtype=numpy.float64)[_POSITION_ROWS][:, _POSITION_ROWS]
+    return A, Q, H, R
+
+
+def get_control_model():
+    """
+    Gets how the control vector moves the state, to go with get_position_model().
+    :return: A tuple: (B, flattened to a plain array; the control value, which is 0 for no control)
+    """
+    return numpy.asarray(_KALMAN_B, dtype=numpy.float64).ravel(), _CONTROL
+
+
+def get_model_time_step():
+    """
+    Gets the time step that the model's A, B and Q are built for: one frame.
+    :return: The time step, in seconds
+    """
+    return _DEL_T
+
+
+def get_time_step_models(dts):
+    """
+    Gets the A and Q of get_position_model() for each of a series of time steps, for filtering a whole log of frames
+    that are not evenly spaced at once (see smoother.py).
+    :param dts: A length T array of the time since the frame before each frame, in seconds
+    :return: A tuple: ((T, 6, 6) A for each time step, (T, 6, 6) Q for each time step)
+    """
+    A, Q, _, _ = get_position_model()
+    dts = numpy.asarray(dts, dtype=numpy.float64)
+    As = numpy.repeat(A[numpy.newaxis], len(dts), axis=0)
+    As[(slice(None),) + _TIME_STEP_ENTRIES] = dts[:, numpy.newaxis]
+    Qs = Q * (dts / _DEL_T)[:, numpy.newaxis, numpy.newaxis]
+    return As, Qs
+
+
+def set_time_step(dt, A, B=None, Q=None, base_Q=None):
+    """
+    Rebuilds the model for a time step of dt seconds, in place, so that a filter can follow frames that are not evenly
+    spaced without allocating anything.
+    :param dt: The time since the last update, in seconds
+    :param A: The A from get_position_model() (or a copy of _KALMAN_A as an array), to fill in
+    :param B: If given, the B to fill in (flattened)
+    :param Q: If given, the Q to fill in: base_Q scaled by how many frames dt is, as the process error builds up over
+              time
+    :param base_Q: The Q for one frame (_DEL_T), needed with Q
+    :return: void
+    """
+    A[_TIME_STEP_ENTRIES] = dt
+    if B is not None:
+        B[2] = 0.5 * dt * dt
+        B[3] = dt
+    if Q is not None:
+        numpy.multiply(base_Q, dt / _DEL_T, out=Q)
 
 
 def package_state_as_vector(x, vx, y, vy, d, vd):
     """
     Packages the state into a single numpy state vector.
-    Use this vector for updating and initializing.
+    Use this vector as the state of a filter built on this model.
     :param x: The x location of the ball in pixels
     :param vx: The measured x velocity of the ball in pixels/sec
     :param y: The y location of the ball in pixels
@@ -92,14 +161,7 @@ def package_state_as_vector(x, vx, y, vy, d, vd):
     :param vd: The measured d velocity of the ball in pixels/sec
     :return: a state vector
     """
-    return numpy.matrix([
-                            [x],
-                            [vx],
-                            [y],
-                            [vy],
-                            [d],
-                            [vd]
-                         ])
+    return numpy.array([x, vx, y, vy, d, vd], dtype=numpy.float64)
 
 
 def unpack_state(state_vector):
@@ -108,49 +170,5 @@ def unpack_state(state_vector):
     :param state_vector: The state vector to unpack.
     :return: A tuple of x, vx, y, vy, d, vd
     """
-    x = state_vector[0, 0]
-    vx = state_vector[1, 0]
-    y = state_vector[2, 0]
-    vy = state_vector[3, 0]
-    d = state_vector[4, 0]
-    vd = state_vector[5, 0]
+    x, vx, y, vy, d, vd = state_vector
     return x, vx, y, vy, d, vd
-
-
-def initialize(state_vector):
-    """
-    Initialize the Kalman filter with your best guess as to the state.
-    :param state_vector: The best guess as to the initial state.
-    :return: void
-    """
-    # our initial guess at the covariance of the state is identity
-    P = numpy.matrix([
-                        [1, 0, 0, 0, 0, 0],
-                        [0, 1, 0, 0, 0, 0],
-                        [0, 0, 1, 0, 0, 0],
-                        [0, 0, 0, 1, 0, 0],
-                        [0, 0, 0, 0, 1, 0],
-                        [0, 0, 0, 0, 0, 1]
-                      ])
-    # P = numpy.matrix([1])
-    global _filter
-    _filter = mykalman.MyKalmanFilter(_KALMAN_A, _KALMAN_B, _KALMAN_H, state_vector, P, _KALMAN_Q, _KALMAN_R)
-    
-
-def update(measured_state):
-    """
-    Updates the Kalman filter with the given measured state.
-    The Kalman filter will have an estimate of what the next state will
-    be given this measurement and what it has collected so far.
-    :param measured_state: The state vector that you measured.
-    :return: void
-    """
-    _filter.update(_CONTROL, measured_state)
-
-
-def get_filtered_state():
-    """
-    Gets the state after it has gone through the Kalman Filter.
-    :return: A state vector that is the updated state
-    """
-    return _filter.get_current_state()
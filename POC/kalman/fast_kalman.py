@@ -0,0 +1,131 @@
+"""
+Implementation of a Linear Kalman Filter class that does the same thing as MyKalmanFilter, but cheaply enough to run
+on every frame.
+"""
+
+import numpy
+
+
+class FastKalmanFilter:
+    """
+    A Linear Kalman Filter on plain ndarrays.
+
+    It gives the same estimates as MyKalmanFilter, but:
+        - every intermediate result goes into an array that was allocated once, in the constructor
+        - the transposes are views made once, in the constructor
+        - the gain comes from solving S * K^T = H * P^T instead of inverting S
+        - nothing is printed
+
+    With a steady state tolerance, it also stops updating the covariance once the gain has settled. For a filter with
+    constant A, H, Q and R (like this one) the gain converges to a fixed value after a few dozen updates, and from then
+    on only the state has to be updated, which is a handful of small matrix-vector products.
+    """
+    def __init__(self, _A, _B, _H, _x, _P, _Q, _R, steady_state_tolerance=None):
+        """
+        Constructor.
+        :param _A: The transformation matrix for the state of the system
+        :param _B: The transformation matrix for the control of the system
+        :param _H: The transformation matrix for the measurement of the system
+        :param _x: The current state of the system
+        :param _P: The covariance matrix
+        :param _Q: The process error matrix
+        :param _R: The measurement error covariance matrix
+        :param steady_state_tolerance: If given, the gain is frozen once no element of it changes by more than this
+                                       from one update to the next
+        :return: void
+        """
+        self.A = numpy.array(_A, dtype=numpy.float64)
+        self.B = numpy.array(_B, dtype=numpy.float64).ravel()
+        self.H = numpy.array(_H, dtype=numpy.float64)
+        self.Q = numpy.array(_Q, dtype=numpy.float64)
+        self.R = numpy.array(_R, dtype=numpy.float64)
+        self.current_state_estimate = numpy.array(_x, dtype=numpy.float64).ravel()
+        self.current_prob_estimate = numpy.array(_P, dtype=numpy.float64)
+        self.steady_state_tolerance = steady_state_tolerance
+
+        n = self.A.shape[0]
+        m = self.H.shape[0]
+        self.__A_T = self.A.T
+        self.__H_T = self.H.T
+
+        # Scratch space for update()
+        self.__predicted_state = numpy.empty(n)
+        self.__predicted_measurement = numpy.empty(m)
+        self.__innovation = numpy.empty(m)
+        self.__correction = numpy.empty(n)
+        self.__AP = numpy.empty((n, n))
+        self.__predicted_prob = numpy.empty((n, n))
+        self.__PH_T = numpy.empty((n, m))
+        self.__innovation_covariance = numpy.empty((m, m))
+        self.__KHP = numpy.empty((n, n))
+        self.__gain = numpy.zeros((n, m))
+        self.__gain_change = numpy.empty((n, m))
+        self.__steady_state = False
+
+    def get_current_state(self):
+        """
+        Gets the current state of the system as predicted by the Kalman filter.
+        :return: The current state of the system (x - a state vector). This array is updated in place by update().
+        """
+        return self.current_state_estimate
+
+    def get_gain(self):
+        """
+        Gets the Kalman gain that the last update used.
+        :return: The gain matrix (K)
+        """
+        return self.__gain
+
+    def is_steady_state(self):
+        """
+        Whether the gain has settled and is no longer being recomputed.
+        :return: True or False
+        """
+        return self.__steady_state
+
+    def reset_steady_state(self):
+        """
+        Starts working out the covariance and the gain again on every update, e.g. because A, B, Q or R have been
+        changed (in place) for a different time step, so the settled gain no longer fits.
+        :return: void
+        """
+        self.__steady_state = False
+
+    def update(self, control_vector, measurement_vector):
+        """
+        Takes the next vector of control state and the next measurement vector and
+        updates the current state to predict the next one.
+        :param control_vector: The next vector of control state (a scalar, as B has one column)
+        :param measurement_vector: The next measurement vector
+        :return: void
+        """
+        # Prediction step
+        x = numpy.dot(self.A, self.current_state_estimate, out=self.__predicted_state)
+        if control_vector:
+            x += self.B * control_vector
+
+        if not self.__steady_state:
+            numpy.dot(self.A, self.current_prob_estimate, out=self.__AP)
+            P = numpy.dot(self.__AP, self.__A_T, out=self.__predicted_prob)
+            P += self.Q
+
+            # Observation step
+            PH_T = numpy.dot(P, self.__H_T, out=self.__PH_T)
+            S = numpy.dot(self.H, PH_T, out=self.__innovation_covariance)
+            S += self.R
+
+            # Update step. K = P * H^T * S^-1, so S * K^T = (P * H^T)^T, and S is symmetric.
+            gain = numpy.linalg.solve(S, PH_T.T).T
+            if self.steady_state_tolerance is not None:
+                numpy.subtract(gain, self.__gain, out=self.__gain_change)
+                self.__steady_state = numpy.abs(self.__gain_change).max() <= self.steady_state_tolerance
+            self.__gain[...] = gain
+
+            # P = (I - K * H) * P = P - K * (H * P), and H * P = (P * H^T)^T since P is symmetric
+            numpy.dot(self.__gain, PH_T.T, out=self.__KHP)
+            numpy.subtract(P, self.__KHP, out=self.current_prob_estimate)
+
+        innovation = numpy.subtract(numpy.asarray(measurement_vector).ravel(),
+                                    numpy.dot(self.H, x, out=self.__predicted_measurement), out=self.__innovation)
+        x += numpy.dot(self.__gain, innovation, out=self.__correction)
+        self.current_state_estimate[...] = x
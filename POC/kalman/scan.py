@@ -0,0 +1,60 @@
+"""
+A module for running an associative operator over a whole sequence at once (a prefix scan), so that recursions like
+the Kalman filter and smoother can be done for every time step in a handful of vectorized numpy calls instead of one
+Python loop iteration per time step.
+"""
+
+import numpy
+
+
+def associative_scan(elements, combine, reverse=False):
+    """
+    Computes every prefix "sum" of a sequence under an associative operator:
+        result[k] = elements[0] (+) elements[1] (+) ... (+) elements[k]
+    or, with reverse=True, every suffix "sum":
+        result[k] = elements[k] (+) elements[k + 1] (+) ... (+) elements[-1]
+
+    The pairs (0, 1), (2, 3), ... are combined, the scan of those pairs gives the results at the odd positions, and
+    one more combine gives the results at the even positions. That is about 2 * T combines in total for T elements,
+    like doing it in order, but done in 2 * log2(T) vectorized calls.
+
+    :param elements: A tuple of arrays whose first axis is time. Together, element k is (array[k] for each array).
+    :param combine: A function (earlier, later) -> combined, where each is a tuple of arrays like elements, that
+                    combines many pairs of elements at once along the first axis. It must be associative, and must not
+                    modify its arguments.
+    :param reverse: If True, compute suffixes instead of prefixes
+    :return: A tuple of arrays like elements, holding the scanned results
+    """
+    if reverse:
+        # A suffix scan is a prefix scan of the reversed sequence, with each pair the other way around
+        backwards = tuple(array[::-1] for array in elements)
+        result = _scan(backwards, lambda later, earlier: combine(earlier, later))
+        return tuple(array[::-1] for array in result)
+    else:
+        return _scan(tuple(elements), combine)
+
+
+def _scan(elements, combine):
+    """
+    The prefix scan, done recursively on the pairs.
+    """
+    length = len(elements[0])
+    if length < 2:
+        return tuple(numpy.array(array) for array in elements)
+
+    pairs = combine(tuple(array[0:length - 1:2] for array in elements), tuple(array[1::2] for array in elements))
+    odd = _scan(pairs, combine)
+
+    result = tuple(numpy.empty_like(array) for array in elements)
+    for array, whole, part in zip(result, elements, odd):
+        array[0] = whole[0]
+        array[1::2] = part
+
+    # Each even position after the first is the odd position before it, plus itself
+    if length > 2:
+        count = (length - 1) // 2
+        even = combine(tuple(part[:count] for part in odd), tuple(array[2::2] for array in elements))
+        for array, part in zip(result, even):
+            array[2::2] = part
+
+    return result
@@ -0,0 +1,183 @@
+"""
+This module filters and smooths whole recorded trajectories at once, for looking at after the fact.
+
+The forward Kalman filter and the backward Rauch-Tung-Striebel smoother are both written as associative operators over
+the time steps (Sarkka and Garcia-Fernandez, "Temporal Parallelization of Bayesian Smoothers", 2021), so that each
+one is a single scan (see scan.py) over the whole log rather than one Python loop iteration per frame. Time steps
+with no measurement (the ball was not found) are just predicted through. A and Q can be given for each time step
+(see control.get_time_step_models()), for logs whose frames are not evenly spaced.
+"""
+
+import numpy
+from POC.kalman import scan
+
+
+def filter_log(measurements, A, Q, H, R, initial_state, initial_covariance):
+    """
+    Runs the Kalman filter forward over a whole log.
+    :param measurements: A (T, m) array with a row per time step. Rows with a NaN in them are time steps with no
+                         measurement.
+    :param A: The (n, n) state transition matrix, or a (T, n, n) stack of them: A[k] moves the state from time step
+              k - 1 to time step k
+    :param Q: The (n, n) process error matrix, or a (T, n, n) stack of them, like A
+    :param H: The (m, n) measurement matrix
+    :param R: The (m, m) measurement error covariance matrix
+    :param initial_state: The best guess at the state at the first time step, before its measurement
+    :param initial_covariance: The covariance of that guess
+    :return: A tuple: ((T, n) filtered states, (T, n, n) their covariances)
+    """
+    elements = _filter_elements(measurements, A, Q, H, R, initial_state, initial_covariance)
+    _, states, covariances, _, _ = scan.associative_scan(elements, _combine_filter_elements)
+    return states, covariances
+
+
+def smooth_log(measurements, A, Q, H, R, initial_state, initial_covariance):
+    """
+    Runs the Kalman filter forward and then the Rauch-Tung-Striebel smoother backward over a whole log, so that every
+    time step's estimate uses all of the measurements, before and after it.
+    :param measurements: As for filter_log
+    :param A: As for filter_log
+    :param Q: As for filter_log
+    :param H: As for filter_log
+    :param R: As for filter_log
+    :param initial_state: As for filter_log
+    :param initial_covariance: As for filter_log
+    :return: A tuple: ((T, n) smoothed states, (T, n, n) their covariances)
+    """
+    states, covariances = filter_log(measurements, A, Q, H, R, initial_state, initial_covariance)
+    elements = _smoother_elements(states, covariances, _next_steps(A), _next_steps(Q))
+    _, states, covariances = scan.associative_scan(elements, _combine_smoother_elements, reverse=True)
+    return states, covariances
+
+
+def _combine_filter_elements(earlier, later):
+    """
+    The associative operator for the filter. Each element (A, b, C, eta, J) stands for a stretch of time steps: the
+    state at its end, given the state before its start, is A * x + b with covariance C, and (eta, J) is what its
+    measurements say about the state before its start.
+    """
+    A_i, b_i, C_i, eta_i, J_i = earlier
+    A_j, b_j, C_j, eta_j, J_j = later
+    identity = numpy.eye(A_i.shape[-1])
+
+    # W = A_j * (I + C_i * J_j)^-1, worked out as a solve: (I + C_i * J_j)^T * W^T = A_j^T
+    W = _transpose(numpy.linalg.solve(_transpose(identity + numpy.matmul(C_i, J_j)), _transpose(A_j)))
+    A = numpy.matmul(W, A_i)
+    b = _matvec(W, b_i + _matvec(C_i, eta_j)) + b_j
+    C = numpy.matmul(numpy.matmul(W, C_i), _transpose(A_j)) + C_j
+
+    # V = A_i^T * (I + J_j * C_i)^-1, worked out the same way
+    V = _transpose(numpy.linalg.solve(_transpose(identity + numpy.matmul(J_j, C_i)), A_i))
+    eta = _matvec(V, eta_j - _matvec(J_j, b_i)) + eta_i
+    J = numpy.matmul(numpy.matmul(V, J_j), A_i) + J_i
+
+    return A, b, _symmetrize(C), eta, _symmetrize(J)
+
+
+def _combine_smoother_elements(earlier, later):
+    """
+    The associative operator for the smoother. Each element (E, g, L) says that the smoothed state at its start is
+    E * x + g, with covariance E * P * E^T + L, where x and P are the smoothed state and covariance just after its end.
+    """
+    E_i, g_i, L_i = earlier
+    E_j, g_j, L_j = later
+    E = numpy.matmul(E_i, E_j)
+    g = _matvec(E_i, g_j) + g_i
+    L = numpy.matmul(numpy.matmul(E_i, L_j), _transpose(E_i)) + L_i
+    return E, g, _symmetrize(L)
+
+
+def _filter_elements(measurements, A, Q, H, R, initial_state, initial_covariance):
+    """
+    Makes the filter's element for every time step.
+    """
+    measurements = numpy.asarray(measurements, dtype=numpy.float64)
+    n = A.shape[-1]
+    measured = ~numpy.isnan(measurements).any(axis=1)
+    values = numpy.where(measured[:, numpy.newaxis], measurements, 0.0)
+
+    # A time step with a measurement, not counting what came before it. With one A and Q for every time step, these
+    # are worked out once; with one for each, they are stacks.
+    S = numpy.matmul(numpy.matmul(H, Q), H.T) + R
+    K = _transpose(numpy.linalg.solve(S, numpy.matmul(H, Q)))
+    I_KH = numpy.eye(n) - numpy.matmul(K, H)
+    S_inv_H = numpy.linalg.solve(S, numpy.broadcast_to(H, S.shape[:-2] + H.shape))
+    HS = numpy.matmul(_transpose(S_inv_H), H)  # H^T * S^-1 * H
+    measured_A = numpy.matmul(I_KH, A)
+    measured_C = numpy.matmul(I_KH, Q)
+    measured_J = numpy.matmul(numpy.matmul(_transpose(A), HS), A)
+    to_eta = numpy.matmul(_transpose(A), _transpose(S_inv_H))  # A^T * H^T * S^-1
+
+    # A time step without one just moves the state forward
+    elements_A = numpy.where(measured[:, numpy.newaxis, numpy.newaxis], measured_A, A)
+    elements_b = _matvec(K, values)
+    elements_C = numpy.where(measured[:, numpy.newaxis, numpy.newaxis], measured_C, Q)
+    elements_eta = _matvec(to_eta, values)
+    elements_J = numpy.where(measured[:, numpy.newaxis, numpy.newaxis], measured_J, numpy.zeros((n, n)))
+
+    # The first time step starts from the initial guess instead of from a previous state
+    state = numpy.asarray(initial_state, dtype=numpy.float64).ravel()
+    covariance = numpy.asarray(initial_covariance, dtype=numpy.float64)
+    if measured[0]:
+        S_0 = H.dot(covariance).dot(H.T) + R
+        K_0 = numpy.linalg.solve(S_0, H.dot(covariance)).T
+        state = state + K_0.dot(values[0] - H.dot(state))
+        covariance = covariance - K_0.dot(S_0).dot(K_0.T)
+    elements_A[0] = 0.0
+    elements_b[0] = state
+    elements_C[0] = covariance
+    elements_eta[0] = 0.0
+    elements_J[0] = 0.0
+
+    return elements_A, elements_b, elements_C, elements_eta, elements_J
+
+
+def _matvec(matrices, vectors):
+    """
+    Multiplies each matrix in a stack by the vector with the same index.
+    """
+    return numpy.matmul(matrices, vectors[..., numpy.newaxis])[..., 0]
+
+
+def _next_steps(matrices):
+    """
+    Gets what moves each time step on to the one after it from a stack of what moves each one on from the one before
+    it. A single matrix is the same for every time step. (Nothing comes after the last time step, so what it gets is
+    never used.)
+    """
+    if matrices.ndim == 2:
+        return matrices
+    return numpy.concatenate((matrices[1:], matrices[-1:]))
+
+
+def _smoother_elements(states, covariances, A, Q):
+    """
+    Makes the smoother's element for every time step from the filtered states and covariances. A and Q move each time
+    step on to the next one.
+    """
+    # E = P * A^T * (A * P * A^T + Q)^-1, worked out as a solve: (A * P * A^T + Q) * E^T = A * P
+    AP = numpy.matmul(A, covariances)
+    predicted_covariances = numpy.matmul(AP, _transpose(A)) + Q
+    E = _transpose(numpy.linalg.solve(predicted_covariances, AP))
+    g = states - _matvec(E, _matvec(A, states))
+    L = covariances - numpy.matmul(E, AP)
+
+    # Nothing comes after the last time step, so its smoothed state is just its filtered state
+    E[-1] = 0.0
+    g[-1] = states[-1]
+    L[-1] = covariances[-1]
+    return E, g, _symmetrize(L)
+
+
+def _symmetrize(matrices):
+    """
+    Gets rid of the rounding errors that make a stack of covariance-like matrices drift away from symmetric.
+    """
+    return 0.5 * (matrices + _transpose(matrices))
+
+
+def _transpose(matrices):
+    """
+    Transposes each matrix in a stack.
+    """
+    return numpy.swapaxes(matrices, -1, -2)
@@ -0,0 +1,11 @@
+"""
+The replay that tunes the predictors' settings used to live here. It moved to POC/prediction/tuning.py when the
+predictors got their own package, and this module only points there, so that scripts written against it still run.
+
+The replay here used to average the first history_length slots of the velocity history while new velocities went in
+at its end, so for the first frames it averaged slots that were still zero. The replay in prediction/tuning.py keeps
+the history as a ring buffer with a running sum, like TrackHistory, and matches AveragingPredictor exactly
+(scripts_and_stuff/tune_predictor.py --check).
+"""
+
+from POC.prediction.tuning import PARAMETERS, replay
@@ -4,129 +4,331 @@ This module contains a script for finding a ping pong ball and tracking its x, y
 
 import cv2
 from ball_tracking import ball_tracker, ball_state
-from data_recorder import data_recorder
+from capture import frame_grabber
+from data_recorder import columnar_recorder, data_recorder
+from networking import shared_state_writer, state_publisher, state_server
+from pipeline import pipeline
+from prediction import ballistic
+from scheduler import frame_scheduler
 from ui import frame_drawer
+import argparse
+import errno
 import imutils
 import config
-import kalman.control as kf
-import socket
+import os
+import signal
+import time
 
+# Set by a signal handler in headless mode to make run_loop stop after the frame it is working on
+_stop_requested = False
 
-def cleanup(camera, log_file, soc):
+
+def cleanup(camera, tracker, recorder, publisher):
     """
     Cleans up the resources used by the program.
     :param camera: The open camera reference to close.
-    :param log_file: The log file to close.
-    :param soc: TCP socket
+    :param tracker: The BallTracker to close.
+    :param recorder: The recorder to close.
+    :param publisher: The StatePublisher to stop.
     :return: void
     """
+    if config.USE_CAPTURE_THREAD:
+        print "Dropped " + str(camera.get_dropped_frames()) + " of " + str(camera.get_captured_frames()) + " frames."
     camera.release()
-    log_file.close()
-    if soc:
-        soc.close()
+    tracker.close()
+    try:
+        close_recorder(recorder)
+    finally:
+        stop_publisher(publisher)
 
 
-def run_loop(camera, log_file, soc):
+def run_loop(camera, tracker, recorder, publisher):
     """
     Runs the main application logic. Runs through the video (or webcam grab). Finds the ball, measures its current
     distance, and predicts what the next location of the ball will be. Logs the data.
     :param camera: An open reference to a video or webcam.
-    :param log_file: The file to log data in.
-    :param soc: TCP socket
+    :param tracker: The BallTracker to find the ball with.
+    :param recorder: The DataRecorder or ColumnarRecorder to log data with.
+    :param publisher: The StatePublisher to send the ball's states with.
     :return: void
     """
     # Initialize classes to use throughout loop
     drawer = frame_drawer.FrameDrawer(None)
-    tracker = ball_tracker.BallTracker(None)
-    recorder = data_recorder.DataRecorder(log_file)
-    kf.initialize(kf.package_state_as_vector(0, 0, 0, 0, 0, 0))
+    scheduler = None
+    if config.USE_FRAME_BUDGET:
+        scheduler = frame_scheduler.FrameScheduler(config.FRAME_BUDGET_MS, config.QUALITY_LEVELS,
+                                                   smoothing=config.FRAME_BUDGET_SMOOTHING,
+                                                   headroom=config.FRAME_BUDGET_HEADROOM,
+                                                   settle_frames=config.FRAME_BUDGET_SETTLE_FRAMES)
+        tracker.set_quality(*scheduler.get_quality())
+    predictor = None
+
+    frames_processed = 0
+    start_time = time.time()
 
     # Run the loop
-    while True:
+    while not _stop_requested:
         # Get the next frame of video from the camera, or else we are done
         grabbed, frame = camera.read()
         if not grabbed:
             break
+
+        timestamp = frame_grabber.get_frame_timestamp(camera, not config.USE_LIVE_VIDEO)
+        if config.USE_BALLISTIC_PREDICTOR and predictor is None:
+            # The ball is measured in the frame as resized to IMAGE_WIDTH, which keeps the camera's aspect ratio
+            frame_size = (config.IMAGE_WIDTH, int(frame.shape[0] * (config.IMAGE_WIDTH / float(frame.shape[1]))))
+            predictor = ballistic.BallisticPredictor(frame_size)
+        if scheduler and scheduler.should_skip():
+            # Too far behind, even at the lowest quality
+            recorder.record_miss(timestamp)
+            continue
         else:
-            frame = imutils.resize(frame, width=config.IMAGE_WIDTH, height=config.IMAGE_HEIGHT)
-            drawer.set_frame(frame)
-            tracker.set_frame(frame)
+            if scheduler:
+                # Resize straight to the size that the current quality level processes at. Below full size, a
+                # bilinear resize is several times cheaper than the default and finds the ball just as well.
+                scheduler.start_frame()
+                scale = scheduler.get_quality()[0]
+                frame = imutils.resize(frame, width=int(config.IMAGE_WIDTH * scale),
+                                       height=int(config.IMAGE_HEIGHT * scale),
+                                       inter=cv2.INTER_AREA if scale == 1.0 else cv2.INTER_LINEAR)
+                if not config.HEADLESS:
+                    # The drawer draws in full size frame coordinates
+                    drawer.set_frame(frame if scale == 1.0 else imutils.resize(frame, width=config.IMAGE_WIDTH))
+                tracker.set_frame(frame, timestamp)
+                scheduler.end_stage("resize")
+            else:
+                frame = imutils.resize(frame, width=config.IMAGE_WIDTH, height=config.IMAGE_HEIGHT)
+                if not config.HEADLESS:
+                    drawer.set_frame(frame)
+                tracker.set_frame(frame, timestamp)
 
         predicted_state = tracker.get_predicted_state()
 
         # Find the ball and get its location and info from the image
         measured_ball_state = tracker.find_ball()
         updated_prediction = tracker.get_predicted_state()
+        if scheduler:
+            scheduler.end_stage("track")
 
         # Draw a frame but don't show it yet
-        drawer.paint_prediction_box(predicted_state)
-        drawer.circle_ball_and_show(measured_ball_state)
-
-        if predicted_state and measured_ball_state:
-            print "Predicted: " + predicted_state.to_str(as_int=True)
-            print "Measured: " + measured_ball_state.to_str(as_int=True)
-
-        # Code below makes a Kalman filter that works, but seems to add slightly more noise rather than damp the noise
-        # In all truth, I'm not sure that even tuning it perfectly would be worth the amount of computation, as it
-        # is already pretty good at predicting the next state of the ball.
-        # if measured_ball_state:
-        #     # Filter the data using a Kalman Filter and update the ball_tracker with the newly found data
-        #     state_vector = kf.package_state_as_vector(measured_ball_state.get_x_pos(),
-        #                                               measured_ball_state.get_y_pos(),
-        #                                               measured_ball_state.get_d_pos(),
-        #                                               measured_ball_state.get_x_velocity(),
-        #                                               measured_ball_state.get_y_velocity(),
-        #                                               measured_ball_state.get_d_velocity())
-        #     kf.update(state_vector)
-        #     updated_vector = kf.get_filtered_state()
-        #     updated_ball_state = ball_state.BallState(*kf.unpack_state(updated_vector))
-        #     updated_ball_state.set_radius(measured_ball_state.get_radius())
-        #     measured_ball_state = updated_ball_state
-        #     tracker.set_current_state(measured_ball_state)
+        if not config.HEADLESS:
+            drawer.paint_prediction_box(predicted_state)
+            drawer.circle_ball_and_show(measured_ball_state)
+
+            if predicted_state and measured_ball_state:
+                print "Predicted: " + predicted_state.to_str(as_int=True)
+                print "Measured: " + measured_ball_state.to_str(as_int=True)
 
         if measured_ball_state:
             # Record the data
-            recorder.record_data(measured_ball_state.get_x_pos(), measured_ball_state.get_y_pos(),
-                                 measured_ball_state.get_d_pos(), tracker.get_predicted_state().get_x_pos(),
-                                 tracker.get_predicted_state().get_y_pos(), tracker.get_predicted_state().get_d_pos())
-            formatted_state = measured_ball_state.format_for_sending()
-            if soc:
-                soc.send(formatted_state)
+            recorder.record_data(timestamp, measured_ball_state, updated_prediction)
+            intercept = None
+            if predictor:
+                # Where and when the ball will get to the robot
+                predictor.update(measured_ball_state, timestamp)
+                intercept = predictor.get_intercept()
+            publisher.publish(timestamp, measured_ball_state, tracker.get_predicted_state(), tracker.get_confidence(),
+                              intercept)
+        else:
+            recorder.record_miss(timestamp)
+
+        if scheduler:
+            scheduler.end_stage("publish")
+            if scheduler.end_frame():
+                tracker.set_quality(*scheduler.get_quality())
+                print "Quality level " + str(scheduler.get_quality_level()) + " (" + \
+                      ("%.1f" % scheduler.get_frame_time()) + " ms per frame, budget " + \
+                      ("%.1f" % config.FRAME_BUDGET_MS) + " ms)"
+
+        frames_processed += 1
 
         # Wait for the user to push the q key to quit the program or any button to move to next frame
-        if config.USE_LIVE_VIDEO:
+        if config.HEADLESS:
+            continue
+        elif config.USE_LIVE_VIDEO:
             key = cv2.waitKey(1) & 0xFF
             if key == ord("q"):
                     break
         else:
             cv2.waitKey(0)
 
+    elapsed = time.time() - start_time
+    print "Processed " + str(frames_processed) + " frames in " + ("%.2f" % elapsed) + " seconds (" + \
+          ("%.1f" % (frames_processed / elapsed if elapsed > 0 else 0.0)) + " fps)."
+    if scheduler:
+        print "Skipped " + str(scheduler.get_skipped_frames()) + " frames to stay within budget. Ended at quality " \
+              "level " + str(scheduler.get_quality_level()) + "."
+        for name, stage_time in sorted(scheduler.get_stage_times().items()):
+            print "  " + name + ": " + ("%.2f" % stage_time) + " ms"
+
+
+def get_arguments():
+    """
+    Parses the command line. Anything given there overrides the config file.
+    :return: The parsed arguments
+    """
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--headless", action="store_true",
+                    help="Do not draw or show anything; run through recorded video as fast as possible")
+    return ap.parse_args()
+
+
+def request_stop(signum, frame):
+    """
+    Signal handler that makes run_loop stop cleanly after the frame it is working on.
+    :param signum: The signal number
+    :param frame: The current stack frame
+    :return: void
+    """
+    global _stop_requested
+    _stop_requested = True
+
+
 def setup():
     """
-    Initializes the camera and the datalog file and returns them.
-    :return: A tuple: Opened camera, opened file.
+    Initializes the camera, the ball tracker, the recorder and the state publisher and returns them.
+    :return: A tuple: Opened camera, BallTracker, recorder, started StatePublisher.
+    """
+    return setup_camera(), ball_tracker.BallTracker(None), setup_recorder(), setup_publisher()
+
+
+def setup_camera():
+    """
+    Opens the webcam or the video, depending on the config, and starts the capture thread if it is enabled. The webcam
+    is asked for config.CAMERA_FPS frames per second, config.CAMERA_FOURCC frames and a driver buffer of
+    config.CAMERA_BUFFER_SIZE frames; whatever it does not support is left as it is.
+    :return: The opened camera
     """
     if config.USE_LIVE_VIDEO:
         camera = cv2.VideoCapture(0)
+        if config.CAMERA_FOURCC:
+            camera.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*config.CAMERA_FOURCC))
+        if config.CAMERA_FPS:
+            camera.set(cv2.CAP_PROP_FPS, config.CAMERA_FPS)
+        if config.CAMERA_BUFFER_SIZE:
+            camera.set(cv2.CAP_PROP_BUFFERSIZE, config.CAMERA_BUFFER_SIZE)
+        print "Camera: " + ("%.1f" % camera.get(cv2.CAP_PROP_FPS)) + " fps, buffer of " + \
+              str(int(camera.get(cv2.CAP_PROP_BUFFERSIZE))) + " frames"
     else:
         camera = cv2.VideoCapture()
         camera.open(config.PATH_TO_VIDEO)
 
-    log_file = open('datalogFORPONG2.csv', 'w')
+    if config.USE_CAPTURE_THREAD:
+        frame_shape = (int(camera.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(camera.get(cv2.CAP_PROP_FRAME_WIDTH)), 3)
+        camera = frame_grabber.FrameGrabber(camera, ring_size=config.CAPTURE_RING_SIZE,
+                                            drop_frames=config.USE_LIVE_VIDEO, frame_shape=frame_shape,
+                                            video_time=not config.USE_LIVE_VIDEO).start()
+
+    return camera
 
-    soc = None
+
+def setup_recorder():
+    """
+    Makes the recorder that the config asks for: a ColumnarRecorder writing to a new directory under
+    config.RECORDING_DIRECTORY, or a DataRecorder writing to config.DATALOG_PATH.
+    :return: The recorder
+    """
+    if config.USE_COLUMNAR_RECORDER:
+        return columnar_recorder.ColumnarRecorder(make_recording_directory(), chunk_rows=config.RECORDER_CHUNK_ROWS)
+    return data_recorder.DataRecorder(open(config.DATALOG_PATH, 'w'))
+
+
+def make_recording_directory():
+    """
+    Makes a new directory under config.RECORDING_DIRECTORY for this run's recording, named for when the run started. If
+    another run started in the same second, -2, -3 and so on are added to the name until it is one that is not taken.
+    :return: The directory's path
+    """
     try:
-        soc = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        soc.connect((config.TCP_IP, config.TCP_PORT))
-    except socket.error as e:
-        print str(e)
-        print "Socket will be unnavailable."
-        soc = None
+        os.makedirs(config.RECORDING_DIRECTORY)
+    except OSError:
+        if not os.path.isdir(config.RECORDING_DIRECTORY):
+            raise
+
+    name = os.path.join(config.RECORDING_DIRECTORY, time.strftime("%Y%m%d-%H%M%S"))
+    path = name
+    number = 1
+    while True:
+        try:
+            # Making it is what claims the name, so that two runs can not both take it
+            os.mkdir(path)
+            return path
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        number += 1
+        path = name + "-" + str(number)
+
+
+def close_recorder(recorder):
+    """
+    Closes the recorder, and says where the recording went.
+    :param recorder: The DataRecorder or ColumnarRecorder
+    :return: void
+    """
+    recorder.close()
+    if config.USE_COLUMNAR_RECORDER:
+        print "Recorded " + str(recorder.get_rows_recorded()) + " frames to " + recorder.get_directory() + "."
+
+
+def setup_publisher():
+    """
+    Starts the thread that sends the ball's states out: to the TCP port from the config, or, in server mode, to
+    whoever subscribes on it. In shared memory mode, there is no thread; the states are written straight into shared
+    memory instead.
+    :return: The started StatePublisher, StateServer or SharedStateWriter
+    """
+    if config.NETWORK_MODE == "shared_memory":
+        return shared_state_writer.SharedStateWriter(config.SHARED_MEMORY_PATH,
+                                                     with_intercept=config.USE_BALLISTIC_PREDICTOR).start()
+    if config.NETWORK_MODE == "server":
+        return state_server.StateServer((config.TCP_IP, config.TCP_PORT), udp_port=config.SERVER_UDP_PORT,
+                                        max_batches=config.SERVER_MAX_BATCHES,
+                                        send_buffer=config.SERVER_SEND_BUFFER,
+                                        udp_timeout=config.SERVER_UDP_TIMEOUT,
+                                        stop_timeout=config.SERVER_STOP_TIMEOUT).start()
+    return state_publisher.StatePublisher((config.TCP_IP, config.TCP_PORT),
+                                          connect_timeout=config.PUBLISHER_CONNECT_TIMEOUT,
+                                          send_timeout=config.PUBLISHER_SEND_TIMEOUT,
+                                          min_backoff=config.PUBLISHER_RECONNECT_MIN_DELAY,
+                                          max_backoff=config.PUBLISHER_RECONNECT_MAX_DELAY).start()
 
-    return camera, log_file, soc
 
+def stop_publisher(publisher):
+    """
+    Stops the state publisher and prints its counters.
+    :param publisher: The StatePublisher, StateServer or SharedStateWriter
+    :return: void
+    """
+    publisher.stop()
+    if config.NETWORK_MODE == "shared_memory":
+        print "Wrote " + str(publisher.get_published_states()) + " ball states to " + publisher.get_path() + "."
+        return
+    if config.NETWORK_MODE == "server":
+        print "Sent " + str(publisher.get_sent_states()) + " of " + str(publisher.get_published_states()) + \
+              " ball states (" + str(publisher.get_dropped_states()) + " dropped for newer ones) to " + \
+              str(publisher.get_total_subscribers()) + " subscribers, who missed " + \
+              str(publisher.get_dropped_batches()) + " batches between them."
+        return
+    print "Sent " + str(publisher.get_sent_states()) + " of " + str(publisher.get_published_states()) + \
+          " ball states (" + str(publisher.get_dropped_states()) + " dropped for newer ones, " + \
+          str(publisher.get_lost_states()) + " lost with the connection, " + str(publisher.get_reconnects()) + \
+          " reconnects)."
 
 if __name__ == '__main__':
-    camera, log_file, soc = setup()
-    run_loop(camera, log_file, soc)
-    cleanup(camera, log_file, soc)
+    args = get_arguments()
+    if args.headless:
+        config.HEADLESS = True
+
+    if config.HEADLESS:
+        signal.signal(signal.SIGINT, request_stop)
+        signal.signal(signal.SIGTERM, request_stop)
+
+    if config.USE_PIPELINE:
+        pipeline.run_pipeline(setup_camera, setup_recorder, close_recorder, setup_publisher, stop_publisher)
+    else:
+        camera, tracker, recorder, publisher = setup()
+        try:
+            run_loop(camera, tracker, recorder, publisher)
+        finally:
+            cleanup(camera, tracker, recorder, publisher)
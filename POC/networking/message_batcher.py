@@ -0,0 +1,98 @@
+"""
+A module to hold a class that packs ball states into batches of binary messages for sending.
+"""
+
+import time
+import wire_protocol
+
+
+class MessageBatcher:
+    """
+    Packs messages (see wire_protocol.py) into one preallocated buffer, and hands them over as a single batch to write
+    to the socket in one go. Sending a batch for every message gives the lowest latency; letting a few build up first
+    means fewer, bigger writes.
+
+    Usage:
+        batcher.add(capture_time, state, predicted_state, confidence)
+        if batcher.is_full():
+            soc.sendall(batcher.flush())
+    """
+    def __init__(self, batch_size=1, with_intercept=False):
+        """
+        Constructor.
+        :param batch_size: How many messages make a full batch (1 to wire_protocol.MAX_BATCH)
+        :param with_intercept: Whether the messages carry the ballistic predictor's intercept
+        :return: void
+        """
+        if not 1 <= batch_size <= wire_protocol.MAX_BATCH:
+            raise ValueError("batch_size must be from 1 to " + str(wire_protocol.MAX_BATCH) + ", got " +
+                             str(batch_size))
+
+        self.__batch_size = batch_size
+        self.__flags = wire_protocol.HAS_INTERCEPT if with_intercept else 0
+        self.__message_size = wire_protocol.get_message_struct(self.__flags).size
+        self.__buffer = bytearray(wire_protocol.HEADER.size + batch_size * self.__message_size)
+        self.__capture_times = [0.0] * batch_size
+        self.__count = 0
+        self.__sequence = 0
+
+    def add(self, capture_time, state, predicted_state, confidence, intercept=None):
+        """
+        Adds a message to the batch. Its sequence number is the next one, and its send delay is filled in by flush().
+        :param capture_time: When the frame was captured, in seconds
+        :param state: The ball's BallState, with its velocities filled in
+        :param predicted_state: The BallState predicted for one frame later
+        :param confidence: How sure the tracker is that this is the ball, 0 to 1
+        :param intercept: What BallisticPredictor.get_intercept() returned, or None
+        :return: void
+        """
+        if self.is_full():
+            raise ValueError("The batch is full; flush() it first")
+
+        wire_protocol.pack_message(self.__buffer, self.__get_offset(self.__count), self.__flags, self.__sequence,
+                                   capture_time, state, predicted_state, confidence, intercept)
+        self.__capture_times[self.__count] = capture_time
+        self.__count += 1
+        self.__sequence += 1
+
+    def flush(self, send_time=None):
+        """
+        Finishes the batch and starts a new one.
+        :param send_time: When the batch is being sent, on the capture times' clock (time.time() if None)
+        :return: The batch, as bytes to write to the socket (empty if there are no messages)
+        """
+        if not self.__count:
+            return b""
+
+        send_time = time.time() if send_time is None else send_time
+        wire_protocol.HEADER.pack_into(self.__buffer, 0, wire_protocol.MAGIC, wire_protocol.PROTOCOL_VERSION,
+                                       self.__flags, self.__count)
+        for i in range(self.__count):
+            wire_protocol.SEND_DELAY.pack_into(self.__buffer, self.__get_offset(i) + wire_protocol.SEND_DELAY_OFFSET,
+                                               send_time - self.__capture_times[i])
+
+        batch = bytes(self.__buffer[:self.__get_offset(self.__count)])
+        self.__count = 0
+        return batch
+
+    def get_count(self):
+        """
+        Gets how many messages are waiting in the batch.
+        :return: The number of messages
+        """
+        return self.__count
+
+    def is_full(self):
+        """
+        Whether the batch has as many messages as it can hold.
+        :return: True or False
+        """
+        return self.__count == self.__batch_size
+
+    def __get_offset(self, index):
+        """
+        Gets where in the buffer a message goes.
+        :param index: The message's place in the batch
+        :return: The offset in bytes
+        """
+        return wire_protocol.HEADER.size + index * self.__message_size
@@ -0,0 +1,118 @@
+"""
+A module to hold a class that reads ball states back out of the binary messages that MessageBatcher makes. This is the
+reference for the receiving end (the robot).
+"""
+
+import numpy
+import wire_protocol
+
+
+class MessageDecoder:
+    """
+    Splits a stream of bytes from the socket back into messages. The bytes can come in pieces of any size: whatever is
+    left over after the last whole batch is kept for the next call.
+
+    feed() gives each message as a tuple of its values, in the order of wire_protocol.FIELDS (followed by
+    wire_protocol.INTERCEPT_FIELDS if the batch has the intercept). feed_arrays() gives each batch as one numpy record
+    array instead, which is much cheaper per message for big batches.
+    """
+    def __init__(self):
+        """
+        Constructor.
+        :return: void
+        """
+        self.__pending = bytearray()
+        self.__next_sequence = None
+        self.__lost_messages = 0
+
+    def feed(self, data):
+        """
+        Takes the next bytes read from the socket.
+        :param data: The bytes
+        :return: A list of the messages that are now complete, oldest first, as tuples
+        :raises ValueError: If the stream does not hold batches of this version of the protocol
+        """
+        pending = self.__pending
+        pending += data
+        messages = []
+        offset = 0
+        batch = self.__read_header(offset)
+        while batch:
+            message, count, end = batch
+            for message_offset in range(offset + wire_protocol.HEADER.size, end, message.size):
+                messages.append(message.unpack_from(pending, message_offset))
+            self.__check_sequence(messages[-count][0], count)
+            offset = end
+            batch = self.__read_header(offset)
+
+        del pending[:offset]
+        return messages
+
+    def feed_arrays(self, data):
+        """
+        Takes the next bytes read from the socket.
+        :param data: The bytes
+        :return: A list of the batches that are now complete, oldest first, each as a record array with one record per
+                 message and the field names in wire_protocol.FIELDS (and INTERCEPT_FIELDS)
+        :raises ValueError: If the stream does not hold batches of this version of the protocol
+        """
+        pending = self.__pending
+        pending += data
+        batches = []
+        offset = 0
+        batch = self.__read_header(offset)
+        while batch:
+            message, count, end = batch
+            dtype = wire_protocol.MESSAGE_DTYPE if message is wire_protocol.MESSAGE else \
+                wire_protocol.MESSAGE_WITH_INTERCEPT_DTYPE
+            records = numpy.frombuffer(pending, dtype, count, offset + wire_protocol.HEADER.size).copy()
+            self.__check_sequence(int(records["sequence"][0]), count)
+            batches.append(records)
+            offset = end
+            batch = self.__read_header(offset)
+
+        del pending[:offset]
+        return batches
+
+    def get_lost_messages(self):
+        """
+        Gets how many messages were skipped over, going by the gaps in the sequence numbers.
+        :return: The number of messages lost so far
+        """
+        return self.__lost_messages
+
+    def __check_sequence(self, first, count):
+        """
+        Checks a batch's sequence numbers against the ones before it.
+        :param first: The sequence number of the batch's first message
+        :param count: How many messages are in the batch
+        :return: void
+        """
+        if self.__next_sequence is not None:
+            self.__lost_messages += (first - self.__next_sequence) & 0xFFFFFFFF
+        self.__next_sequence = (first + count) & 0xFFFFFFFF
+
+    def __read_header(self, offset):
+        """
+        Reads the header of the batch at the given offset in the bytes waiting to be unpacked.
+        :param offset: Where the batch starts
+        :return: A tuple: (the struct.Struct of its messages, how many there are, where the batch ends), or None if the
+                 whole batch has not come in yet
+        :raises ValueError: If there is no batch header there, or it is for an empty batch
+        """
+        pending = self.__pending
+        if len(pending) - offset < wire_protocol.HEADER.size:
+            return None
+
+        magic, version, flags, count = wire_protocol.HEADER.unpack_from(pending, offset)
+        if magic != wire_protocol.MAGIC or version != wire_protocol.PROTOCOL_VERSION:
+            raise ValueError("Not a version " + str(wire_protocol.PROTOCOL_VERSION) + " batch at byte " + str(offset) +
+                             " (magic " + str(magic) + ", version " + str(version) + ")")
+        if not 0 < count <= wire_protocol.MAX_BATCH:
+            raise ValueError("Batch at byte " + str(offset) + " has " + str(count) + " messages (1 to " +
+                             str(wire_protocol.MAX_BATCH) + " allowed)")
+        message = wire_protocol.get_message_struct(flags)
+        end = offset + wire_protocol.HEADER.size + count * message.size
+        if len(pending) < end:
+            return None
+        return message, count, end
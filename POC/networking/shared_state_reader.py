@@ -0,0 +1,115 @@
+"""
+A module to hold a class that reads the ball's state out of the shared memory that a SharedStateWriter keeps. This is
+the reference for a robot controller that runs on the same machine as the tracker.
+"""
+
+import mmap
+import os
+import time
+import wire_protocol
+
+# How long read() waits, by default, for a write that it finds under way to finish. A write takes microseconds, so one
+# that is still not done after this is from a writer that died part way through.
+_WRITE_TIMEOUT = 0.1
+
+
+class SharedStateReader:
+    """
+    Reads the newest ball state from a SharedStateWriter's file. Reading never blocks the writer, and never gives back
+    a message that was only partly written.
+
+    Usage:
+        reader = SharedStateReader(config.SHARED_MEMORY_PATH)
+        version = None
+        while True:
+            version, message = reader.wait(version)
+            x, y, d = message[3:6]
+    """
+    def __init__(self, path):
+        """
+        Constructor.
+        :param path: The file that the SharedStateWriter writes to. It has to exist already.
+        :return: void
+        :raises ValueError: If the file does not hold this version of the layout
+        """
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            self.__memory = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+
+        magic, version, flags, _ = wire_protocol.HEADER.unpack_from(self.__memory, 0)
+        if magic != wire_protocol.MAGIC or version != wire_protocol.PROTOCOL_VERSION:
+            self.__memory.close()
+            raise ValueError(path + " does not hold version " + str(wire_protocol.PROTOCOL_VERSION) + " ball states " +
+                             "(magic " + str(magic) + ", version " + str(version) + ")")
+        self.__message = wire_protocol.get_message_struct(flags)
+        self.__torn_reads = 0
+
+    def close(self):
+        """
+        Unmaps the file.
+        :return: void
+        """
+        self.__memory.close()
+
+    def get_torn_reads(self):
+        """
+        Gets the number of times that the message changed while it was being read, and had to be read again.
+        :return: The number of torn reads so far
+        """
+        return self.__torn_reads
+
+    def get_version(self):
+        """
+        Gets the seqlock's value, which changes every time a new state is written. Cheaper than read() for finding out
+        whether there is anything new.
+        :return: The version
+        """
+        return wire_protocol.SHARED_LOCK.unpack_from(self.__memory, wire_protocol.SHARED_LOCK_OFFSET)[0]
+
+    def read(self, timeout=_WRITE_TIMEOUT):
+        """
+        Reads the newest state.
+        :param timeout: How long to keep trying, in seconds, while the writer is part way through a write
+        :return: A tuple: (the version it was written at, the message as a tuple of its values in the order of
+                 wire_protocol.FIELDS (followed by wire_protocol.INTERCEPT_FIELDS if it has the intercept)). The message
+                 is None if nothing has been written yet, or if a write was still under way when the timeout ran out.
+        """
+        deadline = None
+        while True:
+            version = self.get_version()
+            if not version & 1:
+                message = self.__message.unpack_from(self.__memory, wire_protocol.SHARED_MESSAGE_OFFSET)
+                if self.get_version() == version:
+                    return version, (message if version else None)
+                self.__torn_reads += 1
+
+            # The writer is part way through; it only takes a few microseconds, unless it died there
+            if deadline is None:
+                deadline = time.time() + timeout
+            elif time.time() >= deadline:
+                return version, None
+
+    def wait(self, version, timeout=None, poll_interval=0.0):
+        """
+        Waits for a state newer than the one last read, and reads it.
+        :param version: The version that read() or wait() last gave back, or None to take whatever is there
+        :param timeout: How long to wait, in seconds, or None to wait for as long as it takes
+        :param poll_interval: How long to sleep between looks, in seconds. 0 spins, which is the quickest to notice a
+                              new state but keeps a core busy; only do that with a core to spare, or the reader will
+                              be taking CPU time from the tracker that it is waiting on.
+        :return: What read() returns, or (version, None) if the timeout ran out first
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        current = self.get_version()
+        while current == version or current & 1 or not current:
+            # An odd version is a write under way, or a writer that died part way through one, which never finishes
+            if deadline is not None and time.time() >= deadline:
+                return version, None
+            if poll_interval:
+                time.sleep(poll_interval)
+            current = self.get_version()
+        if deadline is None:
+            return self.read()
+        return self.read(max(0.0, deadline - time.time()))
@@ -0,0 +1,125 @@
+"""
+A module to hold a class that puts the ball's state in shared memory for a robot controller on the same machine.
+"""
+
+import mmap
+import os
+import time
+import wire_protocol
+import POC.config as config
+
+
+class SharedStateWriter:
+    """
+    Keeps the newest ball state in a memory-mapped file, in the layout described in wire_protocol.py, for readers in
+    other processes (see SharedStateReader). Writing a state is a handful of stores into memory: there are no system
+    calls and no copies through the kernel, so it is done right away on the calling thread.
+
+    The message is guarded by a seqlock, so readers never wait for the writer and never keep a torn message: one that
+    overlaps a write is read again. This relies on the stores reaching the other processes in the order they are made,
+    which x86 guarantees; the lock and the message are written by separate calls, which no compiler reorders. The
+    message is packed before the lock is taken and copied in while it is held, so a state that can not be packed never
+    leaves the lock odd or the message half written.
+
+    This only gets states to the reader sooner than a TCP socket does if the reader spins (see
+    SharedStateReader.wait()) on a core that nothing else needs. There is nothing for a reader to block on here, so a
+    reader that sleeps between looks adds that sleep to every state, where the kernel wakes a socket's reader as soon
+    as the state comes in; scripts_and_stuff/benchmark_shared_state.py compares the two.
+
+    It has the same publish()/start()/stop() interface as StatePublisher. Use a file on a RAM-backed filesystem, such as
+    /dev/shm on Linux, so that nothing is ever written to disk.
+    """
+    def __init__(self, path, with_intercept=False):
+        """
+        Constructor. Creates the file if there is not one there already. One that is there already is reused rather
+        than replaced, so that readers that still have it mapped see the new states.
+        :param path: The file to map
+        :param with_intercept: Whether the message carries the ballistic predictor's intercept
+        :return: void
+        """
+        self.__path = path
+        self.__flags = wire_protocol.HAS_INTERCEPT if with_intercept else 0
+        self.__message = wire_protocol.get_message_struct(self.__flags)
+        self.__packed = bytearray(self.__message.size)
+        self.__packed_view = buffer(self.__packed)
+        size = wire_protocol.SHARED_MESSAGE_OFFSET + self.__message.size
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self.__memory = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        # Start the lock over from 0 (nothing written yet) before saying what is in the message
+        self.__lock = 0
+        wire_protocol.SHARED_LOCK.pack_into(self.__memory, wire_protocol.SHARED_LOCK_OFFSET, self.__lock)
+        wire_protocol.HEADER.pack_into(self.__memory, 0, wire_protocol.MAGIC, wire_protocol.PROTOCOL_VERSION,
+                                       self.__flags, 1)
+
+        self.__clock_offset = 0.0 if config.USE_LIVE_VIDEO else None
+        self.__published_states = 0
+
+    def get_path(self):
+        """
+        Gets the file that the states are written to.
+        :return: The path
+        """
+        return self.__path
+
+    def get_published_states(self):
+        """
+        Gets the number of states given to publish().
+        :return: The number of states published so far
+        """
+        return self.__published_states
+
+    def publish(self, capture_time, state, predicted_state, confidence, intercept=None):
+        """
+        Writes a state over the one in shared memory.
+        :param capture_time: When the frame the ball was found in was captured, in seconds
+        :param state: The ball's BallState, with its velocities filled in
+        :param predicted_state: The BallState predicted for one frame later
+        :param confidence: How sure the tracker is that this is the ball, 0 to 1
+        :param intercept: What BallisticPredictor.get_intercept() returned, if the ballistic predictor is on
+        :return: void
+        """
+        # Line the clock of a recorded video up with time.time(), the same way that StateSender does
+        if self.__clock_offset is None:
+            self.__clock_offset = time.time() - capture_time
+
+        wire_protocol.pack_message(self.__packed, 0, self.__flags, self.__published_states, capture_time, state,
+                                   predicted_state, confidence, intercept)
+        wire_protocol.SEND_DELAY.pack_into(self.__packed, wire_protocol.SEND_DELAY_OFFSET,
+                                           time.time() - self.__clock_offset - capture_time)
+
+        self.__write_lock()
+        try:
+            self.__memory.seek(wire_protocol.SHARED_MESSAGE_OFFSET)
+            self.__memory.write(self.__packed_view)
+        finally:
+            self.__write_lock()
+        self.__published_states += 1
+
+    def start(self):
+        """
+        Does nothing; there is no thread to start. Here so that this can be used in place of a StatePublisher.
+        :return: This object, for convenience
+        """
+        return self
+
+    def stop(self):
+        """
+        Unmaps the file. The file itself is left, with the last state in it, for the readers.
+        :return: void
+        """
+        self.__memory.close()
+
+    def __write_lock(self):
+        """
+        Moves the seqlock on by one: to odd before the message is written, and back to even after.
+        :return: void
+        """
+        self.__lock = (self.__lock + 1) & 0xFFFFFFFF
+        wire_protocol.SHARED_LOCK.pack_into(self.__memory, wire_protocol.SHARED_LOCK_OFFSET, self.__lock)
@@ -0,0 +1,210 @@
+"""
+A module to hold a class that sends the ball's state to the robot from a background thread.
+"""
+
+import socket
+import state_sender
+import threading
+
+
+class StatePublisher:
+    """
+    A class that owns the TCP connection to the robot and sends ball states to it on its own thread, so that the vision
+    loop never waits on the network.
+
+    Only the newest state is kept: if the robot (or the network) is slower than the camera, a state that has not been
+    sent by the time the next one is published is overwritten and counted as dropped, so that a stall never turns into
+    a backlog of stale states. If the connection cannot be made or is lost, the thread keeps trying to connect, waiting
+    longer after each failure (from min_backoff up to max_backoff seconds), and states published in the meantime are
+    dropped the same way.
+
+    Usage:
+        publisher = StatePublisher((config.TCP_IP, config.TCP_PORT)).start()
+        publisher.publish(timestamp, state, predicted_state, confidence)
+        ...
+        publisher.stop()
+    """
+    def __init__(self, address, connect_timeout=1.0, send_timeout=0.5, min_backoff=0.1, max_backoff=2.0):
+        """
+        Constructor.
+        :param address: The (host, port) to connect to
+        :param connect_timeout: How long to wait for a connection to be made, in seconds
+        :param send_timeout: How long a send can block before the connection is given up on and made again, in seconds
+        :param min_backoff: How long to wait before trying to connect again after the first failure, in seconds
+        :param max_backoff: The longest to wait between tries, in seconds
+        :return: void
+        """
+        self.__address = address
+        self.__connect_timeout = connect_timeout
+        self.__send_timeout = send_timeout
+        self.__min_backoff = min_backoff
+        self.__max_backoff = max_backoff
+
+        self.__latest = None
+        self.__connected = False
+        self.__ever_connected = False
+        self.__connect_failed = False
+        self.__published_states = 0
+        self.__sent_states = 0
+        self.__dropped_states = 0
+        self.__lost_states = 0
+        self.__reconnects = 0
+        self.__stopped = False
+
+        self.__condition = threading.Condition()
+        self.__thread = threading.Thread(target=self.__publish_loop, name="StatePublisher")
+        self.__thread.daemon = True
+
+    def get_dropped_states(self):
+        """
+        Gets the number of states that were overwritten by a newer one before they could be sent.
+        :return: The number of states dropped so far
+        """
+        return self.__dropped_states
+
+    def get_lost_states(self):
+        """
+        Gets the number of states that were being sent when the connection failed.
+        :return: The number of states lost so far
+        """
+        return self.__lost_states
+
+    def get_published_states(self):
+        """
+        Gets the number of states given to publish().
+        :return: The number of states published so far
+        """
+        return self.__published_states
+
+    def get_reconnects(self):
+        """
+        Gets the number of times the connection was made again after it was lost.
+        :return: The number of reconnects so far
+        """
+        return self.__reconnects
+
+    def get_sent_states(self):
+        """
+        Gets the number of states handed to the socket.
+        :return: The number of states sent so far
+        """
+        return self.__sent_states
+
+    def is_connected(self):
+        """
+        Whether there is a connection to the robot right now.
+        :return: True or False
+        """
+        return self.__connected
+
+    def publish(self, capture_time, state, predicted_state, confidence, intercept=None):
+        """
+        Hands a state over to be sent, replacing the one waiting to be sent, if any. Never blocks on the network.
+        :param capture_time: When the frame the ball was found in was captured, in seconds
+        :param state: The ball's BallState, with its velocities filled in
+        :param predicted_state: The BallState predicted for one frame later
+        :param confidence: How sure the tracker is that this is the ball, 0 to 1
+        :param intercept: What BallisticPredictor.get_intercept() returned, if the ballistic predictor is on
+        :return: void
+        """
+        with self.__condition:
+            if self.__latest is not None:
+                self.__dropped_states += 1
+            self.__latest = (capture_time, state, predicted_state, confidence, intercept)
+            self.__published_states += 1
+            self.__condition.notify_all()
+
+    def start(self):
+        """
+        Starts the publishing thread.
+        :return: This object, for convenience
+        """
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        """
+        Sends the state that is waiting, if there is a connection, then stops the publishing thread and closes the
+        connection.
+        :return: void
+        """
+        with self.__condition:
+            self.__stopped = True
+            self.__condition.notify_all()
+        if self.__thread.is_alive():
+            self.__thread.join()
+
+    def __connect(self):
+        """
+        Tries to connect to the robot.
+        :return: The connected socket, or None if it could not connect
+        """
+        try:
+            soc = socket.create_connection(self.__address, self.__connect_timeout)
+        except socket.error as e:
+            if not self.__connect_failed:
+                print "Could not connect to " + str(self.__address) + ": " + str(e) + ". Will keep trying."
+            self.__connected = False
+            self.__connect_failed = True
+            return None
+
+        # Send each state as soon as it is written instead of waiting to fill a packet
+        soc.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        soc.settimeout(self.__send_timeout)
+        if self.__ever_connected:
+            self.__reconnects += 1
+        self.__ever_connected = True
+        self.__connect_failed = False
+        self.__connected = True
+        return soc
+
+    def __publish_loop(self):
+        """
+        Connects, then sends the newest state each time there is one, until this object is stopped.
+        :return: void
+        """
+        soc = None
+        sender = None
+        backoff = self.__min_backoff
+        while True:
+            if soc is None:
+                with self.__condition:
+                    if self.__stopped:
+                        return
+                soc = self.__connect()
+                if soc is None:
+                    with self.__condition:
+                        if not self.__stopped:
+                            self.__condition.wait(backoff)
+                    backoff = min(2 * backoff, self.__max_backoff)
+                    continue
+                backoff = self.__min_backoff
+                sender = state_sender.StateSender(soc.sendall)
+
+            with self.__condition:
+                while self.__latest is None and not self.__stopped:
+                    self.__condition.wait()
+                item = self.__latest
+                self.__latest = None
+                stopped = self.__stopped
+
+            # Send outside of the lock so that publish() never waits for the network
+            try:
+                if item is not None:
+                    sender.send(*item)
+                    self.__sent_states += 1
+                if stopped:
+                    sender.flush()
+            except socket.error as e:
+                print "Lost the connection to " + str(self.__address) + ": " + str(e)
+                if item is not None:
+                    self.__lost_states += 1
+                self.__connected = False
+                soc.close()
+                soc = None
+                continue
+
+            if stopped:
+                self.__connected = False
+                soc.close()
+                return
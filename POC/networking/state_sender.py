@@ -0,0 +1,63 @@
+"""
+A module to hold a class that encodes the ball's state for sending to the robot.
+"""
+
+import message_batcher
+import time
+import POC.config as config
+from POC.prediction import ballistic
+
+
+class StateSender:
+    """
+    Encodes ball states and hands them to a write function (a connected socket's sendall, say), either as binary
+    messages (see wire_protocol.py), batched config.WIRE_BATCH_SIZE at a time, or as the old text format, depending on
+    config.USE_BINARY_PROTOCOL.
+
+    The send delay in each binary message is measured against time.time(). Recorded video is timed from its start
+    instead, so for that the video's clock is lined up with time.time() at the first message, as if it were playing
+    live from there; its send delays then show how far the tracker falls behind (or gets ahead of) real time.
+    """
+    def __init__(self, write):
+        """
+        Constructor.
+        :param write: A function that takes the bytes to send, e.g. a connected socket's sendall
+        :return: void
+        """
+        self.__write = write
+        self.__batcher = None
+        self.__clock_offset = 0.0 if config.USE_LIVE_VIDEO else None
+        if config.USE_BINARY_PROTOCOL:
+            self.__batcher = message_batcher.MessageBatcher(config.WIRE_BATCH_SIZE,
+                                                            with_intercept=config.USE_BALLISTIC_PREDICTOR)
+
+    def flush(self):
+        """
+        Sends whatever is waiting in the batch.
+        :return: void
+        """
+        if self.__batcher and self.__batcher.get_count():
+            self.__write(self.__batcher.flush(time.time() - self.__clock_offset))
+
+    def send(self, capture_time, state, predicted_state, confidence, intercept=None):
+        """
+        Sends one state, or adds it to the batch and sends the batch once it is full.
+        :param capture_time: When the frame the ball was found in was captured, in seconds
+        :param state: The ball's BallState, with its velocities filled in
+        :param predicted_state: The BallState predicted for one frame later
+        :param confidence: How sure the tracker is that this is the ball, 0 to 1
+        :param intercept: What BallisticPredictor.get_intercept() returned, if the ballistic predictor is on
+        :return: void
+        """
+        if not self.__batcher:
+            formatted_state = state.format_for_sending()
+            if config.USE_BALLISTIC_PREDICTOR:
+                formatted_state += ballistic.format_intercept_for_sending(intercept)
+            self.__write(formatted_state)
+            return
+
+        if self.__clock_offset is None:
+            self.__clock_offset = time.time() - capture_time
+        self.__batcher.add(capture_time, state, predicted_state, confidence, intercept)
+        if self.__batcher.is_full():
+            self.flush()
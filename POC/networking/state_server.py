@@ -0,0 +1,307 @@
+"""
+A module to hold a class that serves the ball's state to any number of subscribers from a background thread.
+"""
+
+import errno
+import select
+import socket
+import state_sender
+import subscriber_buffer
+import threading
+import time
+
+
+class StateServer:
+    """
+    A class that listens for subscribers and streams ball states to all of them, so that the robot controller, a logger
+    and a scoreboard (say) can all follow the ball at once. It has the same publish()/start()/stop() interface as
+    StatePublisher, and like it runs on its own thread, so that the vision loop never waits on the network.
+
+    Subscribers connect over TCP and get the same stream that StatePublisher would send them. Each has its own bounded
+    queue (see SubscriberBuffer): one that reads too slowly loses its oldest batches, and nobody else is held up.
+
+    If a UDP port is given, a subscriber can also send any datagram to it to subscribe from the address it sent from;
+    each batch is then sent to it as one datagram, with no queueing or retransmission, for the lowest latency. It has
+    to send another datagram at least every udp_timeout seconds to stay subscribed. Datagrams that the network drops
+    show up as gaps in the sequence numbers (see MessageDecoder).
+
+    Usage:
+        server = StateServer((config.TCP_IP, config.TCP_PORT)).start()
+        server.publish(timestamp, state, predicted_state, confidence)
+        ...
+        server.stop()
+    """
+    def __init__(self, address, udp_port=None, max_batches=8, send_buffer=8192, udp_timeout=5.0, stop_timeout=0.5):
+        """
+        Constructor. Starts listening right away, so that a port that is taken is found out about here.
+        :param address: The (host, port) to listen for TCP subscribers on
+        :param udp_port: The port to take UDP subscriptions on, on the same host, or None for TCP only
+        :param max_batches: How many batches can wait for a TCP subscriber before the oldest is dropped
+        :param send_buffer: The size of each TCP subscriber's socket send buffer, in bytes. The operating system's
+                            default can hold seconds' worth of states, which a slow subscriber would then get long after
+                            they are stale, so it is kept small; the batches that do not fit wait in max_batches.
+        :param udp_timeout: How long a UDP subscription lasts without a datagram from the subscriber, in seconds
+        :param stop_timeout: How long stop() waits for the TCP subscribers to take what is still queued for them, in
+                             seconds
+        :return: void
+        :raises socket.error: If the address cannot be listened on
+        """
+        self.__max_batches = max_batches
+        self.__send_buffer = send_buffer
+        self.__udp_timeout = udp_timeout
+        self.__stop_timeout = stop_timeout
+
+        self.__listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.__listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.__listener.bind(address)
+        self.__listener.listen(8)
+        self.__listener.setblocking(False)
+
+        self.__udp_socket = None
+        if udp_port is not None:
+            self.__udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.__udp_socket.bind((address[0], udp_port))
+            self.__udp_socket.setblocking(False)
+
+        # publish() writes a byte here to wake the server thread up out of select()
+        self.__wake_reader, self.__wake_writer = socket.socketpair()
+        self.__wake_reader.setblocking(False)
+        self.__wake_writer.setblocking(False)
+        self.__awake = False
+
+        self.__subscribers = []
+        self.__udp_subscribers = {}
+        self.__latest = None
+        self.__published_states = 0
+        self.__sent_states = 0
+        self.__dropped_states = 0
+        self.__dropped_batches = 0
+        self.__total_subscribers = 0
+        self.__stopped = False
+
+        self.__lock = threading.Lock()
+        self.__thread = threading.Thread(target=self.__serve_loop, name="StateServer")
+        self.__thread.daemon = True
+
+    def get_dropped_batches(self):
+        """
+        Gets the number of batches that were dropped because a subscriber fell behind (or, over UDP, because its socket
+        buffer was full), added up over all of the subscribers.
+        :return: The number of batches dropped so far
+        """
+        return self.__dropped_batches + sum(subscriber.get_dropped_batches() for subscriber in self.__subscribers)
+
+    def get_dropped_states(self):
+        """
+        Gets the number of states that were overwritten by a newer one before the server thread got to them.
+        :return: The number of states dropped so far
+        """
+        return self.__dropped_states
+
+    def get_published_states(self):
+        """
+        Gets the number of states given to publish().
+        :return: The number of states published so far
+        """
+        return self.__published_states
+
+    def get_sent_states(self):
+        """
+        Gets the number of states handed out to the subscribers.
+        :return: The number of states sent so far
+        """
+        return self.__sent_states
+
+    def get_subscribers(self):
+        """
+        Gets how many subscribers there are right now.
+        :return: A tuple: (TCP subscribers, UDP subscribers)
+        """
+        return len(self.__subscribers), len(self.__udp_subscribers)
+
+    def get_total_subscribers(self):
+        """
+        Gets how many TCP subscribers have connected and UDP subscribers have subscribed, over the whole run.
+        :return: The number of subscribers so far
+        """
+        return self.__total_subscribers
+
+    def publish(self, capture_time, state, predicted_state, confidence, intercept=None):
+        """
+        Hands a state over to be sent to every subscriber, replacing the one waiting to be sent, if any. Never blocks on
+        the network.
+        :param capture_time: When the frame the ball was found in was captured, in seconds
+        :param state: The ball's BallState, with its velocities filled in
+        :param predicted_state: The BallState predicted for one frame later
+        :param confidence: How sure the tracker is that this is the ball, 0 to 1
+        :param intercept: What BallisticPredictor.get_intercept() returned, if the ballistic predictor is on
+        :return: void
+        """
+        with self.__lock:
+            if self.__latest is not None:
+                self.__dropped_states += 1
+            self.__latest = (capture_time, state, predicted_state, confidence, intercept)
+            self.__published_states += 1
+            self.__wake()
+
+    def start(self):
+        """
+        Starts the server thread.
+        :return: This object, for convenience
+        """
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        """
+        Sends the state that is waiting, gives the TCP subscribers up to stop_timeout seconds to take the batches still
+        queued for them, then stops the server thread and disconnects everyone.
+        :return: void
+        """
+        with self.__lock:
+            self.__stopped = True
+            self.__wake()
+        if self.__thread.is_alive():
+            self.__thread.join()
+
+    def __accept(self):
+        """
+        Takes the TCP subscribers that are waiting to connect.
+        :return: void
+        """
+        while True:
+            try:
+                soc, address = self.__listener.accept()
+            except socket.error as e:
+                if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                    print "Could not accept a subscriber: " + str(e)
+                return
+
+            # Send each state as soon as it is written instead of waiting to fill a packet
+            soc.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            soc.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.__send_buffer)
+            self.__subscribers.append(subscriber_buffer.SubscriberBuffer(soc, self.__max_batches))
+            self.__total_subscribers += 1
+            print "Subscriber connected from " + str(address) + "."
+
+    def __drop_subscriber(self, subscriber):
+        """
+        Disconnects a TCP subscriber.
+        :param subscriber: Its SubscriberBuffer
+        :return: void
+        """
+        print "Subscriber at " + str(subscriber.get_address()) + " disconnected."
+        self.__dropped_batches += subscriber.get_dropped_batches()
+        self.__subscribers.remove(subscriber)
+        subscriber.close()
+
+    def __drain(self):
+        """
+        Writes out the batches still queued for the TCP subscribers, until they are all out or stop_timeout seconds
+        have gone by. A subscriber that is not reading would otherwise hold up stopping for as long as it likes.
+        :return: void
+        """
+        deadline = time.time() + self.__stop_timeout
+        while True:
+            pending = [subscriber for subscriber in self.__subscribers if subscriber.has_pending()]
+            remaining = deadline - time.time()
+            if not pending or remaining <= 0:
+                return
+            _, ready_to_write, _ = select.select([], pending, [], remaining)
+            for subscriber in ready_to_write:
+                if not subscriber.write():
+                    self.__drop_subscriber(subscriber)
+
+    def __fan_out(self, batch):
+        """
+        Sends a batch to every subscriber. This is what the StateSender writes to.
+        :param batch: The bytes to send
+        :return: void
+        """
+        for subscriber in list(self.__subscribers):
+            subscriber.add(batch)
+            if not subscriber.write():
+                self.__drop_subscriber(subscriber)
+
+        for address in self.__udp_subscribers.keys():
+            try:
+                self.__udp_socket.sendto(batch, address)
+            except socket.error:
+                self.__dropped_batches += 1
+
+    def __read_udp_subscriptions(self):
+        """
+        Takes the datagrams that UDP subscribers sent to subscribe or to stay subscribed.
+        :return: void
+        """
+        while True:
+            try:
+                _, address = self.__udp_socket.recvfrom(4096)
+            except socket.error:
+                return
+            if address not in self.__udp_subscribers:
+                self.__total_subscribers += 1
+                print "UDP subscriber at " + str(address) + "."
+            self.__udp_subscribers[address] = time.time()
+
+    def __serve_loop(self):
+        """
+        Waits for subscribers, sockets that can be written and new states, until this object is stopped.
+        :return: void
+        """
+        sender = state_sender.StateSender(self.__fan_out)
+        while True:
+            readable = [self.__wake_reader, self.__listener] + self.__subscribers
+            if self.__udp_socket:
+                readable.append(self.__udp_socket)
+            writable = [subscriber for subscriber in self.__subscribers if subscriber.has_pending()]
+            ready_to_read, ready_to_write, _ = select.select(readable, writable, [], self.__udp_timeout)
+
+            if self.__wake_reader in ready_to_read:
+                with self.__lock:
+                    self.__wake_reader.recv(4096)
+                    self.__awake = False
+                    item = self.__latest
+                    self.__latest = None
+                    stopped = self.__stopped
+
+                # Send outside of the lock so that publish() never waits for the network
+                if item is not None:
+                    sender.send(*item)
+                    self.__sent_states += 1
+                if stopped:
+                    sender.flush()
+                    self.__drain()
+                    for subscriber in list(self.__subscribers):
+                        self.__drop_subscriber(subscriber)
+                    self.__listener.close()
+                    if self.__udp_socket:
+                        self.__udp_socket.close()
+                    self.__wake_reader.close()
+                    self.__wake_writer.close()
+                    return
+
+            if self.__listener in ready_to_read:
+                self.__accept()
+            if self.__udp_socket in ready_to_read:
+                self.__read_udp_subscriptions()
+            for subscriber in list(self.__subscribers):
+                if subscriber in ready_to_read and not subscriber.read():
+                    self.__drop_subscriber(subscriber)
+                elif subscriber in ready_to_write and not subscriber.write():
+                    self.__drop_subscriber(subscriber)
+
+            # Forget UDP subscribers that have not been heard from in a while
+            now = time.time()
+            for address, last_heard in self.__udp_subscribers.items():
+                if now - last_heard > self.__udp_timeout:
+                    del self.__udp_subscribers[address]
+
+    def __wake(self):
+        """
+        Wakes the server thread up, if it is not already awake. Must be called with the lock held.
+        :return: void
+        """
+        if not self.__awake:
+            self.__awake = True
+            self.__wake_writer.send(b"\0")
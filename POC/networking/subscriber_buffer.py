@@ -0,0 +1,112 @@
+"""
+A module to hold a class that queues the bytes waiting to be written to one subscriber of the state server.
+"""
+
+import collections
+import errno
+import socket
+
+
+class SubscriberBuffer:
+    """
+    A bounded queue of the batches waiting to go out on one subscriber's non-blocking TCP socket.
+
+    Batches are written whole and in order. If the subscriber reads more slowly than batches are added, the oldest ones
+    that it has not started to receive are dropped, so that it keeps getting the newest states and never holds up the
+    others.
+
+    Can be passed to select.select() directly.
+    """
+    def __init__(self, soc, max_batches=8):
+        """
+        Constructor.
+        :param soc: The subscriber's connected socket. It is made non-blocking.
+        :param max_batches: How many batches can wait before the oldest is dropped
+        :return: void
+        """
+        self.__soc = soc
+        self.__soc.setblocking(False)
+        self.__address = soc.getpeername()
+        self.__max_batches = max(1, max_batches)
+        self.__batches = collections.deque()
+        self.__written = 0
+        self.__dropped_batches = 0
+
+    def add(self, batch):
+        """
+        Queues a batch, dropping the oldest one that has not started to go out if the queue is full.
+        :param batch: The bytes to send
+        :return: void
+        """
+        self.__batches.append(batch)
+
+        # The batch that is half written does not count, and is never dropped, or the subscriber would lose its place
+        # in the stream
+        started = 1 if self.__written else 0
+        if len(self.__batches) - started > self.__max_batches:
+            del self.__batches[started]
+            self.__dropped_batches += 1
+
+    def close(self):
+        """
+        Closes the subscriber's socket.
+        :return: void
+        """
+        self.__soc.close()
+
+    def fileno(self):
+        """
+        Gets the socket's file descriptor, for select.select().
+        :return: The file descriptor
+        """
+        return self.__soc.fileno()
+
+    def get_address(self):
+        """
+        Gets who the subscriber is.
+        :return: The (host, port) that it connected from
+        """
+        return self.__address
+
+    def get_dropped_batches(self):
+        """
+        Gets the number of batches that were dropped because the subscriber fell behind.
+        :return: The number of batches dropped so far
+        """
+        return self.__dropped_batches
+
+    def has_pending(self):
+        """
+        Whether there is anything waiting to be written.
+        :return: True or False
+        """
+        return bool(self.__batches)
+
+    def read(self):
+        """
+        Reads and throws away whatever the subscriber sent, to find out whether it is still connected.
+        :return: False if the subscriber has disconnected, True otherwise
+        """
+        try:
+            return bool(self.__soc.recv(4096))
+        except socket.error as e:
+            return e.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR)
+
+    def write(self):
+        """
+        Writes as much of the waiting batches as the socket will take without blocking.
+        :return: False if the subscriber has disconnected, True otherwise
+        """
+        while self.__batches:
+            batch = self.__batches[0]
+            try:
+                written = self.__soc.send(batch[self.__written:] if self.__written else batch)
+            except socket.error as e:
+                return e.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR)
+
+            self.__written += written
+            if self.__written < len(batch):
+                return True
+            self.__batches.popleft()
+            self.__written = 0
+        return True
@@ -0,0 +1,104 @@
+"""
+This module defines the binary format that ball states are sent to the robot in.
+
+Everything is little-endian with a fixed layout, so the receiver can unpack a message with one struct call (or a whole
+batch with one numpy.frombuffer) and never has to search for where a field ends. Each write to the socket is a batch:
+a header, then count messages.
+
+Header (4 bytes):
+    magic       B    MAGIC, to catch a receiver that has lost its place in the stream
+    version     B    PROTOCOL_VERSION
+    flags       B    HAS_INTERCEPT if the messages carry the intercept
+    count       B    how many messages follow (1 to MAX_BATCH)
+
+Message (56 bytes, or 72 with HAS_INTERCEPT):
+    sequence        I    counts up by one per message, so the receiver can tell when it missed some
+    capture_time    d    when the frame was captured, in seconds (time.time() for live video, so that the robot can
+                         measure how stale the state is on its own clock; from the start of a recorded video)
+    send_delay      f    how long after capture_time the batch was written to the socket, in seconds
+    x, y, d         3f   the ball's position: pixels, pixels, inches from the camera
+    vx, vy, vd      3f   its velocity, per second
+    px, py, pd      3f   where it is predicted to be one frame later
+    confidence      f    how sure the tracker is that this is the ball, 0 to 1
+    ix, iy, id, it  4f   (HAS_INTERCEPT only) where and in how many seconds it will get to the robot (see
+                         prediction/ballistic.py), NaN if that is not known
+
+The same message is also what a SharedStateWriter keeps in shared memory for a robot controller on the same machine.
+The region holds only the newest message:
+    header          4 bytes, as above, with a count of 1
+    lock            I    a seqlock: odd while the message is being written, and one more each time the writer starts
+                         or finishes writing it
+    message         the message, at SHARED_MESSAGE_OFFSET
+A reader reads the lock, then the message, then the lock again, and only keeps the message if the lock was even and
+did not change (see SharedStateReader).
+"""
+
+import numpy
+import struct
+
+PROTOCOL_VERSION = 1
+MAGIC = 0xB5
+
+# Header flags
+HAS_INTERCEPT = 1
+
+HEADER = struct.Struct("<BBBB")
+MESSAGE = struct.Struct("<Idf3f3f3ff")
+MESSAGE_WITH_INTERCEPT = struct.Struct("<Idf3f3f3ff4f")
+
+# The names of the values that a message unpacks to, in order
+FIELDS = ("sequence", "capture_time", "send_delay", "x", "y", "d", "vx", "vy", "vd", "px", "py", "pd", "confidence")
+INTERCEPT_FIELDS = ("ix", "iy", "id", "it")
+
+# The same layouts, for unpacking a whole batch at once
+MESSAGE_DTYPE = numpy.dtype([(name, "<u4" if name == "sequence" else "<f8" if name == "capture_time" else "<f4")
+                             for name in FIELDS])
+MESSAGE_WITH_INTERCEPT_DTYPE = numpy.dtype(MESSAGE_DTYPE.descr + [(name, "<f4") for name in INTERCEPT_FIELDS])
+
+# The count is one byte
+MAX_BATCH = 255
+
+# Where send_delay is in a message, so that it can be filled in when the batch is written
+SEND_DELAY = struct.Struct("<f")
+SEND_DELAY_OFFSET = struct.calcsize("<Id")
+
+# The seqlock in front of the message in shared memory
+SHARED_LOCK = struct.Struct("<I")
+SHARED_LOCK_OFFSET = HEADER.size
+SHARED_MESSAGE_OFFSET = SHARED_LOCK_OFFSET + SHARED_LOCK.size
+
+_NAN = float('nan')
+_NO_INTERCEPT = (_NAN,) * 4
+
+
+def get_message_struct(flags):
+    """
+    Gets the layout of the messages in a batch.
+    :param flags: The batch's header flags
+    :return: The struct.Struct of one message
+    """
+    return MESSAGE_WITH_INTERCEPT if flags & HAS_INTERCEPT else MESSAGE
+
+
+def pack_message(buffer, offset, flags, sequence, capture_time, state, predicted_state, confidence, intercept=None):
+    """
+    Writes one message into a buffer, with a send delay of 0 (see SEND_DELAY_OFFSET).
+    :param buffer: A writable buffer (e.g. a bytearray)
+    :param offset: Where in the buffer to write it
+    :param flags: The header flags of the batch it is in
+    :param sequence: The message's sequence number
+    :param capture_time: When the frame was captured, in seconds
+    :param state: The ball's BallState, with its velocities filled in
+    :param predicted_state: The BallState predicted for one frame later
+    :param confidence: How sure the tracker is that this is the ball, 0 to 1
+    :param intercept: With HAS_INTERCEPT, what BallisticPredictor.get_intercept() returned (None for NaNs)
+    :return: void
+    """
+    values = (sequence & 0xFFFFFFFF, capture_time, 0.0,
+              state.get_x_pos(), state.get_y_pos(), state.get_d_pos(),
+              state.get_x_velocity(), state.get_y_velocity(), state.get_d_velocity(),
+              predicted_state.get_x_pos(), predicted_state.get_y_pos(), predicted_state.get_d_pos(), confidence)
+    if flags & HAS_INTERCEPT:
+        MESSAGE_WITH_INTERCEPT.pack_into(buffer, offset, *(values + tuple(intercept or _NO_INTERCEPT)))
+    else:
+        MESSAGE.pack_into(buffer, offset, *values)
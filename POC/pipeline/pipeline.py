@@ -0,0 +1,293 @@
+"""
+This module runs the application as a pipeline of processes: capture -> detect -> predict -> publish.
+
+Each stage runs on its own core, so the sustained frame rate is set by the slowest stage instead of the sum of all of
+them. Frames live in shared memory (see shared_frames.py); only slot numbers and BallState objects go through the
+queues between the stages.
+"""
+
+import cv2
+from ball_tracking import ball_tracker
+from capture import frame_grabber
+from prediction import ballistic
+from ui import frame_drawer
+import config
+import multiprocessing
+import os
+import shared_frames
+import signal
+import time
+
+# How long the capture stage waits for a free slot before checking again whether it should stop
+_POLL_TIME = 0.1
+
+
+def run_pipeline(setup_camera, setup_recorder, close_recorder, setup_publisher, stop_publisher):
+    """
+    Starts all of the stages and waits for them to run through the video (or until the user quits).
+    :param setup_camera: A function that opens and returns the camera. Called in the capture process.
+    :param setup_recorder: A function that makes and returns the recorder. Called in the publish process.
+    :param close_recorder: A function that closes it. Called in the publish process.
+    :param setup_publisher: A function that starts and returns what the ball's states are published with (a
+                            StatePublisher, say). Called in the publish process.
+    :param stop_publisher: A function that stops it. Called in the publish process.
+    :return: void
+    """
+    # Grab one frame to find out how big the frames will be after resizing
+    camera = setup_camera()
+    grabbed, frame = camera.read()
+    camera.release()
+    if not grabbed:
+        print "Could not read a frame from the camera."
+        return
+
+    height = int(frame.shape[0] * (config.IMAGE_WIDTH / float(frame.shape[1])))
+    frames = shared_frames.SharedFrameRing(config.PIPELINE_NUM_SLOTS, (height, config.IMAGE_WIDTH, 3))
+
+    stop_event = multiprocessing.Event()
+    detect_queue = multiprocessing.Queue()
+    predict_queue = multiprocessing.Queue()
+    publish_queue = multiprocessing.Queue()
+
+    stages = [
+        multiprocessing.Process(target=_run_stage, name="capture",
+                                args=(_capture_stage, detect_queue, stop_event,
+                                      setup_camera, frames, detect_queue, stop_event)),
+        multiprocessing.Process(target=_run_stage, name="detect",
+                                args=(_detect_stage, predict_queue, stop_event, frames, detect_queue, predict_queue)),
+        multiprocessing.Process(target=_run_stage, name="predict",
+                                args=(_predict_stage, publish_queue, stop_event,
+                                      predict_queue, publish_queue, (config.IMAGE_WIDTH, height))),
+        multiprocessing.Process(target=_run_stage, name="publish",
+                                args=(_publish_stage, None, stop_event,
+                                      setup_recorder, close_recorder, setup_publisher, stop_publisher, frames,
+                                      publish_queue, stop_event)),
+    ]
+    for stage in stages:
+        stage.start()
+
+    # On Ctrl-C or SIGTERM, let the capture stage stop and the rest of the stages drain whatever is still in flight
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda signum, frame: stop_event.set())
+
+    _wait_for_stages(stages, [detect_queue, predict_queue, publish_queue, None], stop_event)
+
+
+def _run_stage(stage, next_queue, stop_event, *args):
+    """
+    Runs one stage of the pipeline in this process. However the stage ends, the next stage is told that there is
+    nothing more coming, and if it failed, every other stage is told to stop.
+    :param stage: The stage's function.
+    :param next_queue: The queue the stage sends its results to, or None if it is the last stage.
+    :param stop_event: Set when the pipeline should stop.
+    :param args: The stage function's arguments.
+    :return: void
+    """
+    _ignore_interrupts()
+    try:
+        stage(*args)
+    except:
+        stop_event.set()
+        raise
+    finally:
+        if next_queue is not None:
+            next_queue.put(None)
+
+
+def _wait_for_stages(stages, next_queues, stop_event):
+    """
+    Waits for every stage to exit. Once one of them has failed (or been killed), the next stage is told that nothing
+    more is coming from it, in case it died before it could say so itself, and the other stages get
+    config.PIPELINE_STOP_TIMEOUT seconds to finish what they have. Any still running after that are killed; without
+    this, a stage left waiting on a queue that will never be filled would keep the program from ever exiting.
+    :param stages: The stages' Processes.
+    :param next_queues: The queue each stage sends its results to, or None for the last stage.
+    :param stop_event: Set when the pipeline should stop.
+    :return: void
+    """
+    deadline = None
+    while any(stage.is_alive() for stage in stages):
+        if deadline is None and any(stage.exitcode not in (None, 0) for stage in stages):
+            stop_event.set()
+            for stage, next_queue in zip(stages, next_queues):
+                if stage.exitcode not in (None, 0) and next_queue is not None:
+                    next_queue.put(None)
+            deadline = time.time() + config.PIPELINE_STOP_TIMEOUT
+        if deadline is not None and time.time() > deadline:
+            for stage in stages:
+                if stage.is_alive():
+                    # The stages ignore SIGTERM (see _ignore_interrupts), so Process.terminate() would not stop them
+                    print "The " + stage.name + " stage did not stop after another stage failed. Killing it."
+                    os.kill(stage.pid, signal.SIGKILL)
+            deadline = float("inf")
+        for stage in stages:
+            stage.join(_POLL_TIME)
+
+
+def _capture_stage(setup_camera, frames, detect_queue, stop_event):
+    """
+    Reads frames from the camera and resizes them straight into free shared memory slots.
+    :param setup_camera: A function that opens and returns the camera.
+    :param frames: The SharedFrameRing.
+    :param detect_queue: Where to send (frame number, slot, capture timestamp) for each frame.
+    :param stop_event: Set when the pipeline should stop.
+    :return: void
+    """
+    camera = setup_camera()
+    height, width = frames.get_frame_shape()[:2]
+
+    frame_number = 0
+    try:
+        while not stop_event.is_set():
+            # Wait for a free slot before reading, so that we read the newest frame the camera has. If a later stage
+            # has died, no slot will ever come back, so keep checking whether we should stop.
+            slot = frames.acquire(_POLL_TIME)
+            if slot is None:
+                continue
+            grabbed, frame = camera.read()
+            if not grabbed:
+                frames.release(slot)
+                break
+
+            timestamp = frame_grabber.get_frame_timestamp(camera, not config.USE_LIVE_VIDEO)
+            cv2.resize(frame, (width, height), dst=frames.get_frame(slot), interpolation=cv2.INTER_AREA)
+            detect_queue.put((frame_number, slot, timestamp))
+            frame_number += 1
+    finally:
+        camera.release()
+
+
+def _detect_stage(frames, detect_queue, predict_queue):
+    """
+    Finds the ball in each frame.
+    :param frames: The SharedFrameRing.
+    :param detect_queue: Where the frames come from.
+    :param predict_queue: Where to send the frame's slot along with the predicted and measured ball states and the
+                          tracker's confidence.
+    :return: void
+    """
+    tracker = ball_tracker.BallTracker(None)
+
+    try:
+        while True:
+            item = detect_queue.get()
+            if item is None:
+                return
+
+            frame_number, slot, timestamp = item
+            tracker.set_frame(frames.get_frame(slot), timestamp)
+            predicted_state = tracker.get_predicted_state()
+            measured_ball_state = tracker.find_ball()
+            predict_queue.put((frame_number, slot, timestamp, predicted_state, measured_ball_state,
+                               tracker.get_predicted_state(), tracker.get_confidence()))
+    finally:
+        tracker.close()
+
+
+def _predict_stage(predict_queue, publish_queue, frame_size):
+    """
+    Predicts where the ball will get to the robot, if the ballistic predictor is enabled. This keeps it off of the
+    detection stage's critical path.
+    :param predict_queue: Where the detection results come from.
+    :param publish_queue: Where to send the results, with the intercept.
+    :param frame_size: The (width, height) of the frames after resizing.
+    :return: void
+    """
+    predictor = ballistic.BallisticPredictor(frame_size) if config.USE_BALLISTIC_PREDICTOR else None
+
+    while True:
+        item = predict_queue.get()
+        if item is None:
+            return
+
+        frame_number, slot, timestamp, predicted_state, measured_ball_state, updated_prediction, confidence = item
+        intercept = None
+        if predictor and measured_ball_state:
+            predictor.update(measured_ball_state, timestamp)
+            intercept = predictor.get_intercept()
+        publish_queue.put((frame_number, slot, timestamp, predicted_state, measured_ball_state, updated_prediction,
+                           confidence, intercept))
+
+
+def _publish_stage(setup_recorder, close_recorder, setup_publisher, stop_publisher, frames, publish_queue, stop_event):
+    """
+    Draws, records and sends the results, then gives the frame's slot back to the capture stage.
+    :param setup_recorder: A function that makes and returns the recorder.
+    :param close_recorder: A function that closes it.
+    :param setup_publisher: A function that starts and returns what the ball's states are published with.
+    :param stop_publisher: A function that stops it.
+    :param frames: The SharedFrameRing.
+    :param publish_queue: Where the results come from.
+    :param stop_event: Set this when the user quits.
+    :return: void
+    """
+    recorder = setup_recorder()
+    publisher = setup_publisher()
+    try:
+        _publish_results(recorder, publisher, frames, publish_queue, stop_event)
+    finally:
+        try:
+            close_recorder(recorder)
+        finally:
+            stop_publisher(publisher)
+
+
+def _publish_results(recorder, publisher, frames, publish_queue, stop_event):
+    """
+    The publish stage's loop, run until the stage before it runs out of results.
+    :param recorder: The recorder.
+    :param publisher: What the ball's states are published with.
+    :param frames: The SharedFrameRing.
+    :param publish_queue: Where the results come from.
+    :param stop_event: Set this when the user quits.
+    :return: void
+    """
+    drawer = frame_drawer.FrameDrawer(None)
+    frames_processed = 0
+    start_time = time.time()
+
+    while True:
+        item = publish_queue.get()
+        if item is None:
+            break
+
+        frame_number, slot, timestamp, predicted_state, measured_ball_state, updated_prediction, confidence, \
+            intercept = item
+        if not config.HEADLESS:
+            drawer.set_frame(frames.get_frame(slot))
+            drawer.paint_prediction_box(predicted_state)
+            drawer.circle_ball_and_show(measured_ball_state)
+
+        if measured_ball_state:
+            recorder.record_data(timestamp, measured_ball_state, updated_prediction)
+            publisher.publish(timestamp, measured_ball_state, updated_prediction, confidence, intercept)
+        else:
+            recorder.record_miss(timestamp)
+
+        frames.release(slot)
+        frames_processed += 1
+
+        # Wait for the user to push the q key to quit the program or any button to move to next frame
+        if config.HEADLESS:
+            continue
+        elif config.USE_LIVE_VIDEO:
+            key = cv2.waitKey(1) & 0xFF
+            if key == ord("q"):
+                stop_event.set()
+        else:
+            cv2.waitKey(0)
+
+    elapsed = time.time() - start_time
+    print "Processed " + str(frames_processed) + " frames in " + ("%.2f" % elapsed) + " seconds (" + \
+          ("%.1f" % (frames_processed / elapsed if elapsed > 0 else 0.0)) + " fps)."
+
+
+def _ignore_interrupts():
+    """
+    Makes this process ignore Ctrl-C and SIGTERM. The parent process handles them by telling the capture stage to stop,
+    after which every stage finishes the frames that are still in flight and exits. The parent kills the stages itself
+    if one of them fails.
+    :return: void
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
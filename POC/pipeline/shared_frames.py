@@ -0,0 +1,68 @@
+"""
+A module to hold a class for passing frames between processes without pickling them.
+"""
+
+import ctypes
+import multiprocessing
+import numpy
+import Queue
+
+
+class SharedFrameRing:
+    """
+    A fixed number of frame buffers in shared memory, plus a queue of the ones that are free.
+
+    Create this before starting the worker processes so that they all inherit the same memory. A producer takes a free
+    slot, writes a frame into it and passes the slot number on to the next stage; whichever stage is done with the
+    frame last gives the slot back. Only slot numbers ever go through a queue.
+    """
+    def __init__(self, num_slots, frame_shape):
+        """
+        Constructor.
+        :param num_slots: The number of frames that can be in flight at once.
+        :param frame_shape: The (height, width, channels) of every frame.
+        :return: void
+        """
+        self.__frame_shape = tuple(frame_shape)
+        self.__memory = multiprocessing.RawArray(ctypes.c_uint8, num_slots * int(numpy.prod(frame_shape)))
+        self.__frames = None
+        self.__free_slots = multiprocessing.Queue()
+        for slot in range(num_slots):
+            self.__free_slots.put(slot)
+
+    def acquire(self, timeout=None):
+        """
+        Waits for a free slot and hands it out.
+        :param timeout: The most seconds to wait, or None to wait for as long as it takes.
+        :return: The slot number, or None if no slot came free in time
+        """
+        try:
+            return self.__free_slots.get(timeout=timeout)
+        except Queue.Empty:
+            return None
+
+    def get_frame(self, slot):
+        """
+        Gets the frame stored in the given slot. This is a view onto the shared memory, not a copy.
+        :param slot: The slot number
+        :return: A numpy array of shape frame_shape
+        """
+        if self.__frames is None:
+            # Build the view lazily so that each process makes its own after it has been forked
+            self.__frames = numpy.frombuffer(self.__memory, dtype=numpy.uint8).reshape((-1,) + self.__frame_shape)
+        return self.__frames[slot]
+
+    def get_frame_shape(self):
+        """
+        Gets the shape of the frames in this ring.
+        :return: (height, width, channels)
+        """
+        return self.__frame_shape
+
+    def release(self, slot):
+        """
+        Gives a slot back so that the producer can reuse it.
+        :param slot: The slot number
+        :return: void
+        """
+        self.__free_slots.put(slot)
@@ -0,0 +1,53 @@
+"""
+A module to hold an alpha-beta filter predictor.
+"""
+
+from POC.ball_tracking import ball_state
+import POC.config as config
+import predictor
+
+
+class AlphaBetaPredictor(predictor.Predictor):
+    """
+    An alpha-beta filter: the Kalman filter's constant velocity model with a fixed gain, so each update is a few
+    multiply-adds. At each measurement, the ball is predicted to have moved by its velocity times the time since the
+    last one; then the position is moved alpha of the way towards the measurement and the velocity is corrected by beta
+    times the miss, per time step.
+    """
+    def __init__(self, alpha=None, beta=None):
+        """
+        Constructor.
+        :param alpha: How much of the miss to correct the position by, 0 to 1 (config.ALPHA_BETA_ALPHA if None)
+        :param beta: How much of the miss to correct the velocity by, 0 to 2 (config.ALPHA_BETA_BETA if None)
+        :return: void
+        """
+        predictor.Predictor.__init__(self)
+        self.__alpha = config.ALPHA_BETA_ALPHA if alpha is None else alpha
+        self.__beta = config.ALPHA_BETA_BETA if beta is None else beta
+
+    def _estimate_state(self, measured_ball_state, dt):
+        """
+        Moves the estimate on by dt and corrects it by alpha (position) and beta (velocity) of how far it missed.
+        :param measured_ball_state: The BallState that was measured
+        :param dt: The time since the last update, in seconds
+        :return: The new estimate
+        """
+        measured = (measured_ball_state.get_x_pos(), measured_ball_state.get_y_pos(), measured_ball_state.get_d_pos())
+        last = self._estimate
+        if last is None:
+            position = measured
+            velocity = self._get_measured_velocity(measured_ball_state)
+        else:
+            old_position = (last.get_x_pos(), last.get_y_pos(), last.get_d_pos())
+            old_velocity = (last.get_x_velocity(), last.get_y_velocity(), last.get_d_velocity())
+            beta = self.__beta / dt
+            position = []
+            velocity = []
+            for p, v, m in zip(old_position, old_velocity, measured):
+                guess = p + v * dt
+                miss = m - guess
+                position.append(guess + self.__alpha * miss)
+                velocity.append(v + beta * miss)
+
+        return ball_state.BallState(position[0], position[1], position[2], velocity[0], velocity[1], velocity[2],
+                                    measured_ball_state.get_radius())
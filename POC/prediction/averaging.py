@@ -0,0 +1,90 @@
+"""
+A module to hold the predictor that the ball tracker has always used.
+"""
+
+import POC.config as config
+import predictor
+import track_history
+
+
+class AveragingPredictor(predictor.Predictor):
+    """
+    Works out the velocity from the last state, moves it towards the average velocity of the last few states (keeping
+    config.VELOCITY_BLEND of it) and predicts that the ball keeps going at that velocity. The last
+    config.HISTORY_DEPTH velocities are kept in a TrackHistory, so the average costs the same however many there are.
+    """
+    def __init__(self, blend=None, depth=None):
+        """
+        Constructor.
+        :param blend: How much of each measured velocity to keep (config.VELOCITY_BLEND if None)
+        :param depth: How many of the last velocities to average (config.HISTORY_DEPTH if None)
+        :return: void
+        """
+        predictor.Predictor.__init__(self)
+        self.__blend = config.VELOCITY_BLEND if blend is None else blend
+        self.__velocities = track_history.TrackHistory(config.HISTORY_DEPTH if depth is None else depth, 3)
+
+    def reset(self):
+        """
+        Forgets everything measured so far.
+        :return: void
+        """
+        predictor.Predictor.reset(self)
+        self.__velocities.clear()
+
+    def set_estimate(self, state):
+        """
+        Replaces the last state, so that the next velocity is worked out from it and its velocity goes into the average.
+        :param state: The BallState, with its velocities filled in
+        :return: void
+        """
+        predictor.Predictor.set_estimate(self, state)
+        self.__velocities.replace_latest((state.get_x_velocity(), state.get_y_velocity(), state.get_d_velocity()))
+
+    def _estimate_state(self, measured_ball_state, dt):
+        """
+        Works out the measured state's velocities. Side-effect: the measured state's velocities are set to the ones the
+        prediction uses, and it becomes the estimate.
+        :param measured_ball_state: The BallState that was measured
+        :param dt: The time since the last update, in seconds
+        :return: The measured BallState
+        """
+        # Calculate the ball's velocities in x, y, and d
+        measured_velocities = self.__calculate_velocities(measured_ball_state, dt)
+        if self.__velocities.get_count():
+            avgs = self.__velocities.get_mean().tolist()
+            measured_velocities = self.__constrain_to_average(measured_velocities, avgs)
+
+        measured_ball_state.set_x_velocity(measured_velocities[0])
+        measured_ball_state.set_y_velocity(measured_velocities[1])
+        measured_ball_state.set_d_velocity(measured_velocities[2])
+
+        self.__velocities.append(measured_velocities)
+        return measured_ball_state
+
+    def __calculate_velocities(self, current_state, dt):
+        """
+        Calculates the ball's velocity values in x, y, and d directions, from the last state to this one.
+        :param current_state: The measured state
+        :param dt: The time since the last state, in seconds
+        :return: A tuple: (vx, vy, vd), per second. For the first state, whatever velocity was measured with it.
+        """
+        last_state = self._estimate
+        if last_state:
+            vx = (current_state.get_x_pos() - last_state.get_x_pos()) / dt
+            vy = (current_state.get_y_pos() - last_state.get_y_pos()) / dt
+            vd = (current_state.get_d_pos() - last_state.get_d_pos()) / dt
+            return vx, vy, vd
+        else:
+            return self._get_measured_velocity(current_state)
+
+    def __constrain_to_average(self, measured_velocities, avgs):
+        """
+        Moves the measured velocities towards the given averages.
+        :param measured_velocities: A tuple of velocities of the form (vx, vy, vd)
+        :param avgs: The averages, in the form (vxavg, vyavg, vdavg)
+        :return: A new tuple of velocities which is closer to the average
+        """
+        blend = self.__blend
+        constrain = lambda i: ((blend * measured_velocities[i]) + ((1 - blend) * avgs[i]))
+        return constrain(0), constrain(1), constrain(2)
@@ -0,0 +1,248 @@
+"""
+A module to hold a class that predicts where the ball will be many frames from now, with gravity and table bounces.
+"""
+
+import numpy
+import POC.config as config
+
+# The most table bounces to follow in one look-ahead. After the last one, the ball rolls along the table.
+_MAX_BOUNCES = 3
+
+
+class BallisticPredictor:
+    """
+    Fits a ballistic trajectory to the last few measurements of the ball and rolls it forward, to say where the ball
+    will be when it reaches the robot.
+
+    The measurements (x and y in pixels, d in inches) are turned into positions in inches relative to the camera: X to
+    the right, Y down and Z (= d) away from it. The camera is assumed to be level, so gravity is along +Y and the table
+    is the plane Y = config.CAMERA_HEIGHT_ABOVE_TABLE. In those coordinates the flight between bounces is a parabola, so
+    the fit is a linear least squares (gravity is known, so only the position and velocity are fitted), and a bounce is
+    where the parabola meets the table: the vertical velocity flips and is scaled by config.TABLE_RESTITUTION.
+
+    The look-ahead is worked out in one go for all of its steps: the bounce times are solved for first, then each step
+    is evaluated on whichever piece of the trajectory it falls in. The intercept is where the ball crosses the plane
+    Z = config.INTERCEPT_DISTANCE on its way to the camera.
+
+    Usage, once per frame where the ball was found:
+        predictor.update(measured_ball_state, timestamp)
+        predictor.get_intercept()
+    """
+    def __init__(self, frame_size, history=None, steps=None, frame_time=None):
+        """
+        Constructor.
+        :param frame_size: The (width, height) of the frames that the ball is measured in, at full size. The camera is
+                           taken to look straight along their middle, so this has to be the frames as they are after
+                           resizing (which keeps the camera's aspect ratio), not config.IMAGE_WIDTH x IMAGE_HEIGHT.
+        :param history: How many measurements to fit to (config.BALLISTIC_HISTORY if None)
+        :param steps: How many frames to look ahead (config.BALLISTIC_STEPS if None)
+        :param frame_time: The time between frames in seconds (1 / config.CAMERA_FPS if None)
+        :return: void
+        """
+        self.__history = config.BALLISTIC_HISTORY if history is None else history
+        self.__steps = config.BALLISTIC_STEPS if steps is None else steps
+        self.__frame_time = (1.0 / config.CAMERA_FPS) if frame_time is None else frame_time
+        self.__center = numpy.array(frame_size, dtype=numpy.float64) / 2.0
+        self.__gravity = numpy.array([0.0, config.GRAVITY, 0.0])
+        self.__table = config.CAMERA_HEIGHT_ABOVE_TABLE - config.BALL_RADIUS
+        self.__step_times = self.__frame_time * numpy.arange(1, self.__steps + 1)
+
+        # The measurements being fitted to, oldest first: times and camera coordinates
+        self.__times = numpy.empty(self.__history)
+        self.__positions = numpy.empty((self.__history, 3))
+        self.__count = 0
+
+        self.__position = None
+        self.__velocity = None
+        self.__trajectory = None
+        self.__intercept = None
+
+    def get_intercept(self):
+        """
+        Gets where and when the ball is predicted to reach config.INTERCEPT_DISTANCE.
+        :return: A tuple (x, y, d, seconds from the last measurement), with x and y in pixels and d in inches, or None
+                 if there is no prediction or the ball is not heading there
+        """
+        return self.__intercept
+
+    def get_trajectory(self):
+        """
+        Gets the predicted positions of the ball over the next few frames.
+        :return: A (steps, 3) array of (x, y, d), one row per frame after the last measurement, or None if there is no
+                 prediction
+        """
+        return self.__trajectory
+
+    def get_velocity(self):
+        """
+        Gets the fitted velocity of the ball at the last measurement.
+        :return: (vX, vY, vZ) in inches per second, relative to the camera, or None
+        """
+        return self.__velocity
+
+    def reset(self):
+        """
+        Forgets the measurements, so that the next fit starts from scratch.
+        :return: void
+        """
+        self.__count = 0
+        self.__position = None
+        self.__velocity = None
+        self.__trajectory = None
+        self.__intercept = None
+
+    def update(self, measured_ball_state, timestamp):
+        """
+        Adds a measurement, refits the trajectory and rolls it forward.
+        :param measured_ball_state: The BallState that was measured
+        :param timestamp: When it was measured, in seconds. One that is not after the last measurement's replaces it.
+        :return: void
+        """
+        position = self.__to_camera(numpy.array([[measured_ball_state.get_x_pos(), measured_ball_state.get_y_pos(),
+                                                  measured_ball_state.get_d_pos()]], dtype=numpy.float64))[0]
+
+        if self.__count and timestamp <= self.__times[self.__count - 1]:
+            # Not after the last measurement (e.g. the same frame time twice), so the fit could not tell the two apart:
+            # this one takes the last one's place, at the last one's time
+            self.__count -= 1
+            timestamp = self.__times[self.__count]
+        elif self.__count and timestamp - self.__times[self.__count - 1] > config.BALLISTIC_MAX_GAP:
+            # Too long ago to say what happened in between
+            self.__count = 0
+        elif self.__has_bounced(position):
+            # The older measurements are on the parabola before the bounce, so start again from the last one
+            self.__times[0] = self.__times[self.__count - 1]
+            self.__positions[0] = self.__positions[self.__count - 1]
+            self.__count = 1
+
+        if self.__count == self.__history:
+            self.__times[:-1] = self.__times[1:]
+            self.__positions[:-1] = self.__positions[1:]
+            self.__count -= 1
+        self.__times[self.__count] = timestamp
+        self.__positions[self.__count] = position
+        self.__count += 1
+
+        if self.__count < 2:
+            self.__position, self.__velocity, self.__trajectory, self.__intercept = None, None, None, None
+            return
+
+        self.__fit()
+        self.__roll_forward()
+
+    def __fit(self):
+        """
+        Fits the position and velocity at the last measurement to the measurements, given gravity.
+        :return: void
+        """
+        times = self.__times[:self.__count] - self.__times[self.__count - 1]
+        positions = self.__positions[:self.__count] - 0.5 * numpy.outer(times * times, self.__gravity)
+
+        # Least squares for p + v * t, one column per axis: the 2x2 normal equations, solved directly
+        n = float(self.__count)
+        sum_t = times.sum()
+        sum_tt = numpy.dot(times, times)
+        sum_p = positions.sum(axis=0)
+        sum_tp = numpy.dot(times, positions)
+        determinant = n * sum_tt - sum_t * sum_t
+        self.__position = (sum_tt * sum_p - sum_t * sum_tp) / determinant
+        self.__velocity = (n * sum_tp - sum_t * sum_p) / determinant
+
+    def __has_bounced(self, position):
+        """
+        Whether the ball has bounced since the last measurement: it was falling (faster than
+        config.BALLISTIC_BOUNCE_MIN_SPEED, so that a wiggle in the measurements does not count) and now it is going up.
+        :param position: The new measurement, in camera coordinates
+        :return: True or False
+        """
+        if self.__count < 2:
+            return False
+        last, before = self.__positions[self.__count - 1], self.__positions[self.__count - 2]
+        fall_time = self.__times[self.__count - 1] - self.__times[self.__count - 2]
+        return last[1] - before[1] > config.BALLISTIC_BOUNCE_MIN_SPEED * fall_time and position[1] < last[1]
+
+    def __roll_forward(self):
+        """
+        Works out the trajectory over the next config.BALLISTIC_STEPS frames and the intercept from the fit.
+        :return: void
+        """
+        # When the ball gets to the robot, if it is heading that way
+        intercept_time = None
+        if self.__velocity[2] < 0 and self.__position[2] > config.INTERCEPT_DISTANCE:
+            intercept_time = (config.INTERCEPT_DISTANCE - self.__position[2]) / self.__velocity[2]
+        horizon = self.__step_times[-1] if intercept_time is None else max(self.__step_times[-1], intercept_time)
+
+        # The pieces of the trajectory: when each one starts and the position, velocity and acceleration it starts with
+        starts = [0.0]
+        start_positions = [self.__position]
+        start_velocities = [self.__velocity]
+        accelerations = [self.__gravity]
+        g = self.__gravity[1]
+        for bounce in range(_MAX_BOUNCES + 1):
+            p, v = start_positions[-1], start_velocities[-1]
+            # Solve p + v * t + g * t^2 / 2 = table for the later t
+            drop = max(self.__table - p[1], 0.0)
+            until_bounce = (-v[1] + numpy.sqrt(v[1] * v[1] + 2 * g * drop)) / g
+            if starts[-1] + until_bounce > horizon:
+                break
+            bounce_position = p + v * until_bounce + 0.5 * self.__gravity * until_bounce * until_bounce
+            bounce_position[1] = self.__table
+            bounce_velocity = v + self.__gravity * until_bounce
+            bounce_velocity[1] *= -config.TABLE_RESTITUTION
+            rolling = bounce == _MAX_BOUNCES
+            if rolling:
+                bounce_velocity[1] = 0.0
+            starts.append(starts[-1] + until_bounce)
+            start_positions.append(bounce_position)
+            start_velocities.append(bounce_velocity)
+            accelerations.append(numpy.zeros(3) if rolling else self.__gravity)
+
+        # Every step (and the intercept) at once
+        times = self.__step_times if intercept_time is None else numpy.append(self.__step_times, intercept_time)
+        pieces = numpy.searchsorted(starts, times, side='right') - 1
+        since = (times - numpy.asarray(starts)[pieces])[:, numpy.newaxis]
+        positions = numpy.asarray(start_positions)[pieces] + numpy.asarray(start_velocities)[pieces] * since + \
+            0.5 * numpy.asarray(accelerations)[pieces] * since * since
+        predicted = self.__to_image(positions)
+
+        self.__trajectory = predicted[:self.__steps]
+        if intercept_time is None:
+            self.__intercept = None
+        else:
+            x, y, d = predicted[-1]
+            self.__intercept = (x, y, d, intercept_time)
+
+    def __to_camera(self, measurements):
+        """
+        Converts (x, y, d) rows from pixels and inches to inches relative to the camera.
+        """
+        camera = numpy.empty_like(measurements)
+        scale = measurements[:, 2:] / config.FOCAL_DISTANCE
+        camera[:, :2] = (measurements[:, :2] - self.__center) * scale
+        camera[:, 2] = measurements[:, 2]
+        return camera
+
+    def __to_image(self, positions):
+        """
+        Converts camera coordinate rows back to (x, y, d) in pixels and inches. A position that is not in front of the
+        camera (d <= 0) is not in the image either, so its x and y are NaN.
+        """
+        image = numpy.empty_like(positions)
+        in_front = positions[:, 2] > 0
+        image[:, :2] = numpy.nan
+        image[in_front, :2] = \
+            positions[in_front, :2] * (config.FOCAL_DISTANCE / positions[in_front, 2:]) + self.__center
+        image[:, 2] = positions[:, 2]
+        return image
+
+
+def format_intercept_for_sending(intercept):
+    """
+    Returns the intercept as a string for sending over the TCP port, in the same format as
+    BallState.format_for_sending(). NaNs if there is no intercept.
+    :param intercept: What BallisticPredictor.get_intercept() returned
+    :return: str for sending
+    """
+    if intercept is None:
+        intercept = (float('nan'),) * 4
+    return "%1.4f%1.4f%1.4f%1.4f" % intercept
@@ -0,0 +1,116 @@
+"""
+A module to hold a Kalman filter predictor.
+"""
+
+from POC.ball_tracking import ball_state
+import numpy
+import POC.config as config
+from POC.kalman import control
+from POC.kalman import fast_kalman
+import predictor
+
+# Time steps closer than this fraction of a frame to the one the model was last built for are taken to be the same.
+# Timestamps read off the clock after each frame comes in jitter by a few milliseconds, which should not throw away the
+# filter's settled gain; a dropped frame is a whole frame more.
+_TIME_STEP_TOLERANCE = 0.25
+
+
+class KalmanPredictor(predictor.Predictor):
+    """
+    The Kalman filter from kalman/control.py, measuring just the position. Its estimate is the filtered state, and its
+    prediction is that state moved on by the model.
+
+    The model is rebuilt in place (control.set_time_step()) for the time that actually passed between measurements.
+    While the measurements are evenly spaced (give or take _TIME_STEP_TOLERANCE of a frame), the model stays the same
+    and the filter's settled gain keeps being used; when the time step changes, as it does when a frame is dropped, the
+    filter goes back to working out the gain.
+    """
+    def __init__(self, q_scale=None, r_scale=None):
+        """
+        Constructor.
+        :param q_scale: What to multiply the model's Q by (config.KALMAN_Q_SCALE if None)
+        :param r_scale: What to multiply the model's R by (config.KALMAN_R_SCALE if None)
+        :return: void
+        """
+        predictor.Predictor.__init__(self)
+        self.__A, Q, self.__H, R = control.get_position_model()
+        self.__Q = Q * (config.KALMAN_Q_SCALE if q_scale is None else q_scale)
+        self.__R = R * (config.KALMAN_R_SCALE if r_scale is None else r_scale)
+        self.__B, self.__control = control.get_control_model()
+        self.__filter = None
+        self.__time_step = control.get_model_time_step()
+        self.__measurement = numpy.empty(self.__H.shape[0])
+        self.__prediction = numpy.empty(self.__A.shape[0])
+        # The prediction as (position, velocity) rows, to move each position on by its velocity in one go
+        self.__prediction_pairs = self.__prediction.reshape(-1, 2)
+
+    def predict(self, timestamp):
+        """
+        Predicts the ball's state at the given time, by running the model on from the filtered state.
+        :param timestamp: The time, in seconds
+        :return: The predicted BallState, or None before the first update()
+        """
+        if self.__filter is None:
+            return None
+        dt = timestamp - self._timestamp
+        self.__prediction[...] = self.__filter.get_current_state()
+        self.__prediction_pairs[:, 0] += dt * self.__prediction_pairs[:, 1]
+        if self.__control:
+            self.__prediction[2] += 0.5 * dt * dt * self.__control
+            self.__prediction[3] += dt * self.__control
+        return self.__to_ball_state(self.__prediction, self._estimate.get_radius())
+
+    def reset(self):
+        """
+        Forgets everything measured so far.
+        :return: void
+        """
+        predictor.Predictor.reset(self)
+        self.__filter = None
+
+    def set_estimate(self, state):
+        """
+        Replaces the filter's current state.
+        :param state: The BallState, with its velocities filled in
+        :return: void
+        """
+        predictor.Predictor.set_estimate(self, state)
+        if self.__filter:
+            self.__filter.get_current_state()[...] = control.package_state_as_vector(
+                state.get_x_pos(), state.get_x_velocity(), state.get_y_pos(), state.get_y_velocity(),
+                state.get_d_pos(), state.get_d_velocity())
+
+    def _estimate_state(self, measured_ball_state, dt):
+        """
+        Runs the filter on a measurement.
+        :param measured_ball_state: The BallState that was measured
+        :param dt: The time since the last update, in seconds
+        :return: The filtered state
+        """
+        self.__measurement[:] = (measured_ball_state.get_x_pos(), measured_ball_state.get_y_pos(),
+                                 measured_ball_state.get_d_pos())
+        if self.__filter is None:
+            # Start at the first measurement, with whatever velocity was measured with it. The identity covariance is
+            # what main.py always used.
+            vx, vy, vd = self._get_measured_velocity(measured_ball_state)
+            state = control.package_state_as_vector(self.__measurement[0], vx, self.__measurement[1], vy,
+                                                    self.__measurement[2], vd)
+            self.__filter = fast_kalman.FastKalmanFilter(self.__A, self.__B, self.__H, state, numpy.eye(len(self.__A)),
+                                                         self.__Q, self.__R,
+                                                         steady_state_tolerance=config.KALMAN_STEADY_STATE_TOLERANCE)
+        else:
+            if abs(dt - self.__time_step) > _TIME_STEP_TOLERANCE * self._frame_time:
+                control.set_time_step(dt, self.__filter.A, self.__filter.B, self.__filter.Q, self.__Q)
+                self.__filter.reset_steady_state()
+                self.__time_step = dt
+            self.__filter.update(self.__control, self.__measurement)
+
+        return self.__to_ball_state(self.__filter.get_current_state(), measured_ball_state.get_radius())
+
+    @staticmethod
+    def __to_ball_state(state, radius):
+        """
+        Turns a state vector into a BallState.
+        """
+        x, vx, y, vy, d, vd = state
+        return ball_state.BallState(x, y, d, vx, vy, vd, radius)
@@ -0,0 +1,120 @@
+"""
+A module to hold the interface that the ball tracker predicts the ball's next state through.
+"""
+
+from POC.ball_tracking import ball_state
+import POC.config as config
+
+
+class Predictor:
+    """
+    Predicts where the ball will be from where it has been measured so far.
+
+    Every measurement comes with the time it was captured, in seconds, and the velocities are in pixels (and inches,
+    for d) per second, so frames do not have to be evenly spaced: a frame where the ball was not found, or one the
+    camera dropped, just makes the next time step longer. If the first measurement comes with a velocity (see
+    config.USE_STREAK_MEASUREMENT), the predictor starts from it instead of from standing still.
+
+    Usage, once per frame where the ball was found:
+        predicted_state = predictor.update(measured_ball_state, timestamp)
+        current_state = predictor.get_estimate()
+    and to see where the ball should be at some other time (e.g. when the next frame was captured):
+        predicted_state = predictor.predict(timestamp)
+
+    On its own, this takes each measurement as it is, with whatever velocity was measured along with it. Each kind of
+    predictor overrides _estimate_state() with how it turns a measurement into its estimate.
+    """
+    def __init__(self):
+        """
+        Constructor.
+        :return: void
+        """
+        self._estimate = None
+        self._timestamp = None
+        self._frame_time = 1.0 / config.CAMERA_FPS
+
+    def get_estimate(self):
+        """
+        Gets the predictor's best guess at the ball's current state, with its velocities filled in. Depending on the
+        predictor, this is either the last measured state itself or a filtered copy of it.
+        :return: A BallState, or None before the first update()
+        """
+        return self._estimate
+
+    def get_time_step(self, timestamp):
+        """
+        Gets the time from the last update to the given time.
+        :param timestamp: The time, in seconds
+        :return: The time step in seconds. One frame (1 / config.CAMERA_FPS) if there has not been an update yet, or if
+                 the time is not after the last update's (e.g. two frames with the same timestamp).
+        """
+        if self._timestamp is None or timestamp <= self._timestamp:
+            return self._frame_time
+        return timestamp - self._timestamp
+
+    def predict(self, timestamp):
+        """
+        Predicts the ball's state at the given time, by moving the estimate on at its velocity.
+        :param timestamp: The time, in seconds
+        :return: The predicted BallState, or None before the first update()
+        """
+        estimate = self._estimate
+        if estimate is None:
+            return None
+        dt = timestamp - self._timestamp
+        return ball_state.BallState(estimate.get_x_pos() + estimate.get_x_velocity() * dt,
+                                    estimate.get_y_pos() + estimate.get_y_velocity() * dt,
+                                    estimate.get_d_pos() + estimate.get_d_velocity() * dt,
+                                    estimate.get_x_velocity(), estimate.get_y_velocity(), estimate.get_d_velocity(),
+                                    estimate.get_radius())
+
+    @staticmethod
+    def _get_measured_velocity(measured_ball_state):
+        """
+        Gets the velocity that was measured along with the position, if there was one.
+        :param measured_ball_state: The BallState that was measured
+        :return: A tuple: (vx, vy, vd), per second, with zeros for the ones that were not measured
+        """
+        velocity = (measured_ball_state.get_x_velocity(), measured_ball_state.get_y_velocity(),
+                    measured_ball_state.get_d_velocity())
+        return tuple(0.0 if v is None else v for v in velocity)
+
+    def reset(self):
+        """
+        Forgets everything measured so far.
+        :return: void
+        """
+        self._estimate = None
+        self._timestamp = None
+
+    def set_estimate(self, state):
+        """
+        Replaces the best guess at the ball's current state (at the time of the last update), e.g. with one corrected
+        by something else.
+        :param state: The BallState, with its velocities filled in
+        :return: void
+        """
+        self._estimate = state
+
+    def update(self, measured_ball_state, timestamp):
+        """
+        Takes a measurement and predicts the state one frame (1 / config.CAMERA_FPS) later.
+        :param measured_ball_state: The BallState that was measured
+        :param timestamp: When it was captured, in seconds
+        :return: The predicted BallState
+        """
+        self._estimate = self._estimate_state(measured_ball_state, self.get_time_step(timestamp))
+        self._timestamp = timestamp
+        return self.predict(timestamp + self._frame_time)
+
+    def _estimate_state(self, measured_ball_state, dt):
+        """
+        Works out the new estimate from a measurement. Called by update() before the estimate and its time are moved on
+        to the measurement's, so self._estimate is still the last one.
+        :param measured_ball_state: The BallState that was measured
+        :param dt: The time since the last update, in seconds (see get_time_step())
+        :return: The new estimate: a BallState with its velocities filled in
+        """
+        vx, vy, vd = self._get_measured_velocity(measured_ball_state)
+        return ball_state.BallState(measured_ball_state.get_x_pos(), measured_ball_state.get_y_pos(),
+                                    measured_ball_state.get_d_pos(), vx, vy, vd, measured_ball_state.get_radius())
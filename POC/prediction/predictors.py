@@ -0,0 +1,27 @@
+"""
+A module for making the predictor that config.PREDICTOR names.
+"""
+
+import alpha_beta
+import averaging
+import kalman_predictor
+import POC.config as config
+
+# The predictors that config.PREDICTOR can name
+PREDICTORS = {
+    "averaging": averaging.AveragingPredictor,
+    "alpha_beta": alpha_beta.AlphaBetaPredictor,
+    "kalman": kalman_predictor.KalmanPredictor,
+}
+
+
+def make_predictor(name=None):
+    """
+    Makes a predictor, set up from config.
+    :param name: One of the keys of PREDICTORS (config.PREDICTOR if None)
+    :return: The new Predictor
+    """
+    name = config.PREDICTOR if name is None else name
+    if name not in PREDICTORS:
+        raise ValueError("Unknown predictor '" + str(name) + "'. Choose from: " + ", ".join(sorted(PREDICTORS)))
+    return PREDICTORS[name]()
@@ -0,0 +1,140 @@
+"""
+A module to hold a class that keeps the last few values of a track, with their rolling average.
+"""
+
+import numpy
+
+
+class TrackHistory:
+    """
+    A fixed-size ring buffer of the last few rows of values (e.g. the ball's velocities), with their running sum and
+    sum of squares, so that the rolling mean and variance cost the same however long the window is.
+
+    Adding a row overwrites the oldest one once the buffer is full, and takes the old row out of the sums as the new one
+    goes in. Every time the ring wraps around, the sums are worked out again from scratch, so that rounding errors
+    cannot build up.
+    """
+    def __init__(self, depth, width):
+        """
+        Constructor.
+        :param depth: How many rows to keep
+        :param width: How many values are in each row
+        :return: void
+        """
+        if depth < 1:
+            raise ValueError("depth must be at least 1, got " + str(depth))
+
+        self.__values = numpy.zeros((depth, width))
+        self.__sum = numpy.zeros(width)
+        self.__sum_of_squares = numpy.zeros(width)
+        self.__next = 0
+        self.__count = 0
+
+    def append(self, row):
+        """
+        Adds a row, pushing out the oldest one if the buffer is full.
+        :param row: The width values
+        :return: void
+        """
+        slot = self.__values[self.__next]
+        if self.__count == len(self.__values):
+            self.__sum -= slot
+            self.__sum_of_squares -= slot * slot
+        else:
+            self.__count += 1
+
+        slot[:] = row
+        self.__next += 1
+        if self.__next == len(self.__values):
+            self.__next = 0
+            self.__recalculate()
+        else:
+            self.__sum += slot
+            self.__sum_of_squares += slot * slot
+
+    def clear(self):
+        """
+        Empties the buffer.
+        :return: void
+        """
+        self.__sum[:] = 0
+        self.__sum_of_squares[:] = 0
+        self.__next = 0
+        self.__count = 0
+
+    def get_count(self):
+        """
+        Gets how many rows are in the buffer.
+        :return: The number of rows, up to the depth
+        """
+        return self.__count
+
+    def get_depth(self):
+        """
+        Gets how many rows the buffer can hold.
+        :return: The depth
+        """
+        return len(self.__values)
+
+    def get_latest(self):
+        """
+        Gets the row that was added last.
+        :return: A view of the row (do not modify it), or None if the buffer is empty
+        """
+        if not self.__count:
+            return None
+        return self.__values[self.__next - 1]
+
+    def get_mean(self):
+        """
+        Gets the average of the rows in the buffer.
+        :return: The width averages (zeros if the buffer is empty)
+        """
+        if not self.__count:
+            return numpy.zeros_like(self.__sum)
+        return self.__sum / self.__count
+
+    def get_rows(self):
+        """
+        Gets the rows in the buffer, oldest first.
+        :return: A (count, width) array (a copy)
+        """
+        if self.__count < len(self.__values):
+            return self.__values[:self.__count].copy()
+        return numpy.roll(self.__values, -self.__next, axis=0)
+
+    def get_variance(self):
+        """
+        Gets the variance of the rows in the buffer.
+        :return: The width variances (zeros if the buffer is empty)
+        """
+        if not self.__count:
+            return numpy.zeros_like(self.__sum)
+        mean = self.__sum / self.__count
+        return numpy.maximum(self.__sum_of_squares / self.__count - mean * mean, 0.0)
+
+    def replace_latest(self, row):
+        """
+        Overwrites the row that was added last, e.g. with a corrected one.
+        :param row: The width values
+        :return: void
+        """
+        if not self.__count:
+            self.append(row)
+            return
+
+        slot = self.__values[self.__next - 1]
+        self.__sum -= slot
+        self.__sum_of_squares -= slot * slot
+        slot[:] = row
+        self.__sum += slot
+        self.__sum_of_squares += slot * slot
+
+    def __recalculate(self):
+        """
+        Works out the sums from the rows in the buffer.
+        :return: void
+        """
+        rows = self.__values[:self.__count]
+        numpy.sum(rows, axis=0, out=self.__sum)
+        numpy.einsum('ij,ij->j', rows, rows, out=self.__sum_of_squares)
@@ -0,0 +1,172 @@
+"""
+This module replays recorded measurements through the predictors in this package for many settings at once, to see
+which settings predict the next frame best.
+
+The settings that can be tuned for each predictor are in PARAMETERS:
+    - "averaging": the blend (config.VELOCITY_BLEND)
+    - "alpha_beta": the gains (config.ALPHA_BETA_ALPHA and ALPHA_BETA_BETA)
+    - "kalman": the scales of control.py's Q and R (config.KALMAN_Q_SCALE and KALMAN_R_SCALE)
+
+Each predictor is replayed by a batched copy of it that keeps the settings on the first axis of every array, so each
+frame is a handful of vectorized calls no matter how many settings there are. The batched copies give the same
+predictions as the predictor classes (scripts_and_stuff/tune_predictor.py --check compares them). The logs have a row
+for every frame, and each is replayed at its timestamp, so the time steps are as uneven as the frames were.
+"""
+
+import numpy
+import POC.config as config
+from POC.kalman import control
+
+# The settings of each predictor that can be tuned, in the order replay() takes them
+PARAMETERS = {
+    "averaging": ("blend",),
+    "alpha_beta": ("alpha", "beta"),
+    "kalman": ("q_scale", "r_scale"),
+}
+
+
+def replay(measurements, timestamps, name, parameters):
+    """
+    Replays a log through one predictor for many settings and adds up how far off each one's prediction of the next
+    frame was.
+    :param measurements: A (T, 3) array of measured x, y, d, one row per frame, with NaN rows for frames where the ball
+                         was not found (see data_recorder/log_reader.py)
+    :param timestamps: The (T,) times at which the frames were captured, in seconds
+    :param name: Which predictor (a key of PARAMETERS)
+    :param parameters: A (P, C) array: one row for each of the predictor's PARAMETERS, one column for each setting
+    :return: A tuple: (length C array of the summed x/y distances between the predicted and the measured positions,
+             length C array of the summed absolute differences in d, the number of predictions that were checked).
+             Only predictions of a frame where the ball was found are checked.
+    """
+    measurements = numpy.asarray(measurements, dtype=numpy.float64)
+    parameters = numpy.asarray(parameters, dtype=numpy.float64)
+    predictor = _BATCHED[name](*parameters)
+    count = parameters.shape[1]
+
+    found = numpy.flatnonzero(~numpy.isnan(measurements).any(axis=1))
+    xy_errors = numpy.zeros(count)
+    d_errors = numpy.zeros(count)
+    checked = 0
+    frame_time = 1.0 / config.CAMERA_FPS
+
+    for i, frame in enumerate(found):
+        dt = timestamps[frame] - timestamps[found[i - 1]] if i else frame_time
+        predicted = predictor.update(measurements[frame], dt)
+        if i + 1 < len(found) and found[i + 1] == frame + 1:
+            error = predicted - measurements[frame + 1]
+            xy_errors += numpy.sqrt(error[:, 0] ** 2 + error[:, 1] ** 2)
+            d_errors += numpy.abs(error[:, 2])
+            checked += 1
+
+    return xy_errors, d_errors, checked
+
+
+class _BatchedAveraging:
+    """
+    averaging.py's AveragingPredictor, with a different blend for each setting. Like TrackHistory, the last
+    config.HISTORY_DEPTH velocities are a ring buffer with a running sum.
+    """
+    def __init__(self, blends):
+        self.blends = blends[:, numpy.newaxis]
+        self.last_position = None
+        self.history = numpy.zeros((config.HISTORY_DEPTH, len(blends), 3))
+        self.history_sum = numpy.zeros((len(blends), 3))
+        self.history_length = 0
+        self.next = 0
+        self.frame_time = 1.0 / config.CAMERA_FPS
+
+    def update(self, position, dt):
+        """
+        Takes a measured (x, y, d) and the time since the last one, and returns the (C, 3) predicted positions one
+        frame later.
+        """
+        if self.last_position is None:
+            velocity = numpy.zeros(self.history.shape[1:])
+        else:
+            average = self.history_sum / self.history_length
+            velocity = self.blends * ((position - self.last_position) / dt) + (1 - self.blends) * average
+
+        self.last_position = position
+        self.history_sum += velocity - self.history[self.next]
+        self.history[self.next] = velocity
+        self.next = (self.next + 1) % len(self.history)
+        self.history_length = min(self.history_length + 1, len(self.history))
+        if not self.next:
+            self.history_sum = self.history.sum(axis=0)
+        return position + velocity * self.frame_time
+
+
+class _BatchedAlphaBeta:
+    """
+    alpha_beta.py's AlphaBetaPredictor, with different gains for each setting.
+    """
+    def __init__(self, alphas, betas):
+        self.alphas = alphas[:, numpy.newaxis]
+        self.betas = betas[:, numpy.newaxis]
+        self.position = None
+        self.velocity = numpy.zeros((len(alphas), 3))
+        self.frame_time = 1.0 / config.CAMERA_FPS
+
+    def update(self, position, dt):
+        """
+        Takes a measured (x, y, d) and the time since the last one, and returns the (C, 3) predicted positions one
+        frame later.
+        """
+        if self.position is None:
+            self.position = numpy.tile(position, (len(self.alphas), 1))
+        else:
+            guess = self.position + self.velocity * dt
+            miss = position - guess
+            self.position = guess + self.alphas * miss
+            self.velocity = self.velocity + (self.betas / dt) * miss
+        return self.position + self.velocity * self.frame_time
+
+
+class _BatchedKalman:
+    """
+    kalman_predictor.py's KalmanPredictor, with a different Q and R for each setting. Its A (for one frame) is what
+    the predictions use; A_step and Q_step are rebuilt for each time step.
+    """
+    def __init__(self, q_scales, r_scales):
+        A, Q, H, R = control.get_position_model()
+        self.A = A
+        self.A_step = A.copy()
+        self.H = H
+        self.Q = q_scales[:, numpy.newaxis, numpy.newaxis] * Q
+        self.Q_step = self.Q.copy()
+        self.R = r_scales[:, numpy.newaxis, numpy.newaxis] * R
+        self.states = None
+        self.covariances = numpy.tile(numpy.eye(len(A)), (len(q_scales), 1, 1))
+
+    def update(self, position, dt):
+        """
+        Takes a measured (x, y, d) and the time since the last one, and returns the (C, 3) predicted positions one
+        frame later.
+        """
+        if self.states is None:
+            # Start at the first measurement, standing still
+            self.states = numpy.tile(self.H.T.dot(position), (len(self.Q), 1))
+        else:
+            A = self.A_step
+            control.set_time_step(dt, A, Q=self.Q_step, base_Q=self.Q)
+            states = numpy.dot(self.states, A.T)
+            covariances = numpy.matmul(numpy.matmul(A, self.covariances), A.T) + self.Q_step
+
+            # K = P * H^T * S^-1, so S * K^T = H * P, as P is symmetric
+            HP = numpy.matmul(self.H, covariances)
+            innovation_covariances = numpy.matmul(HP, self.H.T) + self.R
+            gains = numpy.linalg.solve(innovation_covariances, HP).transpose(0, 2, 1)
+            innovations = position - numpy.dot(states, self.H.T)
+            states += numpy.matmul(gains, innovations[:, :, numpy.newaxis])[:, :, 0]
+            covariances -= numpy.matmul(gains, HP)
+            self.covariances = 0.5 * (covariances + covariances.transpose(0, 2, 1))
+            self.states = states
+
+        return numpy.dot(numpy.dot(self.states, self.A.T), self.H.T)
+
+
+_BATCHED = {
+    "averaging": _BatchedAveraging,
+    "alpha_beta": _BatchedAlphaBeta,
+    "kalman": _BatchedKalman,
+}
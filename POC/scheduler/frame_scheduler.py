@@ -0,0 +1,178 @@
+"""
+A module to hold a class that keeps the main loop within a per-frame time budget.
+"""
+
+import time
+
+# The longest that the scheduler will wait before trying a better quality level again
+_MAX_FRAMES_BEFORE_UP = 1000
+
+
+class FrameScheduler:
+    """
+    Measures how long each frame takes to process and trades quality for speed to stay within a time budget.
+
+    There is a list of quality levels, from best (level 0) to cheapest. If the smoothed frame time goes over the budget,
+    the scheduler moves one level down; if it stays well under the budget, it moves one level back up. After every
+    change it waits a few frames for the frame time to settle before changing again. If moving up a level turns out to
+    be too slow straight away, it waits twice as long as last time before trying that again, so that it does not keep
+    bouncing between two levels.
+
+    If the frame time is still over the budget at the cheapest level, it starts skipping frames on purpose: it keeps
+    track of how far behind the processed frames have put it, and skips a frame whenever that adds up to a whole
+    budget's worth.
+
+    Usage, once per frame:
+        if scheduler.should_skip(): (don't process this frame)
+        scheduler.start_frame()
+        ... scheduler.end_stage("track") after each stage ...
+        scheduler.end_frame()
+    """
+    def __init__(self, budget_ms, quality_levels, smoothing=0.2, headroom=0.7, settle_frames=10):
+        """
+        Constructor.
+        :param budget_ms: The time that processing one frame should take at most, in milliseconds
+        :param quality_levels: The quality levels, best first. Each one is whatever the caller wants to use to set up
+                               the frame's processing with; the scheduler only picks which one to use.
+        :param smoothing: How much weight the newest frame time gets in the smoothed frame time (0 to 1)
+        :param headroom: The fraction of the budget that the smoothed frame time has to be under before the quality
+                         goes back up
+        :param settle_frames: How many frames to wait after changing the quality before changing it again
+        :return: void
+        """
+        if not quality_levels:
+            raise ValueError("There has to be at least one quality level")
+
+        self.__budget = budget_ms / 1000.0
+        self.__quality_levels = quality_levels
+        self.__smoothing = smoothing
+        self.__headroom = headroom
+        self.__settle_frames = settle_frames
+
+        self.__level = 0
+        self.__frames_since_change = 0
+        self.__last_change_was_up = False
+        self.__frames_before_up = settle_frames
+        self.__frame_time = None
+        self.__stage_times = {}
+        self.__lateness = 0.0
+        self.__skipped_frames = 0
+        self.__frame_start = None
+        self.__stage_start = None
+
+    def end_frame(self):
+        """
+        Marks the end of processing the current frame, and changes the quality level if the frame time calls for it.
+        :return: True if the quality level changed, False if not
+        """
+        frame_time = time.time() - self.__frame_start
+        self.__frame_time = self.__smooth(self.__frame_time, frame_time)
+        self.__lateness = max(0.0, self.__lateness + frame_time - self.__budget)
+        self.__frames_since_change += 1
+
+        if self.__frames_since_change < self.__settle_frames:
+            return False
+        elif self.__frame_time > self.__budget and self.__level < len(self.__quality_levels) - 1:
+            if self.__last_change_was_up:
+                # The better level was too slow after all; give it longer before trying it again
+                self.__frames_before_up = min(2 * self.__frames_before_up, _MAX_FRAMES_BEFORE_UP)
+            else:
+                self.__frames_before_up = self.__settle_frames
+            self.__change_level(self.__level + 1, False)
+            return True
+        elif self.__frame_time < self.__headroom * self.__budget and self.__level > 0 and \
+                self.__frames_since_change >= self.__frames_before_up:
+            self.__change_level(self.__level - 1, True)
+            return True
+        else:
+            return False
+
+    def end_stage(self, name):
+        """
+        Marks the end of one stage of processing the current frame. The stage started when the last one ended, or when
+        the frame started.
+        :param name: The name of the stage
+        :return: void
+        """
+        now = time.time()
+        self.__stage_times[name] = self.__smooth(self.__stage_times.get(name), now - self.__stage_start)
+        self.__stage_start = now
+
+    def get_frame_time(self):
+        """
+        Gets the smoothed time it takes to process a frame.
+        :return: The time in milliseconds, or None before the first frame has been processed
+        """
+        return None if self.__frame_time is None else self.__frame_time * 1000.0
+
+    def get_quality(self):
+        """
+        Gets the quality level to process the next frame at.
+        :return: The entry from quality_levels for the current level
+        """
+        return self.__quality_levels[self.__level]
+
+    def get_quality_level(self):
+        """
+        Gets the current quality level.
+        :return: 0 for the best quality, up to len(quality_levels) - 1 for the cheapest
+        """
+        return self.__level
+
+    def get_skipped_frames(self):
+        """
+        Gets the number of frames that were skipped to catch up.
+        :return: The number of frames skipped so far
+        """
+        return self.__skipped_frames
+
+    def get_stage_times(self):
+        """
+        Gets the smoothed time that each stage takes.
+        :return: A dict from stage name to time in milliseconds
+        """
+        return dict((name, stage_time * 1000.0) for name, stage_time in self.__stage_times.items())
+
+    def should_skip(self):
+        """
+        Works out whether the next frame should be skipped to catch up. Frames are only skipped at the cheapest quality
+        level. If this returns True, the frame is counted as skipped.
+        :return: True if the next frame should not be processed
+        """
+        if self.__level < len(self.__quality_levels) - 1 or self.__lateness < self.__budget:
+            return False
+
+        self.__lateness -= self.__budget
+        self.__skipped_frames += 1
+        return True
+
+    def start_frame(self):
+        """
+        Marks the start of processing a frame.
+        :return: void
+        """
+        self.__frame_start = time.time()
+        self.__stage_start = self.__frame_start
+
+    def __change_level(self, level, up):
+        """
+        Moves to the given quality level and starts waiting for the frame time to settle.
+        :param level: The new level
+        :param up: True if the new level is better than the old one
+        :return: void
+        """
+        self.__level = level
+        self.__last_change_was_up = up
+        self.__frames_since_change = 0
+        self.__lateness = 0.0
+
+    def __smooth(self, average, value):
+        """
+        Folds a new value into an exponentially weighted moving average.
+        :param average: The average so far, or None if there isn't one yet
+        :param value: The new value
+        :return: The new average
+        """
+        if average is None:
+            return value
+        return average + self.__smoothing * (value - average)
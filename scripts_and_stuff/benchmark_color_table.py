@@ -0,0 +1,63 @@
+"""
+Benchmarks the color lookup table (POC/ball_tracking/color_table.py) against cvtColor + inRange.
+
+USAGE: python -m scripts_and_stuff.benchmark_color_table [--video path/to/video.mp4] [--bits 8] [--runs 200]
+
+Without a video, a random 900x900 image is used, which is the worst case for how many pixels land in the range.
+"""
+
+import argparse
+import cv2
+import numpy
+import time
+from POC.ball_tracking import color_table
+import POC.config as config
+
+
+def time_it(func, runs):
+    """
+    Runs func runs times and returns the average time per run in milliseconds.
+    """
+    func()
+    start = time.time()
+    for _ in range(runs):
+        func()
+    return (time.time() - start) * 1000.0 / runs
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-v", "--video", help="path to a video to take a frame from")
+    ap.add_argument("-b", "--bits", type=int, default=config.COLOR_TABLE_BITS, help="bits per channel in the table")
+    ap.add_argument("-r", "--runs", type=int, default=200, help="number of runs to average over")
+    args = ap.parse_args()
+
+    if args.video:
+        camera = cv2.VideoCapture(args.video)
+        grabbed, frame = camera.read()
+        camera.release()
+        if not grabbed:
+            print "Could not read a frame from " + args.video
+            exit(-1)
+    else:
+        frame = numpy.random.randint(0, 256, (900, 900, 3)).astype(numpy.uint8)
+    frame = cv2.resize(frame, (900, 900))
+
+    lower, upper = config.hsv_lower_range, config.hsv_upper_range
+
+    start = time.time()
+    table = color_table.ColorTable(lower, upper, bits=args.bits)
+    print "Built a %d bit table in %.1f ms" % (args.bits, (time.time() - start) * 1000.0)
+
+    two_step = lambda: cv2.inRange(cv2.cvtColor(frame, cv2.COLOR_BGR2HSV), lower, upper)
+    dst = numpy.empty(frame.shape[:2], dtype=numpy.uint8)
+    lookup = lambda: table.apply(frame, dst=dst)
+
+    mismatches = numpy.count_nonzero(two_step() != lookup())
+    print "Pixels that differ from cvtColor + inRange: %d of %d" % (mismatches, dst.size)
+    print "cvtColor + inRange: %.3f ms" % time_it(two_step, args.runs)
+    print "Lookup table:       %.3f ms" % time_it(lookup, args.runs)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmarks the ndarray Kalman filter (POC/kalman/fast_kalman.py) against the original numpy.matrix one
+(POC/kalman/mykalman.py), using the matrices from POC/kalman/control.py, and checks that they agree. Then does the same
+for the batched filter (POC/kalman/batch_kalman.py) against one ndarray filter per track.
+
+USAGE: python -m scripts_and_stuff.benchmark_kalman [--updates 2000] [--fps 30] [--tracks 16]
+
+The measurements are a ball moving in a straight line with some noise on it. The original filter prints x and P on
+every update; that output is thrown away, but the time it takes is counted, since it is part of what the filter costs.
+"""
+
+import argparse
+import numpy
+import os
+import sys
+import time
+from POC.kalman import batch_kalman, control, fast_kalman, mykalman
+
+
+def make_measurements(count, seed=0):
+    """
+    Makes count noisy (x, vx, y, vy, d, vd) measurements of a ball moving in a straight line.
+    """
+    rng = numpy.random.RandomState(seed)
+    t = numpy.arange(count) * control._DEL_T
+    truth = numpy.column_stack([300 + 200 * t, 200 * numpy.ones(count), 400 - 100 * t, -100 * numpy.ones(count),
+                                60 - 10 * t, -10 * numpy.ones(count)])
+    return truth + rng.normal(scale=[2, 20, 2, 20, 0.5, 5], size=truth.shape)
+
+
+def run_filter(kalman_filter, measurements, as_matrix):
+    """
+    Feeds all of the measurements to the filter and returns the filtered states and the average time per update in
+    microseconds.
+    """
+    if as_matrix:
+        measurements = [numpy.matrix(m).T for m in measurements]
+
+    states = []
+    real_stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        start = time.time()
+        for measurement in measurements:
+            kalman_filter.update(control._CONTROL, measurement)
+            states.append(numpy.array(kalman_filter.get_current_state()).ravel())
+        elapsed = time.time() - start
+    finally:
+        sys.stdout.close()
+        sys.stdout = real_stdout
+
+    return numpy.array(states), elapsed * 1e6 / len(measurements)
+
+
+def make_filter(cls, initial_state, **kwargs):
+    """
+    Makes a filter with the matrices from control.py.
+    """
+    return cls(control._KALMAN_A, control._KALMAN_B, control._KALMAN_H, initial_state, numpy.matrix(numpy.eye(6)),
+               control._KALMAN_Q, control._KALMAN_R, **kwargs)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-u", "--updates", type=int, default=2000, help="number of updates to time")
+    ap.add_argument("-f", "--fps", type=float, default=30.0, help="the camera rate to compare against")
+    ap.add_argument("-t", "--tracks", type=int, default=16, help="number of tracks for the batched filter")
+    args = ap.parse_args()
+
+    measurements = make_measurements(args.updates)
+    initial_state = numpy.matrix(measurements[0]).T
+
+    original, original_time = run_filter(make_filter(mykalman.MyKalmanFilter, initial_state), measurements, True)
+    fast, fast_time = run_filter(make_filter(fast_kalman.FastKalmanFilter, initial_state), measurements, False)
+    steady_filter = make_filter(fast_kalman.FastKalmanFilter, initial_state, steady_state_tolerance=1e-9)
+    steady, steady_time = run_filter(steady_filter, measurements, False)
+
+    frame_us = 1e6 / args.fps
+    print "%d updates, %.0f us per frame at %.0f fps" % (args.updates, frame_us, args.fps)
+    print "numpy.matrix filter (with its prints): %8.1f us per update (%.2f%% of a frame)" % \
+          (original_time, 100.0 * original_time / frame_us)
+    print "ndarray filter:                        %8.1f us per update (%.2f%% of a frame)" % \
+          (fast_time, 100.0 * fast_time / frame_us)
+    print "ndarray filter, steady state gain:     %8.1f us per update (%.2f%% of a frame)" % \
+          (steady_time, 100.0 * steady_time / frame_us)
+    print "Largest difference from the numpy.matrix filter: %.3g (ndarray), %.3g (steady state)" % \
+          (numpy.abs(fast - original).max(), numpy.abs(steady - original).max())
+    print "Steady state reached: " + str(steady_filter.is_steady_state())
+
+    # Many tracks: one batched filter against one filter per track
+    track_measurements = numpy.array([make_measurements(args.updates, seed) for seed in range(args.tracks)])
+    separate_filters = [make_filter(fast_kalman.FastKalmanFilter, numpy.matrix(m[0]).T) for m in track_measurements]
+    batch = batch_kalman.BatchKalmanFilter(control._KALMAN_A, control._KALMAN_B, control._KALMAN_H, control._KALMAN_Q,
+                                           control._KALMAN_R, capacity=args.tracks)
+    for m in track_measurements:
+        batch.add_track(m[0], numpy.eye(6))
+
+    separate = numpy.empty(track_measurements.shape)
+    start = time.time()
+    for i in range(args.updates):
+        for track, kalman_filter in enumerate(separate_filters):
+            kalman_filter.update(control._CONTROL, track_measurements[track, i])
+            separate[track, i] = kalman_filter.get_current_state()
+    separate_time = (time.time() - start) * 1e6 / args.updates
+
+    batched = numpy.empty(track_measurements.shape)
+    start = time.time()
+    for i in range(args.updates):
+        batch.predict(control._CONTROL)
+        batch.update(track_measurements[:, i])
+        batched[:, i] = batch.get_states()
+    batched_time = (time.time() - start) * 1e6 / args.updates
+
+    print "%d tracks, one ndarray filter each:   %8.1f us per frame" % (args.tracks, separate_time)
+    print "%d tracks, one batched filter:        %8.1f us per frame" % (args.tracks, batched_time)
+    print "Largest difference between them: %.3g" % numpy.abs(batched - separate).max()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Runs every predictor in POC/prediction/predictors.py over the same recorded measurements and reports what each update
+costs next to how well it predicts the next frame, so the cheapest one that is accurate enough can go in
+config.PREDICTOR.
+
+USAGE: python -m scripts_and_stuff.benchmark_predictors --log datalog.csv [more.csv ...] [--repeat 5] [--fps 30]
+
+The logs are datalogs from POC/data_recorder/data_recorder.py or recordings from columnar_recorder.py, recorded with
+the averaging predictor, so that they hold the measurements, one row per frame. A recording's rows are replayed at their
+timestamps; a datalog has none, so its rows are timed at --fps. The error is the distance between each prediction and
+the next frame's measurement, for the frames where the ball was found in both.
+"""
+
+import argparse
+import numpy
+import time
+from POC.ball_tracking import ball_state
+from POC.data_recorder import log_reader
+from POC.prediction import predictors
+import POC.config as config
+
+
+def run_predictor(name, measurements, timestamps):
+    """
+    Feeds one log, at its timestamps, to a new predictor. Returns the predictions (NaN rows where there was no
+    measurement) and the time spent in update(), in seconds.
+    """
+    predictor = predictors.make_predictor(name)
+    states = [None if numpy.isnan(row).any() else ball_state.BallState(*row) for row in measurements]
+    predictions = numpy.empty(measurements.shape)
+    predictions.fill(numpy.nan)
+
+    elapsed = 0.0
+    for i, state in enumerate(states):
+        if state is None:
+            continue
+        start = time.time()
+        predicted = predictor.update(state, timestamps[i])
+        elapsed += time.time() - start
+        predictions[i] = (predicted.get_x_pos(), predicted.get_y_pos(), predicted.get_d_pos())
+
+    return predictions, elapsed
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-l", "--log", nargs="+", required=True, help="the datalogs to replay")
+    ap.add_argument("-r", "--repeat", type=int, default=5, help="how many times to time each predictor (best is kept)")
+    ap.add_argument("-f", "--fps", type=float, default=config.CAMERA_FPS,
+                    help="the camera rate the logs were recorded at (a recording's own timestamps are used)")
+    args = ap.parse_args()
+
+    logs = []
+    for path in args.log:
+        measurements, _, timestamps = log_reader.read_log(path, args.fps)
+        logs.append((measurements, timestamps))
+    updates = sum(int((~numpy.isnan(log).any(axis=1)).sum()) for log, _ in logs)
+    frame_us = 1e6 / args.fps
+    print str(len(logs)) + " logs, " + str(updates) + " measurements; " + ("%.0f" % frame_us) + " us per frame at " + \
+        ("%.0f" % args.fps) + " fps"
+    print "%-12s %14s %12s %14s %12s %10s" % ("predictor", "us per update", "% of frame", "mean x/y error",
+                                              "x/y RMS", "d error")
+
+    for name in sorted(predictors.PREDICTORS):
+        best = None
+        xy_errors = []
+        d_errors = []
+        for _ in range(args.repeat):
+            total = 0.0
+            xy_errors, d_errors = [], []
+            for log, timestamps in logs:
+                predictions, elapsed = run_predictor(name, log, timestamps)
+                total += elapsed
+                error = predictions[:-1] - log[1:]
+                checked = ~numpy.isnan(error).any(axis=1)
+                xy_errors.append(numpy.hypot(error[checked, 0], error[checked, 1]))
+                d_errors.append(numpy.abs(error[checked, 2]))
+            best = total if best is None else min(best, total)
+
+        xy_errors = numpy.concatenate(xy_errors)
+        d_errors = numpy.concatenate(d_errors)
+        us = 1e6 * best / max(updates, 1)
+        print "%-12s %14.1f %12.3f %14.3f %12.3f %10.3f" % (name, us, 100.0 * us / frame_us, xy_errors.mean(),
+                                                            numpy.sqrt((xy_errors ** 2).mean()), d_errors.mean())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+"""
+Compares the round trip latency of the two ways to get ball states to a robot controller on the same machine: the TCP
+socket (StateSender over a connection, as StatePublisher uses) and shared memory (SharedStateWriter and
+SharedStateReader). A second process plays the robot: it waits for each state and sends it straight back the same way,
+and the tracker's side times how long that takes. Both sides encode and decode, as they would for real.
+
+Then checks the seqlock: one process writes states as fast as it can while another reads them as fast as it can,
+and every state that is read is checked for fields from two different writes.
+
+USAGE: python -m scripts_and_stuff.benchmark_shared_state [--count 20000] [--poll-interval 0]
+
+The shared memory reader spins by default, which keeps a core busy; --poll-interval makes it sleep between looks
+instead, to see what that costs in latency. With only one CPU, the two processes would spin in turn for a whole time
+slice each, so the reader sleeps for 10 us there unless told otherwise. A sleeping reader adds at least its sleep to
+every round trip, so there the TCP socket, whose reader the kernel wakes as soon as a state comes in, comes out ahead
+(about 50 us against 90 us); shared memory is only worth it with a spinning reader on a core of its own.
+"""
+
+import argparse
+import multiprocessing
+import numpy
+import os
+import socket
+import tempfile
+import timeit
+from POC.ball_tracking import ball_state
+from POC.networking import message_decoder, shared_state_reader, shared_state_writer, state_sender
+import POC.config as config
+
+# Skipped at the start of each run, while everything warms up
+_WARMUP = 200
+
+
+def get_shared_path(name):
+    """
+    Gets a path for a file to share, in RAM if there is a filesystem for that.
+    """
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, "benchmark_" + name + "_" + str(os.getpid()))
+
+
+def make_state(value):
+    """
+    Makes a state and its prediction with every value set from one number.
+    """
+    state = ball_state.BallState(value, value, value, value, value, value)
+    return state, ball_state.BallState(value, value, value)
+
+
+def echo_from_message(message, send):
+    """
+    Plays the robot's part: turns a decoded message back into states and sends them.
+    """
+    send(message[1], ball_state.BallState(*message[3:9]), ball_state.BallState(*message[9:12]), message[12])
+
+
+def shared_echo(request_path, reply_path, count, poll_interval, ready):
+    """
+    Waits for each state in request_path and writes it back to reply_path.
+    """
+    reader = shared_state_reader.SharedStateReader(request_path)
+    writer = shared_state_writer.SharedStateWriter(reply_path)
+    ready.set()
+    version = None
+    for _ in range(count):
+        version, message = reader.wait(version, poll_interval=poll_interval)
+        echo_from_message(message, writer.publish)
+    writer.stop()
+    reader.close()
+
+
+def run_shared(count, poll_interval):
+    """
+    Times count round trips through shared memory. Returns the round trip times and the times to write a state, in
+    seconds.
+    """
+    request_path = get_shared_path("request")
+    reply_path = get_shared_path("reply")
+    writer = shared_state_writer.SharedStateWriter(request_path)
+    ready = multiprocessing.Event()
+    echo = multiprocessing.Process(target=shared_echo, args=(request_path, reply_path, count, poll_interval, ready))
+    echo.start()
+    ready.wait()
+    reader = shared_state_reader.SharedStateReader(reply_path)
+
+    round_trips, writes = [], []
+    version = None
+    for i in range(count):
+        state, predicted_state = make_state(i)
+        start = timeit.default_timer()
+        writer.publish(start, state, predicted_state, 0.9)
+        written = timeit.default_timer()
+        version, message = reader.wait(version, poll_interval=poll_interval)
+        round_trips.append(timeit.default_timer() - start)
+        writes.append(written - start)
+        assert message[3] == i
+
+    echo.join()
+    writer.stop()
+    reader.close()
+    os.remove(request_path)
+    os.remove(reply_path)
+    return round_trips, writes
+
+
+def tcp_echo(port, count):
+    """
+    Connects to port, and sends each state that comes in straight back.
+    """
+    soc = socket.create_connection(("127.0.0.1", port))
+    soc.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sender = state_sender.StateSender(soc.sendall)
+    decoder = message_decoder.MessageDecoder()
+    echoed = 0
+    while echoed < count:
+        for message in decoder.feed(soc.recv(4096)):
+            echo_from_message(message, sender.send)
+            echoed += 1
+    soc.close()
+
+
+def run_tcp(count):
+    """
+    Times count round trips over a TCP connection. Returns the round trip times and the times to send a state, in
+    seconds.
+    """
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1)
+    echo = multiprocessing.Process(target=tcp_echo, args=(listener.getsockname()[1], count))
+    echo.start()
+    soc, _ = listener.accept()
+    soc.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sender = state_sender.StateSender(soc.sendall)
+    decoder = message_decoder.MessageDecoder()
+
+    round_trips, writes = [], []
+    for i in range(count):
+        state, predicted_state = make_state(i)
+        start = timeit.default_timer()
+        sender.send(start, state, predicted_state, 0.9)
+        written = timeit.default_timer()
+        messages = []
+        while not messages:
+            messages = decoder.feed(soc.recv(4096))
+        round_trips.append(timeit.default_timer() - start)
+        writes.append(written - start)
+        assert messages[0][3] == i
+
+    echo.join()
+    soc.close()
+    listener.close()
+    return round_trips, writes
+
+
+def hammer(path, count):
+    """
+    Writes count states to path as fast as it can.
+    """
+    writer = shared_state_writer.SharedStateWriter(path)
+    for i in range(1, count + 1):
+        state, predicted_state = make_state(i)
+        writer.publish(i, state, predicted_state, i)
+    writer.stop()
+
+
+def check_seqlock(count):
+    """
+    Reads while another process writes count states, and counts the reads that had to be retried and the messages
+    that came back mixed from two writes (which there should never be).
+    """
+    path = get_shared_path("seqlock")
+    shared_state_writer.SharedStateWriter(path).stop()
+    reader = shared_state_reader.SharedStateReader(path)
+    writer = multiprocessing.Process(target=hammer, args=(path, count))
+    writer.start()
+
+    reads, mixed = 0, 0
+    while writer.is_alive():
+        _, message = reader.read()
+        if message:
+            reads += 1
+            values = message[3:13]
+            mixed += any(value != values[0] for value in values)
+
+    writer.join()
+    reader.close()
+    os.remove(path)
+    return reads, reader.get_torn_reads(), mixed
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", "--count", type=int, default=20000, help="how many round trips to time")
+    ap.add_argument("-p", "--poll-interval", type=float, default=None,
+                    help="seconds for the shared memory reader to sleep between looks (0 spins)")
+    args = ap.parse_args()
+    if args.poll_interval is None:
+        args.poll_interval = 0.0 if multiprocessing.cpu_count() > 1 else 1e-5
+        if args.poll_interval:
+            print "Only one CPU, so the shared memory reader sleeps " + str(args.poll_interval) + " s between looks."
+
+    # Binary messages one at a time, timed on the wall clock
+    config.USE_LIVE_VIDEO = True
+    config.USE_BINARY_PROTOCOL = True
+    config.WIRE_BATCH_SIZE = 1
+    config.USE_BALLISTIC_PREDICTOR = False
+
+    print "%-14s %14s %14s %14s %14s" % ("transport", "median rtt us", "99% rtt us", "max rtt us", "write us")
+    for name, (round_trips, writes) in [("tcp", run_tcp(args.count)),
+                                        ("shared memory", run_shared(args.count, args.poll_interval))]:
+        round_trips = 1e6 * numpy.array(round_trips[_WARMUP:])
+        print "%-14s %14.1f %14.1f %14.1f %14.1f" % (name, numpy.median(round_trips), numpy.percentile(round_trips, 99),
+                                                     round_trips.max(), 1e6 * numpy.median(writes[_WARMUP:]))
+
+    reads, torn, mixed = check_seqlock(20 * args.count)
+    print "Seqlock: " + str(reads) + " reads during " + str(20 * args.count) + " writes, " + str(torn) + \
+          " retried for overlapping a write, " + str(mixed) + " mixed up."
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Compares the binary ball state messages (POC/networking/wire_protocol.py) with the old text format
+(BallState.format_for_sending): how many values each message carries, bytes on the wire per message, and what it costs
+to make and to parse each one. Checks that the decoder gives back what was sent.
+
+USAGE: python -m scripts_and_stuff.benchmark_wire_protocol [--count 20000] [--batch 1 4 16]
+
+The text format has no delimiters, so it is parsed the only way it can be: by looking for numbers with four decimal
+places, which breaks as soon as a value is NaN or has no digits before the point.
+"""
+
+import argparse
+import math
+import numpy
+import re
+import time
+from POC.ball_tracking import ball_state
+from POC.networking import message_batcher, message_decoder, wire_protocol
+
+_TEXT_NUMBER = re.compile(r"-?\d+\.\d{4}")
+
+
+def make_states(count, seed=0):
+    """
+    Makes count (state, predicted state) pairs of a ball moving about the frame.
+    """
+    rng = numpy.random.RandomState(seed)
+    values = numpy.column_stack([rng.uniform(0, 900, count), rng.uniform(0, 900, count), rng.uniform(20, 150, count),
+                                 rng.normal(0, 500, count), rng.normal(0, 500, count), rng.normal(0, 50, count),
+                                 rng.uniform(5, 30, count)])
+    states = []
+    for x, y, d, vx, vy, vd, radius in values:
+        states.append((ball_state.BallState(x, y, d, vx, vy, vd, radius),
+                       ball_state.BallState(x + vx / 30.0, y + vy / 30.0, d + vd / 30.0, vx, vy, vd, radius)))
+    return states
+
+
+def run_text(states):
+    """
+    Formats and parses every state as text. Returns the bytes sent, and the microseconds per message to format and
+    to parse.
+    """
+    start = time.time()
+    sent = [state.format_for_sending() for state, _ in states]
+    format_us = 1e6 * (time.time() - start) / len(states)
+
+    start = time.time()
+    for message in sent:
+        x, y, d, vx, vy, vd = [float(number) for number in _TEXT_NUMBER.findall(message)]
+    parse_us = 1e6 * (time.time() - start) / len(states)
+    return sum(len(message) for message in sent), format_us, parse_us
+
+
+def run_binary(states, batch_size):
+    """
+    Packs and decodes every state as binary messages, batch_size to a write. Returns the bytes sent, the
+    microseconds per message to pack, to decode into tuples and to decode into arrays, and the largest difference
+    between a sent and a decoded position.
+    """
+    batcher = message_batcher.MessageBatcher(batch_size)
+    start = time.time()
+    sent = []
+    for i, (state, predicted_state) in enumerate(states):
+        batcher.add(i / 30.0, state, predicted_state, 0.9)
+        if batcher.is_full():
+            sent.append(batcher.flush())
+    sent.append(batcher.flush())
+    pack_us = 1e6 * (time.time() - start) / len(states)
+
+    decoder = message_decoder.MessageDecoder()
+    start = time.time()
+    received = []
+    for batch in sent:
+        received.extend(decoder.feed(batch))
+    decode_us = 1e6 * (time.time() - start) / len(states)
+
+    array_decoder = message_decoder.MessageDecoder()
+    start = time.time()
+    arrays = []
+    for batch in sent:
+        arrays.extend(array_decoder.feed_arrays(batch))
+    array_us = 1e6 * (time.time() - start) / len(states)
+
+    expected = numpy.array([(state.get_x_pos(), state.get_y_pos(), state.get_d_pos(), predicted_state.get_x_pos(),
+                             predicted_state.get_y_pos(), predicted_state.get_d_pos())
+                            for state, predicted_state in states])
+    columns = [3, 4, 5, 9, 10, 11]
+    error = float('inf')
+    if len(received) == len(states) and not decoder.get_lost_messages():
+        error = numpy.abs(numpy.array(received)[:, columns] - expected).max()
+        records = numpy.concatenate(arrays)
+        names = [wire_protocol.FIELDS[column] for column in columns]
+        error = max(error, numpy.abs(numpy.column_stack([records[name] for name in names]) - expected).max())
+    return sum(len(batch) for batch in sent), pack_us, decode_us, array_us, error
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", "--count", type=int, default=20000, help="how many messages to send")
+    ap.add_argument("-b", "--batch", type=int, nargs="+", default=[1, 4, 16], help="messages per write to try")
+    args = ap.parse_args()
+
+    states = make_states(args.count)
+    print "%-12s %10s %12s %12s %12s %12s %10s" % ("format", "values", "bytes/msg", "us to make", "us to parse",
+                                                    "(as arrays)", "max error")
+    size, format_us, parse_us = run_text(states)
+    print "%-12s %10d %12.1f %12.2f %12.2f %12s %10s" % ("text", 6, float(size) / args.count, format_us, parse_us, "-",
+                                                          "-")
+    for batch_size in args.batch:
+        size, pack_us, decode_us, array_us, error = run_binary(states, batch_size)
+        print "%-12s %10d %12.1f %12.2f %12.2f %12.2f %10.2g" % ("binary x" + str(batch_size),
+                                                                 len(wire_protocol.FIELDS),
+                                                                 float(size) / args.count, pack_us, decode_us,
+                                                                 array_us, error)
+        if math.isinf(error):
+            print "The decoder did not give back every message!"
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Exports a recording made by the columnar recorder (POC/data_recorder/columnar_recorder.py) as CSV.
+
+By default, the CSV is in the same form that DataRecorder writes: one line per frame of measured x, y, d and predicted
+x, y, d, with an empty line of commas for a frame where the ball was not found, and no header, so that anything that
+reads the old datalogs can read it. With --int, the values are cut down to integers the way DataRecorder does. With
+--all, every column is written instead, with a header line naming them.
+
+USAGE: python -m scripts_and_stuff.export_recording --recording recordings/20260101-120000 [--output datalog.csv]
+       [--int | --all]
+"""
+
+import argparse
+import numpy
+import sys
+from POC.data_recorder import columnar_recorder, log_reader
+
+_DATALOG_COLUMNS = ("x", "y", "d", "px", "py", "pd")
+
+
+def format_value(value, as_int):
+    """
+    Formats one value for the CSV: empty for NaN.
+    """
+    if numpy.isnan(value):
+        return ""
+    return str(int(value)) if as_int else repr(float(value))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-r", "--recording", required=True, help="the recording's directory")
+    ap.add_argument("-o", "--output", help="the CSV file to write (standard output if not given)")
+    group = ap.add_mutually_exclusive_group()
+    group.add_argument("--int", action="store_true", help="write the values as integers, like DataRecorder")
+    group.add_argument("--all", action="store_true", help="write every column, with a header")
+    args = ap.parse_args()
+
+    columns = log_reader.read_recording(args.recording, mmap_mode='r')
+    names = [name for name in columnar_recorder.COLUMNS if name in columns] if args.all else _DATALOG_COLUMNS
+    rows = numpy.column_stack([columns[name] for name in names])
+
+    output = open(args.output, 'w') if args.output else sys.stdout
+    if args.all:
+        output.write(",".join(names) + "\n")
+    for row in rows:
+        line = ",".join(format_value(value, args.int) for value in row)
+        output.write(line + ("\n" if args.all else ",\n"))
+    if args.output:
+        output.close()
+        print "Wrote " + str(len(rows)) + " frames to " + args.output + "."
+
+
+if __name__ == '__main__':
+    main()
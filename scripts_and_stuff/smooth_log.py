@@ -0,0 +1,106 @@
+"""
+Smooths a whole datalog (written by POC/data_recorder/data_recorder.py) after the fact, with the Kalman model from
+POC/kalman/control.py: a Kalman filter forward and a Rauch-Tung-Striebel smoother backward, each done as one
+vectorized scan over the whole log (see POC/kalman/smoother.py). Frames where the ball was not found are filled in.
+Each step of the model is as long as the time between the frames: from the timestamps in a ColumnarRecorder's
+recording, or 1 / config.CAMERA_FPS for a datalog file, which has none.
+
+USAGE: python -m scripts_and_stuff.smooth_log --log datalog.csv [--out smoothed.csv] [--check]
+
+The output has one row per frame: x, vx, y, vy, d, vd. With --check, the results are also worked out one frame at a
+time, the textbook way, and the largest difference is printed.
+"""
+
+import argparse
+import numpy
+import time
+from POC.data_recorder import log_reader
+from POC.kalman import control, smoother
+import POC.config as config
+
+# How unsure to be of the first state: very, so that the first few measurements decide it
+_INITIAL_VARIANCE = 1e4
+
+
+def get_initial_guess(measurements, H):
+    """
+    Gets the first measurement in the log (standing still) and a covariance that hardly trusts it.
+    """
+    first = measurements[~numpy.isnan(measurements).any(axis=1)][0]
+    return H.T.dot(first), _INITIAL_VARIANCE * numpy.eye(H.shape[1])
+
+
+def get_time_steps(timestamps):
+    """
+    Gets the time from the frame before each frame. The first frame has none, so it gets one frame's worth.
+    """
+    return numpy.concatenate(([1.0 / config.CAMERA_FPS], numpy.diff(timestamps)))
+
+
+def smooth_in_order(measurements, A, Q, H, R, initial_state, initial_covariance):
+    """
+    The same as smoother.smooth_log, but one time step at a time. A and Q are (T, n, n) stacks, one for each step.
+    """
+    length, n = len(measurements), A.shape[-1]
+    states = numpy.empty((length, n))
+    covariances = numpy.empty((length, n, n))
+    x, P = initial_state, initial_covariance
+    for k in range(length):
+        if k:
+            x = A[k].dot(x)
+            P = A[k].dot(P).dot(A[k].T) + Q[k]
+        if not numpy.isnan(measurements[k]).any():
+            S = H.dot(P).dot(H.T) + R
+            K = P.dot(H.T).dot(numpy.linalg.inv(S))
+            x = x + K.dot(measurements[k] - H.dot(x))
+            P = P - K.dot(S).dot(K.T)
+        states[k], covariances[k] = x, P
+
+    for k in range(length - 2, -1, -1):
+        P, A_next, Q_next = covariances[k], A[k + 1], Q[k + 1]
+        E = P.dot(A_next.T).dot(numpy.linalg.inv(A_next.dot(P).dot(A_next.T) + Q_next))
+        states[k] = states[k] + E.dot(states[k + 1] - A_next.dot(states[k]))
+        covariances[k] = P + E.dot(covariances[k + 1] - A_next.dot(P).dot(A_next.T) - Q_next).dot(E.T)
+    return states, covariances
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-l", "--log", required=True, help="the datalog to smooth")
+    ap.add_argument("-o", "--out", help="where to write the smoothed states (csv)")
+    ap.add_argument("-c", "--check", action="store_true", help="also smooth one frame at a time and compare")
+    args = ap.parse_args()
+
+    start = time.time()
+    measurements, _, timestamps = log_reader.read_log(args.log)
+    read_time = time.time() - start
+    found = ~numpy.isnan(measurements).any(axis=1)
+    print "Read " + str(len(measurements)) + " frames (ball found in " + str(found.sum()) + ") in " + \
+          ("%.2f" % read_time) + " seconds"
+    if not found.any():
+        print "The ball was not found in any frame, so there is nothing to smooth."
+        exit(-1)
+
+    _, _, H, R = control.get_position_model()
+    A, Q = control.get_time_step_models(get_time_steps(timestamps))
+    initial_state, initial_covariance = get_initial_guess(measurements, H)
+
+    start = time.time()
+    states, covariances = smoother.smooth_log(measurements, A, Q, H, R, initial_state, initial_covariance)
+    smooth_time = time.time() - start
+    print "Smoothed in " + ("%.2f" % smooth_time) + " seconds (" + \
+          ("%.1f" % (1e6 * smooth_time / len(measurements))) + " us per frame)"
+
+    if args.check:
+        start = time.time()
+        expected, expected_covariances = smooth_in_order(measurements, A, Q, H, R, initial_state, initial_covariance)
+        print "One frame at a time: " + ("%.2f" % (time.time() - start)) + " seconds"
+        print "Largest difference: %.3g (states), %.3g (covariances)" % \
+              (numpy.abs(states - expected).max(), numpy.abs(covariances - expected_covariances).max())
+
+    if args.out:
+        numpy.savetxt(args.out, states, fmt="%.3f", delimiter=",", header="x,vx,y,vy,d,vd", comments="")
+
+
+if __name__ == '__main__':
+    main()
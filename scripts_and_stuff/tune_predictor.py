@@ -0,0 +1,217 @@
+"""
+Searches for the predictor settings that best predict the next frame, by replaying recorded datalogs (see
+POC/prediction/tuning.py): the averaging predictor's blend (config.VELOCITY_BLEND), the alpha-beta filter's gains
+(config.ALPHA_BETA_ALPHA, ALPHA_BETA_BETA) and the Kalman filter's Q and R scales (config.KALMAN_Q_SCALE,
+KALMAN_R_SCALE). The settings are split into chunks and spread across a process pool; each chunk is replayed for all
+of its settings at once.
+
+USAGE: python -m scripts_and_stuff.tune_predictor --log datalog.csv [more.csv ...] [--predictors kalman ...]
+                 [--blends 0.4 0.6 0.8] [--alphas 0.5 0.8] [--betas 0.1 0.3] [--q-scales 0.1 1 10] [--r-scales 0.1 1]
+                 [--random 2000] [--workers 8] [--chunk 250] [--top 10] [--out results.csv] [--check]
+
+Without --random, every combination of each predictor's settings is tried. With --random N, N settings are drawn for
+each predictor instead: the scales log-uniformly from 1e-3 to 1e3, the blend and alpha uniformly from 0 to 1 and beta
+from 0 to 2. With --check, the settings in config.py are also run through the real predictor classes, and the errors
+are compared with the replay's. The logs should be recorded with the averaging predictor, so that they hold
+measurements.
+"""
+
+import argparse
+import itertools
+import multiprocessing
+import numpy
+import time
+from POC.ball_tracking import ball_state
+from POC.data_recorder import log_reader
+from POC.prediction import predictors, tuning
+import POC.config as config
+
+# For --random: the range of each setting, and whether to draw it log-uniformly
+_RANDOM_RANGES = {
+    "blend": (0.0, 1.0, False),
+    "alpha": (0.0, 1.0, False),
+    "beta": (0.0, 2.0, False),
+    "q_scale": (1e-3, 1e3, True),
+    "r_scale": (1e-3, 1e3, True),
+}
+
+# Set in each worker process by _initialize_worker(), so that the logs (measurements and timestamps) and settings are
+# only sent once
+_logs = None
+_settings = None
+
+
+def _initialize_worker(logs, settings):
+    """
+    Gives a worker process the logs and the settings.
+    """
+    global _logs, _settings
+    _logs = logs
+    _settings = settings
+
+
+def _replay_chunk(task):
+    """
+    Replays one log through one predictor for one chunk of its settings.
+    """
+    name, log_index, start, stop = task
+    measurements, timestamps = _logs[log_index]
+    return task, tuning.replay(measurements, timestamps, name, _settings[name][:, start:stop])
+
+
+def get_current_settings():
+    """
+    Gets the settings that are in config.py, by name.
+    """
+    return {
+        "blend": config.VELOCITY_BLEND,
+        "alpha": config.ALPHA_BETA_ALPHA,
+        "beta": config.ALPHA_BETA_BETA,
+        "q_scale": config.KALMAN_Q_SCALE,
+        "r_scale": config.KALMAN_R_SCALE,
+    }
+
+
+def make_settings(name, args, rng):
+    """
+    Makes the (P, C) array of settings to try for one predictor, with the ones in config.py first.
+    """
+    parameters = tuning.PARAMETERS[name]
+    if args.random:
+        columns = []
+        for parameter in parameters:
+            low, high, log_uniform = _RANDOM_RANGES[parameter]
+            if log_uniform:
+                columns.append(10 ** rng.uniform(numpy.log10(low), numpy.log10(high), args.random))
+            else:
+                columns.append(rng.uniform(low, high, args.random))
+        settings = numpy.array(columns)
+    else:
+        grid = [getattr(args, parameter + "s") for parameter in parameters]
+        settings = numpy.array(list(itertools.product(*grid))).T
+
+    current = get_current_settings()
+    return numpy.hstack([[[current[parameter]] for parameter in parameters], settings])
+
+
+def replay_all(logs, settings, pool, chunk):
+    """
+    Replays every log for every predictor and setting and returns the average x/y and d errors of each, by predictor.
+    """
+    tasks = [(name, i, start, min(start + chunk, settings[name].shape[1])) for name in settings
+             for i in range(len(logs)) for start in range(0, settings[name].shape[1], chunk)]
+
+    totals = dict((name, numpy.zeros((3, settings[name].shape[1]))) for name in settings)
+    for (name, _, start, stop), (xy, d, checked) in pool.imap_unordered(_replay_chunk, tasks):
+        totals[name][0, start:stop] += xy
+        totals[name][1, start:stop] += d
+        totals[name][2, start:stop] += checked
+
+    return dict((name, (total[0] / numpy.maximum(total[2], 1), total[1] / numpy.maximum(total[2], 1)))
+                for name, total in totals.items())
+
+
+def check_against_predictor(name, logs):
+    """
+    Runs the config.py settings through the real predictor and returns its summed x/y and d errors, to compare with
+    the replay's.
+    """
+    xy_error = 0.0
+    d_error = 0.0
+    for log, timestamps in logs:
+        predictor = predictors.make_predictor(name)
+        predicted = None
+        for frame, row in enumerate(log):
+            if numpy.isnan(row).any():
+                predicted = None
+                continue
+            if predicted is not None:
+                xy_error += numpy.hypot(predicted.get_x_pos() - row[0], predicted.get_y_pos() - row[1])
+                d_error += abs(predicted.get_d_pos() - row[2])
+            predicted = predictor.update(ball_state.BallState(*row), timestamps[frame])
+    return xy_error, d_error
+
+
+def print_best(name, settings, xy_errors, d_errors, top):
+    """
+    Prints the settings with the smallest x/y error, and the ones from config.py (the first ones).
+    """
+    parameters = tuning.PARAMETERS[name]
+    print name + ":"
+    print "  " + "".join("%10s" % parameter for parameter in parameters) + "%12s %10s" % ("x/y error", "d error")
+    line = lambda i: "  " + "".join("%10.4g" % value for value in settings[:, i]) + \
+        "%12.3f %10.3f" % (xy_errors[i], d_errors[i])
+    for i in numpy.argsort(xy_errors)[:top]:
+        print line(i)
+    print line(0) + "  (config.py)"
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-l", "--log", nargs="+", required=True, help="the datalogs to replay")
+    ap.add_argument("-p", "--predictors", nargs="+", default=sorted(tuning.PARAMETERS),
+                    choices=sorted(tuning.PARAMETERS), help="which predictors to tune")
+    ap.add_argument("--blends", type=float, nargs="+", default=[0.2, 0.4, 0.6, 0.8, 1.0],
+                    help="averaging predictor blends, for a grid search")
+    ap.add_argument("--alphas", type=float, nargs="+", default=[0.2, 0.4, 0.6, 0.8, 1.0],
+                    help="alpha-beta filter alphas, for a grid search")
+    ap.add_argument("--betas", type=float, nargs="+", default=[0.05, 0.1, 0.2, 0.4, 0.8],
+                    help="alpha-beta filter betas, for a grid search")
+    ap.add_argument("--q_scales", "--q-scales", type=float, nargs="+", default=[0.01, 0.1, 1, 10, 100, 1000],
+                    help="what to multiply the Kalman filter's Q by, for a grid search")
+    ap.add_argument("--r_scales", "--r-scales", type=float, nargs="+", default=[0.01, 0.1, 1, 10, 100, 1000],
+                    help="what to multiply the Kalman filter's R by, for a grid search")
+    ap.add_argument("-n", "--random", type=int, default=0, help="try this many random settings per predictor instead")
+    ap.add_argument("-s", "--seed", type=int, default=0, help="seed for --random")
+    ap.add_argument("-w", "--workers", type=int, default=multiprocessing.cpu_count(), help="number of processes")
+    ap.add_argument("-c", "--chunk", type=int, default=250, help="settings per task")
+    ap.add_argument("-t", "--top", type=int, default=10, help="how many of the best settings to print")
+    ap.add_argument("-o", "--out", help="where to write the errors of every setting (csv)")
+    ap.add_argument("--check", action="store_true", help="compare the replay with the real predictors")
+    args = ap.parse_args()
+
+    logs = []
+    for path in args.log:
+        measurements, _, timestamps = log_reader.read_log(path)
+        logs.append((measurements, timestamps))
+    rng = numpy.random.RandomState(args.seed)
+    settings = dict((name, make_settings(name, args, rng)) for name in args.predictors)
+    count = sum(s.shape[1] for s in settings.values())
+    print "Replaying " + str(len(logs)) + " logs (" + str(sum(len(log) for log, _ in logs)) + " frames) for " + \
+          str(count) + " settings on " + str(args.workers) + " processes"
+
+    start = time.time()
+    pool = multiprocessing.Pool(args.workers, _initialize_worker, (logs, settings))
+    try:
+        errors = replay_all(logs, settings, pool, args.chunk)
+    finally:
+        pool.close()
+        pool.join()
+    elapsed = time.time() - start
+    print "Done in " + ("%.1f" % elapsed) + " seconds (" + ("%.1f" % (count / elapsed)) + " settings per second)"
+
+    for name in args.predictors:
+        print_best(name, settings[name], errors[name][0], errors[name][1], args.top)
+
+    if args.check:
+        for name in args.predictors:
+            xy, d, checked = [sum(values) for values in zip(*[tuning.replay(log, timestamps, name,
+                                                                            settings[name][:, :1])
+                                                               for log, timestamps in logs])]
+            expected_xy, expected_d = check_against_predictor(name, logs)
+            print "Check " + name + ": replay %.6g, %.6g; predictor %.6g, %.6g" % (xy[0], d[0], expected_xy,
+                                                                                     expected_d)
+
+    if args.out:
+        with open(args.out, 'w') as out:
+            out.write("predictor,settings,xy_error,d_error\n")
+            for name in args.predictors:
+                for i in range(settings[name].shape[1]):
+                    values = " ".join(p + "=" + ("%.6g" % v) for p, v in zip(tuning.PARAMETERS[name],
+                                                                             settings[name][:, i]))
+                    out.write(name + "," + values + "," + ("%.6g" % errors[name][0][i]) + "," +
+                              ("%.6g" % errors[name][1][i]) + "\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Checks that the fused erode/dilate stage (POC/ball_tracking/morphology.py) gives exactly the same mask as the way
+BallTracker used to do it: erode the whole mask and paste the crop region back, erode the whole mask again and paste
+the predicted ball region back, then dilate.
+
+USAGE: python -m scripts_and_stuff.verify_fused_morphology --video path/to/recording.mp4 [--boxes 20]
+
+For every frame it tries no predicted region, a set of random predicted regions (including ones that hang off of the
+frame, which the old slicing treated in its own way) and random search windows. Exits with -1 on the first mismatch.
+"""
+
+import argparse
+import cv2
+import imutils
+import numpy
+from POC.ball_tracking import buffer_pool, morphology
+import POC.config as config
+
+
+def legacy_clean_mask(in_ranged, crop_slices, ball_slices):
+    """
+    The erode/dilate steps exactly as BallTracker used to do them.
+    """
+    slice_x, slice_y = crop_slices
+    roi = in_ranged[slice_y, slice_x].copy()
+    image = cv2.erode(in_ranged, None, iterations=2)
+    image[slice_y, slice_x] = roi
+
+    if ball_slices:
+        x_slice, y_slice = ball_slices
+        roi = image[y_slice, x_slice].copy()
+    eroded = cv2.erode(image, None, iterations=2)
+    if ball_slices:
+        eroded[y_slice, x_slice] = roi
+
+    return cv2.dilate(eroded, None, iterations=2)
+
+
+def fused_clean_mask(in_ranged, crop_slices, ball_slices, buffers):
+    """
+    The erode/dilate steps as BallTracker does them now.
+    """
+    height, width = in_ranged.shape[:2]
+    crop_region = morphology.rectangle_from_slices(crop_slices[0], crop_slices[1], width, height)
+    ball_region = morphology.rectangle_from_slices(ball_slices[0], ball_slices[1], width, height) \
+        if ball_slices else None
+    erosions = [([crop_region] if crop_region else [], 2),
+                ([ball_region] if ball_region else [], 2)]
+    working_copy = buffers.get_like("working_copy", in_ranged)
+    numpy.copyto(working_copy, in_ranged)
+    return morphology.clean_mask(working_copy, buffers.get_like("dst", in_ranged), erosions, 2, buffers)
+
+
+def crop_slices_for(offset):
+    """
+    The crop slices for an image whose top left corner is at offset in the frame, as BallTracker works them out.
+    """
+    r1, r2 = config.TOP_LEFT, config.BOTTOM_RIGHT
+    return (slice(max(0, r1[0] - offset[0]), max(0, r2[0] - offset[0])),
+            slice(max(0, r1[1] - offset[1]), max(0, r2[1] - offset[1])))
+
+
+def random_ball_slices(rng, width, height):
+    """
+    A predicted ball region the way BallTracker cuts it out, around a random point that may be off of the image.
+    """
+    x = rng.randint(-40, width + 40)
+    y = rng.randint(-40, height + 40)
+    rad = rng.randint(1, 40)
+    return slice(x - rad * 2, x + rad * 2), slice(y - rad * 2, y + rad * 2)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-v", "--video", required=True, help="path to a recording")
+    ap.add_argument("-b", "--boxes", type=int, default=20, help="random predicted regions to try per frame")
+    args = ap.parse_args()
+
+    rng = numpy.random.RandomState(0)
+    buffers = buffer_pool.BufferPool()
+    camera = cv2.VideoCapture(args.video)
+    frames = 0
+    checks = 0
+
+    while True:
+        grabbed, frame = camera.read()
+        if not grabbed:
+            break
+        frame = imutils.resize(frame, width=config.IMAGE_WIDTH, height=config.IMAGE_HEIGHT)
+        height, width = frame.shape[:2]
+
+        # The whole frame, then a few random search windows
+        windows = [(0, 0, width, height)]
+        for _ in range(3):
+            x0, y0 = rng.randint(0, width - 20), rng.randint(0, height - 20)
+            windows.append((x0, y0, rng.randint(x0 + 10, width + 1), rng.randint(y0 + 10, height + 1)))
+
+        for x0, y0, x1, y1 in windows:
+            image = frame[y0:y1, x0:x1]
+            hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+            in_ranged = cv2.inRange(hsv, config.hsv_lower_range, config.hsv_upper_range)
+            crop_slices = crop_slices_for((x0, y0))
+
+            ball_regions = [None] + [random_ball_slices(rng, x1 - x0, y1 - y0) for _ in range(args.boxes)]
+            for ball_slices in ball_regions:
+                expected = legacy_clean_mask(in_ranged, crop_slices, ball_slices)
+                actual = fused_clean_mask(in_ranged, crop_slices, ball_slices, buffers)
+                checks += 1
+                if not numpy.array_equal(expected, actual):
+                    print "MISMATCH on frame %d, window %s, ball region %s: %d pixels differ" % \
+                          (frames, str((x0, y0, x1, y1)), str(ball_slices), numpy.count_nonzero(expected != actual))
+                    exit(-1)
+        frames += 1
+
+    camera.release()
+    print "All %d checks over %d frames matched." % (checks, frames)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Checks that making the mask in tiles on several threads (POC/ball_tracking/tiles.py) gives exactly the same mask as
+making it in one go, and times both.
+
+USAGE: python -m scripts_and_stuff.verify_tiled_mask --video path/to/recording.mp4 [--workers 8] [--boxes 5]
+
+For every frame and every number of workers from 2 up to --workers, it tries no predicted region and a few random
+ones, with 1 to 3 erode/dilate iterations. Exits with -1 on the first mismatch. Then it times full frames for each
+number of workers.
+"""
+
+import argparse
+import cv2
+import imutils
+import numpy
+import time
+from POC.ball_tracking import buffer_pool, morphology, tiles
+import POC.config as config
+
+
+def make_mask(image, dst, buffers):
+    """
+    The color thresholding, as BallTracker does it.
+    """
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV, dst=buffers.get_like("hsv", image))
+    return cv2.inRange(hsv, config.hsv_lower_range, config.hsv_upper_range, dst=dst)
+
+
+def serial_clean_mask(image, erosions, dilate_iterations, buffers):
+    """
+    The whole mask in one go.
+    """
+    in_ranged = buffers.get("in_ranged", image.shape[:2])
+    make_mask(image, in_ranged, buffers)
+    return morphology.clean_mask(in_ranged, buffers.get_like("dilated", in_ranged), erosions, dilate_iterations,
+                                 buffers)
+
+
+def random_erosions(rng, width, height, iterations, boxes):
+    """
+    The erosions the way BallTracker sets them up: leave the crop region alone, then leave a predicted region alone.
+    """
+    crop_region = (config.TOP_LEFT[0], config.TOP_LEFT[1], config.BOTTOM_RIGHT[0], config.BOTTOM_RIGHT[1])
+    erosions = [[([crop_region], iterations), ([], iterations)]]
+    for _ in range(boxes):
+        x, y, rad = rng.randint(-40, width + 40), rng.randint(-40, height + 40), rng.randint(1, 60)
+        ball_region = (x - rad * 2, y - rad * 2, x + rad * 2, y + rad * 2)
+        erosions.append([([crop_region], iterations), ([ball_region], iterations)])
+    return erosions
+
+
+def time_it(func, runs):
+    """
+    Runs func runs times and returns the average time per run in milliseconds.
+    """
+    func()
+    start = time.time()
+    for _ in range(runs):
+        func()
+    return (time.time() - start) * 1000.0 / runs
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-v", "--video", required=True, help="path to a recording")
+    ap.add_argument("-w", "--workers", type=int, default=8, help="the most threads to try")
+    ap.add_argument("-b", "--boxes", type=int, default=5, help="random predicted regions to try per frame")
+    ap.add_argument("-r", "--runs", type=int, default=50, help="number of runs to average the timings over")
+    args = ap.parse_args()
+
+    rng = numpy.random.RandomState(0)
+    buffers = buffer_pool.BufferPool()
+    maskers = dict((workers, tiles.TiledMasker(workers)) for workers in range(2, args.workers + 1))
+    camera = cv2.VideoCapture(args.video)
+    frames = []
+    checks = 0
+
+    while True:
+        grabbed, frame = camera.read()
+        if not grabbed:
+            break
+        frame = imutils.resize(frame, width=config.IMAGE_WIDTH, height=config.IMAGE_HEIGHT)
+        frames.append(frame)
+        height, width = frame.shape[:2]
+
+        for iterations in (1, 2, 3):
+            for erosions in random_erosions(rng, width, height, iterations, args.boxes):
+                expected = serial_clean_mask(frame, erosions, iterations, buffers)
+                for workers, masker in sorted(maskers.items()):
+                    actual = masker.clean_mask(frame, numpy.empty_like(expected), make_mask, erosions, iterations)
+                    checks += 1
+                    if not numpy.array_equal(expected, actual):
+                        print "MISMATCH on frame %d with %d workers, %d iterations, erosions %s: %d pixels differ" % \
+                              (len(frames) - 1, workers, iterations, str(erosions),
+                               numpy.count_nonzero(expected != actual))
+                        exit(-1)
+
+    camera.release()
+    print "All %d checks over %d frames matched." % (checks, len(frames))
+
+    frame = frames[len(frames) // 2]
+    erosions = random_erosions(rng, frame.shape[1], frame.shape[0], 2, 0)[0]
+    dst = numpy.empty(frame.shape[:2], dtype=numpy.uint8)
+    print "1 worker:  %.3f ms" % time_it(lambda: serial_clean_mask(frame, erosions, 2, buffers), args.runs)
+    for workers, masker in sorted(maskers.items()):
+        print "%d workers: %.3f ms" % (workers, time_it(lambda: masker.clean_mask(frame, dst, make_mask, erosions, 2),
+                                                        args.runs))
+        masker.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,15 @@
 """
 This module contains a script for finding a ping pong ball in a video and tracking its x, y, and z location.
+
+USAGE: python -m scripts_and_stuff.video_ball_tracker
+
+The next location is predicted with the predictor that config.PREDICTOR names (see POC/prediction/predictors.py).
 """
 
 import imutils
 import cv2
+from POC.ball_tracking import ball_state
+from POC.prediction import predictors
 
 # Orange ball:
 ORANGE_HSV_LOWER = (18, 69, 231)#(25, 0, 239)
@@ -24,14 +30,12 @@ if not opened:
     print "Failed to open the given video"
     exit(-1)
 
+predictor = predictors.make_predictor()
+
 predicted_x = 0
 predicted_y = 0
 predicted_d = 0
 
-last_x = 0
-last_y = 0
-last_d = 0
-
 # Main loop
 while True:
     # Get the next frame of video from the camera
@@ -103,13 +107,11 @@ while True:
             data_point = xyz_data + predicted_xyz_data + "," + "\r\n"
             log.write(data_point)
 
-        predicted_x = x + (x - last_x)
-        predicted_y = y + (y - last_y)
-        predicted_d = distance_from_camera + (distance_from_camera - last_d)
-
-        last_x = x
-        last_y = y
-        last_d = distance_from_camera
+        predicted_state = predictor.update(ball_state.BallState(x, y, distance_from_camera, radius=radius),
+                                           camera.get(cv2.CAP_PROP_POS_MSEC) / 1000.0)
+        predicted_x = predicted_state.get_x_pos()
+        predicted_y = predicted_state.get_y_pos()
+        predicted_d = predicted_state.get_d_pos()
     else:
         # No ball in this frame, move along
         pass